@@ -0,0 +1,44 @@
+"""
+Print statistics about an s3g/x3g job: command counts, bounding box,
+extrusion, tool changes and estimated print time.
+"""
+
+import os, sys
+lib_path = os.path.abspath('../')
+sys.path.append(lib_path)
+
+import makerbot_driver
+import optparse
+
+parser = optparse.OptionParser()
+parser.add_option("-i", "--input_file", dest="input_file",
+                  help="s3g/x3g file to analyze")
+parser.add_option("-m", "--machine", dest="machine",
+                  help="machine profile the file was made for, example ReplicatorDual",
+                  default=None)
+(options, args) = parser.parse_args()
+
+profile = None
+if options.machine is not None:
+    profile = makerbot_driver.Profile(options.machine)
+
+with open(options.input_file, 'rb') as f:
+    stats = makerbot_driver.FileReader.analyze_s3g_file(f, profile)
+
+names = {}
+for name, code in makerbot_driver.host_action_command_dict.items():
+    names[code] = name
+print 'Commands: %i' % (stats['command_count'])
+for code, count in sorted(stats['command_counts'].items()):
+    print '  %-40s %i' % (names.get(code, code), count)
+for key in ['bounding_box_steps', 'bounding_box_mm']:
+    if stats.get(key) is not None:
+        print 'Bounding box (%s):' % (key.split('_')[-1])
+        for axis, (low, high) in sorted(stats[key].items()):
+            print '  %s: %s to %s' % (axis, low, high)
+for key in ['extrusion_steps', 'extrusion_mm']:
+    if key in stats:
+        print 'Extrusion (%s): %s' % (key.split('_')[-1], stats[key])
+print 'Tool changes: %i' % (stats['tool_changes'])
+seconds = int(stats['estimated_time'])
+print 'Estimated time: %i:%02i:%02i' % (seconds / 3600, seconds / 60 % 60, seconds % 60)
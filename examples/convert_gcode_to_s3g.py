@@ -27,7 +27,7 @@ parser.add_option("-s", "--sequences", dest="sequences",
 
 condition = threading.Condition()
 s = makerbot_driver.s3g()
-s.writer = makerbot_driver.Writer.FileWriter(open(options.output_file, 'wb'), condition)
+s.writer = makerbot_driver.Writer.FileWriter(open(options.output_file, 'wb'), condition, append_checksum=True)
 
 profile = makerbot_driver.Profile(options.machine)
 
@@ -57,7 +57,5 @@ if options.sequences:
   for line in end_gcode:
     parser.execute_line(line)
 
-s.writer.file.close()
-
-finito = makerbot_driver.Gcode.FileComplete()
-finito.finish(options.output_file)
+# Appends the checksum
+s.writer.close()
@@ -21,7 +21,6 @@ reader = makerbot_driver.FileReader.FileReader()
 def callback(percent):
     print percent
 with open(options.input_file, 'rb') as reader.file:
-    payloads = reader.ReadFile(callback)
-with open(options.output_file, 'w') as f:
-  for payload in payloads:
-    f.write(str(payload) + '\n')
+  with open(options.output_file, 'w') as f:
+    for payload in reader.iter_payloads(callback):
+      f.write(str(payload) + '\n')
@@ -0,0 +1,202 @@
+"""
+A pool of open connections to machines, keyed by port, so that jobs sent
+one after another to the same machine do not each pay for opening the
+port, the baud rate hack and identifying the machine.
+
+Connections are handed out one job at a time.  A connection coming back
+out of the pool is checked with a get_version query first, and is closed
+once it has been idle for idle_timeout seconds.
+"""
+
+from __future__ import absolute_import
+
+import time
+import logging
+import threading
+import contextlib
+
+import makerbot_driver
+
+
+class ConnectionPool(object):
+
+    def __init__(self, idle_timeout=300.0, factory=None):
+        """
+        @param float idle_timeout: Seconds an unused connection is kept open
+        @param MachineFactory factory: Builds new connections
+        """
+        self._log = logging.getLogger(self.__class__.__name__)
+        self.idle_timeout = idle_timeout
+        self.factory = factory if factory is not None else makerbot_driver.MachineFactory()
+        self._condition = threading.Condition()
+        self._idle = {}
+        # ^ port: (machine, time it was released)
+        self._in_use = {}
+        # ^ port: machine
+        self._reaper = None
+        self._closed = threading.Event()
+
+    def acquire(self, portname, timeout=None):
+        """
+        Hands out an open connection to the machine on a port, reusing a
+        pooled one if it still answers
+
+        @param str portname: Port the machine is on
+        @param float timeout: Seconds to wait for another job using the
+          port to release it, or None to wait for as long as it takes
+        @return ReturnObject: As made by MachineFactory.build_from_port,
+          with a gcodeparser of its own
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while portname in self._in_use:
+                wait = None if deadline is None else deadline - time.time()
+                if wait is not None and wait <= 0:
+                    raise makerbot_driver.PortBusyError(portname)
+                self._condition.wait(wait)
+            idle = self._idle.pop(portname, None)
+            # Claimed while the connection is checked or built
+            self._in_use[portname] = None
+        try:
+            machine = None
+            if idle is not None:
+                machine = idle[0]
+                if not self.is_healthy(machine):
+                    self._log.info('{"event":"pooled_connection_unhealthy", "port":%s}', portname)
+                    self._close(machine)
+                    machine = None
+                else:
+                    self.reset_parser(machine)
+            if machine is None:
+                machine = self.factory.build_from_port(portname, True)
+            if machine.s3g is None:
+                raise makerbot_driver.UnknownMachineError(portname)
+        except:
+            with self._condition:
+                del self._in_use[portname]
+                self._condition.notify_all()
+            raise
+        with self._condition:
+            self._in_use[portname] = machine
+        return machine
+
+    def release(self, machine, reusable=True):
+        """
+        Hands a connection back to the pool
+
+        @param ReturnObject machine: As returned by acquire
+        @param bool reusable: False if the connection should be closed,
+          say after an error
+        """
+        with self._condition:
+            ports = [port for port, used in self._in_use.items() if used is machine]
+            if not ports:
+                raise ValueError('connection is not in use')
+            portname = ports[0]
+            del self._in_use[portname]
+            if reusable and not self._closed.is_set():
+                self._idle[portname] = (machine, time.time())
+                self._start_reaper()
+            self._condition.notify_all()
+        if not reusable or self._closed.is_set():
+            self._close(machine)
+
+    @contextlib.contextmanager
+    def connection(self, portname, timeout=None):
+        """
+        Acquires a connection for a with block, releasing it afterwards.
+        Connections are closed rather than pooled if the block fails.
+        """
+        machine = self.acquire(portname, timeout)
+        try:
+            yield machine
+        except:
+            self.release(machine, False)
+            raise
+        self.release(machine)
+
+    def is_healthy(self, machine):
+        """
+        @param ReturnObject machine: A pooled connection
+        @return bool: True if the machine is still there and answering
+        """
+        try:
+            return machine.s3g.is_open() and machine.s3g.get_version() is not None
+        except Exception as e:
+            self._log.debug('{"event":"health_check_failed", "error":%s}', str(e))
+            return False
+
+    def reset_parser(self, machine):
+        """ Gives a reused connection a fresh parser, since a parser keeps
+        the state of the job it ran """
+        parser = makerbot_driver.Gcode.GcodeParser()
+        parser.s3g = machine.s3g
+        parser.state.profile = machine.profile
+        machine.gcodeparser = parser
+
+    def close_idle(self, now=None):
+        """
+        Closes connections that have been idle for longer than idle_timeout
+
+        @return float: Seconds until the next idle connection times out,
+          or None if there are none left
+        """
+        now = time.time() if now is None else now
+        expired = []
+        with self._condition:
+            for portname, (machine, released) in self._idle.items():
+                if now - released >= self.idle_timeout:
+                    expired.append(machine)
+                    del self._idle[portname]
+            remaining = [released + self.idle_timeout - now for machine, released in self._idle.values()]
+        for machine in expired:
+            self._close(machine)
+        return min(remaining) if remaining else None
+
+    def close_all(self):
+        """ Closes every idle connection, and every connection in use as
+        it is released """
+        self._closed.set()
+        with self._condition:
+            idle = [machine for machine, released in self._idle.values()]
+            self._idle.clear()
+        for machine in idle:
+            self._close(machine)
+
+    def _close(self, machine):
+        try:
+            machine.s3g.close()
+        except Exception as e:
+            self._log.debug('{"event":"close_failed", "error":%s}', str(e))
+
+    def _start_reaper(self):
+        # Called with the condition held
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap)
+            self._reaper.daemon = True
+            self._reaper.start()
+
+    def _reap(self):
+        while True:
+            wait = self.close_idle()
+            with self._condition:
+                if wait is None and not self._idle:
+                    self._reaper = None
+                    return
+            if self._closed.wait(wait if wait is not None else self.idle_timeout):
+                with self._condition:
+                    self._reaper = None
+                return
+
+
+_connection_pool = None
+_connection_pool_lock = threading.Lock()
+
+
+def get_connection_pool():
+    """ use a global singleton ConnectionPool """
+    global _connection_pool
+    with _connection_pool_lock:
+        if _connection_pool is None:
+            _connection_pool = ConnectionPool()
+    return _connection_pool
@@ -0,0 +1,112 @@
+"""
+A content addressed, size bounded cache of processed gcode and converted
+s3g/x3g files.
+
+Entries are keyed by a hash of everything that affects the output: the
+input file's contents, the processors run over it, the machine profile
+(name and values), the print to file type, whether the legacy gcode states
+are used and the version of the driver doing the converting.  Storage and
+eviction are left to DiskCache, so several converters can share a cache
+directory.
+"""
+
+from __future__ import absolute_import
+
+import os
+import json
+import shutil
+import hashlib
+
+import makerbot_driver
+
+
+class ConversionCache(makerbot_driver.DiskCache):
+
+    cache_name = 'conversion_cache'
+    encoder_version = 1
+    # ^ Bump whenever a change to the processors or encoder changes their
+    #   output, so that older entries stop matching
+
+    def __init__(self, cache_dir=None, max_size=512 * 1024 * 1024):
+        """
+        @param str cache_dir: Directory to keep cache entries in
+        @param int max_size: Size in bytes the cache is trimmed down to
+        """
+        super(ConversionCache, self).__init__(cache_dir, max_size)
+
+    def make_key(self, input_path, processors=None, profile=None, print_to_file_type=None, legacy=False):
+        """
+        Builds the key for a given conversion
+
+        @param str input_path: Path to the input file
+        @param processors: A list of processor names, or a comma separated string
+        @param Profile profile: The machine profile used
+        @param str print_to_file_type: 's3g' or 'x3g' for conversions, None
+          for gcode processing
+        @param bool legacy: True if the legacy gcode states are used
+        @return str: The cache key
+        """
+        if isinstance(processors, basestring):
+            processors = [p for p in processors.replace(' ', '').split(',') if p]
+        parts = {
+            'input': self.hash_file(input_path),
+            'processors': list(processors) if processors else [],
+            'profile_name': getattr(profile, 'name', None),
+            'profile_values': getattr(profile, 'values', None),
+            'print_to_file_type': print_to_file_type,
+            'legacy': bool(legacy),
+            'driver_version': makerbot_driver.__version__,
+            'encoder_version': self.encoder_version,
+        }
+        return hashlib.sha1(json.dumps(parts, sort_keys=True)).hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a cache entry, marking it as recently used
+
+        @param str key: A key made by make_key
+        @return str: Path of the cached file, or None on a miss
+        """
+        path = self.get_path(key)
+        try:
+            os.utime(path, None)
+        except OSError:
+            self._log.debug('{"event":"cache_miss", "key":%s}', key)
+            return None
+        self._log.debug('{"event":"cache_hit", "key":%s}', key)
+        return path
+
+    def get_copy(self, key, output_path):
+        """
+        Copies a cache entry to output_path, so that the caller gets the
+        file it asked for and an eviction can not remove it while in use
+
+        @param str key: A key made by make_key
+        @param str output_path: Where to write the entry
+        @return bool: True on a hit
+        """
+        path = self.get(key)
+        if path is None:
+            return False
+        try:
+            src = open(path, 'rb')
+        except IOError:
+            # Evicted since get, an open file stays readable after that
+            self._log.debug('{"event":"cache_miss", "key":%s}', key)
+            return False
+        with src:
+            with open(output_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, self.chunk_size)
+        return True
+
+    def put(self, key, source_path):
+        """
+        Copies a finished output file into the cache
+
+        @param str key: A key made by make_key
+        @param str source_path: The file to store
+        @return str: Path of the cached file
+        """
+        path = self.write_entry(source_path, key)[0]
+        self.evict(path)
+        return path
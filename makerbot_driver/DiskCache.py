@@ -0,0 +1,161 @@
+"""
+The on disk side of the driver's file caches: a directory of entries,
+written to a temporary file and renamed into place so that several
+processes can share it, with least recently used entries evicted once the
+cache grows past max_size bytes.
+
+What an entry is keyed on, and how it is looked up, is left to the caches
+built on it, like ConversionCache and Firmware.HexCache.
+"""
+
+from __future__ import absolute_import
+
+import os
+import hashlib
+import logging
+import platform
+import tempfile
+
+
+def replace_file(source, dest):
+    """
+    Renames source over dest in one step, so that anyone opening dest sees
+    either the old file or the new one.  os.rename does that on POSIX, but
+    on Windows it will not replace an existing file, so MoveFileEx is used.
+    """
+    if platform.system() != "Windows":
+        os.rename(source, dest)
+        return
+    import ctypes
+    MOVEFILE_REPLACE_EXISTING = 0x1
+    MOVEFILE_WRITE_THROUGH = 0x8
+    if not ctypes.windll.kernel32.MoveFileExW(
+            unicode(source), unicode(dest), MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH):
+        raise ctypes.WinError()
+
+
+def _getcachedir(cache_dir, name):
+    if None is cache_dir:
+        cache_dir = os.path.join(
+            os.path.expanduser('~'), '.makerbot_driver', name)
+    return cache_dir
+
+
+class DiskCache(object):
+
+    chunk_size = 1024 * 1024
+    cache_name = None
+    # ^ Directory under ~/.makerbot_driver used when no cache_dir is given
+    hash_name = 'sha1'
+    temp_prefix = '.tmp-'
+
+    def __init__(self, cache_dir, max_size):
+        """
+        @param str cache_dir: Directory to keep cache entries in
+        @param int max_size: Size in bytes the cache is trimmed down to
+        """
+        self._log = logging.getLogger(self.__class__.__name__)
+        self.cache_dir = _getcachedir(cache_dir, self.cache_name)
+        self.max_size = max_size
+        if not os.path.isdir(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                # Another process may have just made it
+                if not os.path.isdir(self.cache_dir):
+                    raise
+
+    def hash_file(self, path):
+        """
+        @param str path: File to hash
+        @return str: Hex digest of the file's contents
+        """
+        digest = hashlib.new(self.hash_name)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), ''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def is_entry(self, name):
+        """ @return bool: True if a file name in cache_dir is a cache entry """
+        return not name.startswith(self.temp_prefix)
+
+    def write_entry(self, source_path, key=None):
+        """
+        Copies a file into the cache, replacing any entry with the same key
+
+        @param str source_path: The file to store
+        @param str key: The entry's key, or None to key it on the hex digest
+          of its contents
+        @return tuple: Path and key of the cache entry
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=self.temp_prefix)
+        try:
+            digest = hashlib.new(self.hash_name) if key is None else None
+            with os.fdopen(fd, 'wb') as dst:
+                with open(source_path, 'rb') as src:
+                    for chunk in iter(lambda: src.read(self.chunk_size), ''):
+                        if digest is not None:
+                            digest.update(chunk)
+                        dst.write(chunk)
+            if key is None:
+                key = digest.hexdigest()
+            path = self.get_path(key)
+            replace_file(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return path, key
+
+    def list_entries(self):
+        """
+        @return list: (mtime, size, path) for every entry, oldest first
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not self.is_entry(name):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Evicted by someone else in the meantime
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        return entries
+
+    def get_size(self):
+        return sum(size for mtime, size, path in self.list_entries())
+
+    def evict(self, keep=None):
+        """ Removes least recently used entries until the cache is no
+        bigger than max_size
+
+        @param str keep: Path of an entry never to remove, say the one just
+          stored even if it is bigger than max_size on its own
+        """
+        entries = self.list_entries()
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                self._log.debug('{"event":"cache_evict", "path":%s}', path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for mtime, size, path in self.list_entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
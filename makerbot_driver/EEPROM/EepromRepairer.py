@@ -79,6 +79,17 @@ class EepromRepairer(object):
             data = self.build_packed_data(length)
             self._flush_out_data(offset, data)
 
+    def restore_from_hex_file(self, hex_path):
+        """
+        Writes back an EEPROM saved to an Intel HEX file, say by
+        avrdude, leaving any gaps in the file alone
+
+        @param str hex_path: Path to the hexfile
+        """
+        image = makerbot_driver.IntelHex.parse_hex_file(hex_path)
+        for offset, data in image.get_segments():
+            self._flush_out_data(offset, data)
+
     def _flush_out_data(self, offset, data):
         try:
             self.s3g.write_to_EEPROM(offset, data)
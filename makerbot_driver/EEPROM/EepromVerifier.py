@@ -3,7 +3,6 @@ A utility to read and eeprom and discern its "goodness"
 """
 import json
 import os
-import re
 import struct
 import logging
 
@@ -97,28 +96,9 @@ class EepromVerifier(object):
         @return dict flags: A flag for each entry.  Initialized as true, and flipped to True
             when read
         """
-        hex_map = {}
-        flags = {}
-        regex = ":[0-9A-Fa-f]{2}([0-9A-Fa-f]{4})[0-9A-Fa-f]{2}([0-9A-Fa-f]*?)[0-9A-Fa-f]{2}$"
-        runner = 0
-        with open(hex_filepath) as f:
-            for line in f:
-                match = re.match(regex, line)
-                # A second group of 0 means theres no more info to read, so we need to break
-                if len(match.group(2)) == 0:
-                    break
-                # The hex file should have byte offsets in the beginning of the line we can check against
-                expected_offset = int('0x%s' % (match.group(1)), 16)
-                values = match.group(2)
-                assert(expected_offset == runner)
-                assert(len(values) % 2 == 0)
-                # Take all the bytes in this line and put them in a map
-                while len(values) > 0:
-                    byte = values[:2]
-                    hex_map[runner] = byte.upper()
-                    flags[runner] = False
-                    values = values[2:]
-                    runner += 1
+        self.hex_image = makerbot_driver.IntelHex.parse_hex_file(hex_filepath)
+        hex_map = self.hex_image.get_hex_map()
+        flags = dict.fromkeys(hex_map, False)
         return hex_map, flags
 
     def check_value_validity(self, value, constraints):
@@ -157,3 +157,24 @@ def unpack_response_with_string(format, data):
     output = unpack_response(format, data[0:struct.calcsize(format)])
     output += data[struct.calcsize(format):],
     return output
+
+
+def add_to_file_checksum(checksum, data):
+    """
+    Adds bytes to the 16 bit sum used as an s3g file's checksum
+    @param int checksum: Checksum of everything before data
+    @param data: The bytes to add
+    @return int: The new checksum
+    """
+    return (checksum + sum(bytearray(data))) % 65536
+
+
+def encode_file_checksum(checksum):
+    """
+    Encode an s3g file's checksum as the trailer written at the end of it.
+    The trailer has always been written with bytes(), which in python 2
+    is the checksum in decimal.
+    @param int checksum: The file's checksum
+    @return string: The trailer
+    """
+    return bytes(checksum)
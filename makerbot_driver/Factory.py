@@ -19,14 +19,75 @@ def create_parser(machine_name, legacy=False):
     return parser
 
 
-def create_print_to_file_parser(filename, machine_name, legacy=False):
+def create_print_to_file_parser(filename, machine_name, legacy=False, buffer_size=0):
     parser = create_parser(machine_name, legacy)
     parser.s3g = makerbot_driver.s3g()
     condition = threading.Condition()
-    parser.s3g.writer = makerbot_driver.Writer.FileWriter(open(filename, 'wb'), condition)
+    parser.s3g.writer = makerbot_driver.Writer.FileWriter(
+        open(filename, 'wb'), condition, buffer_size=buffer_size)
     return parser
 
 
+def create_print_to_memory_parser(machine_name, legacy=False):
+    """ Creates a parser whose s3g collects the payloads in a MemoryWriter """
+    parser = create_parser(machine_name, legacy)
+    parser.s3g = makerbot_driver.s3g()
+    parser.s3g.writer = makerbot_driver.Writer.MemoryWriter(threading.Condition())
+    return parser
+
+
+def create_print_to_pipe_parser(pipe, machine_name, legacy=False, closefd=True):
+    """ Creates a parser whose s3g streams the payloads to a PipeWriter
+
+    @param pipe: A file descriptor, or an object with a write method
+    """
+    parser = create_parser(machine_name, legacy)
+    parser.s3g = makerbot_driver.s3g()
+    parser.s3g.writer = makerbot_driver.Writer.PipeWriter(
+        pipe, threading.Condition(), closefd=closefd)
+    return parser
+
+
+def convert_gcode_file(input_path, output_path, machine_name, print_to_file_type='s3g', processors=None, cache=None, legacy=False):
+    """
+    Converts a gcode file into an s3g/x3g file, optionally running processors
+    over the gcode first.
+
+    @param str input_path: The gcode file to convert
+    @param str output_path: Where to write the s3g/x3g file
+    @param str machine_name: Name of the machine profile to use
+    @param str print_to_file_type: 's3g' or 'x3g'
+    @param processors: A list of processor names, or a comma separated string
+    @param ConversionCache cache: If given, a cached result is reused,
+      and a new result is stored
+    @return str: output_path, which a cache hit is copied to
+    """
+    if cache is not None:
+        profile = makerbot_driver.Profile(machine_name)
+        key = cache.make_key(input_path, processors, profile, print_to_file_type, legacy)
+        if cache.get_copy(key, output_path):
+            return output_path
+    parser = create_print_to_file_parser(
+        output_path, machine_name, legacy,
+        buffer_size=makerbot_driver.Writer.FileWriter.default_buffer_size)
+    parser.s3g.set_print_to_file_type(print_to_file_type)
+    try:
+        with open(input_path) as f:
+            gcodes = f
+            if processors:
+                gcodes = list(gcodes)
+                factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+                for processor in factory.get_processors(processors, parser.state.profile):
+                    gcodes = processor.process_gcode(gcodes)
+            for line in gcodes:
+                parser.execute_line(line)
+    finally:
+        parser.s3g.writer.close()
+    if cache is not None:
+        cache.put(key, output_path)
+    return output_path
+
+
 def create_print_to_stream_parser(port, machine_name, legacy=False):
     parser = create_parser(machine_name, legacy)
     condition = threading.Condition()
@@ -4,15 +4,181 @@ A file parser that decodes an s3g file
 
 from __future__ import absolute_import
 
+import io
 import struct
 import logging
+import operator
 import os
+import multiprocessing
+
+try:
+    import numpy
+except ImportError:
+    # Only read_moves needs numpy
+    numpy = None
 
 import makerbot_driver
+from .constants import hostFormats, slaveFormats
+
+
+def compile_format(formats):
+    """Precompiles a list of parameter formats for decoding.  Runs of fixed
+    size parameters become a single struct, and each null terminated
+    string is represented by None.
+
+    @param list formats: Parameter formats, as in hostFormats
+    @return tuple: structs and Nones, in parameter order
+    """
+    segments = []
+    fixed = ''
+    for formatter in formats:
+        if formatter == 's':
+            if fixed:
+                segments.append(struct.Struct('<' + fixed))
+                fixed = ''
+            segments.append(None)
+        else:
+            fixed += formatter
+    if fixed:
+        segments.append(struct.Struct('<' + fixed))
+    return tuple(segments)
+
+
+def compile_formats(formats):
+    """
+    @param dict formats: Parameter formats, keyed by command
+    @return list: 256 entries, indexed by command, holding compile_format
+      of that command's formats, or None if it has none
+    """
+    table = [None] * 256
+    for cmd, f in formats.items():
+        table[cmd] = compile_format(f)
+    return table
+
+
+def build_command_decoders():
+    """Builds the dispatch table used to validate and parse commands.
+
+    @return list: 256 entries, indexed by command.  Invalid commands are
+      None, valid ones a callable that takes the FileReader and parses the
+      rest of that command's payload.
+    """
+    decoders = [None] * 256
+    tool_action = makerbot_driver.host_action_command_dict['TOOL_ACTION_COMMAND']
+    for cmd in makerbot_driver.slave_action_command_dict.values() + \
+            makerbot_driver.host_action_command_dict.values():
+        if cmd == tool_action:
+            decoders[cmd] = operator.methodcaller('ParseToolAction', cmd)
+        else:
+            decoders[cmd] = operator.methodcaller('ParseHostAction', cmd)
+    return decoders
+
+_command_decoders = build_command_decoders()
+_tool_action_command = makerbot_driver.host_action_command_dict['TOOL_ACTION_COMMAND']
+_host_segments = compile_formats(hostFormats)
+_slave_segments = compile_formats(slaveFormats)
+
+
+def get_payload_sizes(segments_table):
+    """
+    @param list segments_table: Made by compile_formats
+    @return list: 256 entries, indexed by command, holding the size of that
+      command's payload, or None if it has none or it is not fixed
+    """
+    sizes = [None] * 256
+    for cmd, segments in enumerate(segments_table):
+        if segments is not None and None not in segments and \
+                cmd != _tool_action_command:
+            sizes[cmd] = 1 + sum(segment.size for segment in segments)
+    return sizes
+
+_payload_sizes = get_payload_sizes(_host_segments)
+
+
+def get_payload_structs(segments_table):
+    """
+    @param list segments_table: Made by compile_formats
+    @return list: 256 entries, indexed by command, holding the one struct
+      that decodes all of the command's parameters, or None for commands
+      with strings, no parameters or a slave command
+    """
+    structs = [None] * 256
+    for cmd, segments in enumerate(segments_table):
+        if segments is not None and len(segments) == 1 and \
+                segments[0] is not None and cmd != _tool_action_command:
+            structs[cmd] = segments[0]
+    return structs
+
+_payload_structs = get_payload_structs(_host_segments)
+
+
+def _decode_chunk(chunk):
+    """Worker process entry point for FileReader.read_file_parallel
+
+    @param tuple chunk: Path of the s3g file, and the offsets of the first
+      byte of the chunk and the byte after it
+    @return list: The chunk's payloads
+    """
+    path, start, end = chunk
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    reader = FileReader()
+    reader.file = io.BytesIO(data)
+    return list(reader.iter_payloads())
+
+if numpy is not None:
+    move_dtype = numpy.dtype([
+        ('number', '<u4'),  # Position of the command in the file
+        ('command', 'u1'),
+        ('x', '<i4'),
+        ('y', '<i4'),
+        ('z', '<i4'),
+        ('a', '<i4'),
+        ('b', '<i4'),
+        ('dda', '<u4'),  # dda rate, or duration in us for command 142
+        ('flags', 'u1'),  # Relative axes bitfield
+        ('distance', '<f4'),  # mm, command 155 only
+        ('feedrate', '<f4'),  # mm/s, command 155 only
+    ])
+    # ^ One row of the array returned by FileReader.read_moves
+
+    _position_fields = [('cmd', 'u1'), ('x', '<i4'), ('y', '<i4'),
+                        ('z', '<i4'), ('a', '<i4'), ('b', '<i4'), ('dda', '<u4')]
+    _move_record_dtypes = {
+        139: numpy.dtype(_position_fields),
+        142: numpy.dtype(_position_fields + [('flags', 'u1')]),
+        155: numpy.dtype(_position_fields + [
+            ('flags', 'u1'), ('distance', '<f4'), ('feedrate', '<i2')]),
+    }
+    # ^ The packed layout of each move command, as in hostFormats
+
+
+def make_moves(records, number):
+    """Converts raw move records of one command into move_dtype rows
+
+    @param records: numpy array of one of the _move_record_dtypes
+    @param int number: The command number of the first record
+    @return: numpy array of move_dtype
+    """
+    moves = numpy.zeros(len(records), move_dtype)
+    moves['number'] = numpy.arange(number, number + len(records))
+    for field in records.dtype.names:
+        if field == 'cmd':
+            moves['command'] = records['cmd']
+        elif field == 'feedrate':
+            # Sent as 64ths of a mm/s
+            moves['feedrate'] = records['feedrate'] / 64.0
+        else:
+            moves[field] = records[field]
+    return moves
 
 
 class FileReader(object):
 
+    read_buffer_size = 1024 * 1024
+    # ^ Number of bytes iter_payloads reads from the file at once
+
     def __init__(self):
         self._log = logging.getLogger(self.__class__.__name__)
         self.bytesread = 0
@@ -64,9 +230,7 @@ class FileReader(object):
         except makerbot_driver.FileReader.InsufficientDataError:
             raise makerbot_driver.FileReader.EndOfFileError
 
-        # TODO: Break the tool action commands out of here
-        if (not cmd in makerbot_driver.slave_action_command_dict.values()) and \
-           (not cmd in makerbot_driver.host_action_command_dict.values()):
+        if _command_decoders[cmd] is None:
             self._log.debug('{"event":"bad_read_command", "command":%s}', cmd)
             raise makerbot_driver.FileReader.BadCommandError(cmd)
 
@@ -133,11 +297,7 @@ class FileReader(object):
         @return list: a list of the cmd and  all information associated with that command
         """
         cmd = self.GetNextCommand()
-        if cmd == makerbot_driver.host_action_command_dict['TOOL_ACTION_COMMAND']:
-            params = self.ParseToolAction(cmd)
-        else:
-            params = self.ParseHostAction(cmd)
-        return [cmd] + params
+        return [cmd] + _command_decoders[cmd](self)
 
     def ReadFile(self, callback=None):
         """Reads from an s3g file until it cant read anymore
@@ -167,3 +327,407 @@ class FileReader(object):
         except makerbot_driver.FileReader.EndOfFileError:
             self._log.debug('{"event":"done_reading_file"}')
             return payloads
+
+    def iter_payloads(self, callback=None):
+        """Decodes the s3g file one payload at a time.  The file is read
+        in read_buffer_size blocks, and each command is decoded with the
+        structs precompiled for it, so memory use does not grow with the
+        size of the file.
+
+        Decoding starts at the file's current position, and bytesread
+        is kept as the offset in the file just past the last payload.
+        Since the file is read ahead, its own position is left past that.
+
+        @param callback: Called with the percent read whenever it changes
+        @return generator: Payloads, as returned by ParseNextPayload
+        """
+        structs = _payload_structs
+        for offset, cmd, raw in self._iter_commands(callback):
+            payload_struct = structs[cmd]
+            if payload_struct is None:
+                yield self._decode_raw_payload(cmd, raw)
+            else:
+                payload = [cmd]
+                payload.extend(payload_struct.unpack_from(raw, 1))
+                yield payload
+
+    def iter_raw_payloads(self, callback=None):
+        """Splits the s3g file into its raw payloads, without decoding them.
+        Only the length of each parameter is used, so a payload can be
+        framed and sent to a machine as it is.
+
+        @param callback: Called with the percent read whenever it changes
+        @return generator: Payloads, as strings of bytes
+        """
+        for offset, cmd, raw in self._iter_commands(callback):
+            yield raw
+
+    def scan_boundaries(self, chunk_size):
+        """Finds command boundaries that split the rest of the file into
+        chunks of about chunk_size bytes.  Only the lengths of commands are
+        looked at, which for most commands is a single table lookup.
+
+        @param int chunk_size: Size of the chunks wanted, in bytes
+        @return list: File offsets of the boundaries, starting with the
+          current position and ending with the end of the file
+        """
+        boundaries = []
+        next_boundary = None
+        end = None
+        for offset, cmd, raw in self._iter_commands():
+            if next_boundary is None:
+                boundaries.append(offset)
+                next_boundary = offset + chunk_size
+            end = offset + len(raw)
+            if end >= next_boundary:
+                boundaries.append(end)
+                next_boundary = end + chunk_size
+        if not boundaries:
+            # No commands left, bytesread is where the file was left
+            boundaries.append(self.bytesread)
+        elif end > boundaries[-1]:
+            boundaries.append(end)
+        return boundaries
+
+    def _iter_commands(self, callback=None):
+        """Splits the rest of the file into its raw commands, reading it in
+        read_buffer_size blocks.  Only the lengths of parameters are looked
+        at, which for fixed size commands is a single table lookup.
+
+        bytesread is kept as the offset in the file just past the last
+        command.
+
+        @param callback: Called with the percent read whenever it changes
+        @return generator: (offset, cmd, raw) for each command, where offset
+          is the command's offset in the file and raw the whole payload
+        """
+        totalsize = self._start_buffering()
+        current_percent = -1
+        sizes = _payload_sizes
+        buf = self._buffer
+        pos = 0
+        while True:
+            if pos >= len(buf):
+                pos = self._fill_buffer(pos, 1)
+                buf = self._buffer
+                if pos >= len(buf):
+                    break
+            offset = self._buffer_offset + pos
+            cmd = ord(buf[pos])
+            size = sizes[cmd]
+            if size is not None and pos + size <= len(buf):
+                end = pos + size
+                raw = buf[pos:end]
+                pos = end
+            else:
+                # Variable size, or not all read yet
+                raw, pos = self._split_payload(pos)
+                buf = self._buffer
+            self.bytesread = self._buffer_offset + pos
+            if callback is not None:
+                percent = int(self.bytesread / totalsize * 100)
+                if percent != current_percent:
+                    current_percent = percent
+                    callback(percent)
+            yield offset, cmd, raw
+        self._buffer = ''
+        self._log.debug('{"event":"done_reading_file"}')
+
+    def read_file_parallel(self, callback=None, worker_count=None, chunk_size=4 * 1024 * 1024):
+        """Decodes the rest of the s3g file in a pool of worker processes.
+        The file is split into chunks at command boundaries by
+        scan_boundaries, and each chunk is decoded by a worker.
+
+        The file has to be a real file with a name, or it is decoded here
+        like iter_payloads would.
+
+        @param callback: Called with the percent decoded whenever a chunk is done
+        @param int worker_count: Size of the pool, None for one per cpu
+        @param int chunk_size: Size of the chunks handed to workers, in bytes
+        @return list: The payloads, in file order, as ReadFile returns them
+        """
+        path = getattr(self.file, 'name', None)
+        if not isinstance(path, basestring) or not os.path.isfile(path):
+            return list(self.iter_payloads(callback))
+        boundaries = self.scan_boundaries(chunk_size)
+        chunks = [(path, start, end) for start, end in zip(boundaries, boundaries[1:])]
+        if len(chunks) < 2:
+            self.file.seek(boundaries[0])
+            return list(self.iter_payloads(callback))
+        payloads = []
+        pool = multiprocessing.Pool(worker_count)
+        try:
+            for done, chunk_payloads in enumerate(pool.imap(_decode_chunk, chunks)):
+                payloads.extend(chunk_payloads)
+                if callback is not None:
+                    callback(int(100.0 * (done + 1) / len(chunks)))
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        self.bytesread = boundaries[-1]
+        return payloads
+
+    def read_moves(self, callback=None):
+        """Decodes the s3g file into a numpy structured array of its moves
+        (QUEUE_EXTENDED_POINT, QUEUE_EXTENDED_POINT_NEW and
+        QUEUE_EXTENDED_POINT_ACCELERATED), with every other command kept in
+        a side table.  Runs of the same move command are decoded by numpy
+        in one go, without building a python object per move.
+
+        Needs numpy.
+
+        @param callback: Called with the percent read whenever it changes
+        @return tuple: (moves, others).  moves is an array of move_dtype,
+          others a list of (number, payload) for every other command, where
+          number is the command's position in the file.
+        """
+        if numpy is None:
+            raise ImportError('read_moves needs numpy')
+        totalsize = self._start_buffering()
+        current_percent = -1
+        runs = []
+        others = []
+        number = 0
+        pos = 0
+        while True:
+            if pos >= len(self._buffer):
+                pos = self._fill_buffer(pos, 1)
+                if pos >= len(self._buffer):
+                    break
+            cmd = ord(self._buffer[pos])
+            record_dtype = _move_record_dtypes.get(cmd)
+            if record_dtype is None:
+                raw, pos = self._split_payload(pos)
+                others.append((number, self._decode_raw_payload(cmd, raw)))
+                number += 1
+            else:
+                size = record_dtype.itemsize
+                if len(self._buffer) - pos < size:
+                    pos = self._fill_buffer(pos, size)
+                    if len(self._buffer) < size:
+                        self._log.debug('{"event":"insufficient_data"}')
+                        raise makerbot_driver.FileReader.InsufficientDataError
+                # Find the end of this run of records within the buffer
+                start = pos
+                code = self._buffer[pos]
+                end = len(self._buffer) - size
+                while pos <= end and self._buffer[pos] == code:
+                    pos += size
+                count = (pos - start) // size
+                runs.append(make_moves(numpy.frombuffer(
+                    self._buffer, record_dtype, count, start), number))
+                number += count
+            self.bytesread = self._buffer_offset + pos
+            if callback is not None:
+                percent = int(self.bytesread / totalsize * 100)
+                if percent != current_percent:
+                    current_percent = percent
+                    callback(percent)
+        self._buffer = ''
+        if runs:
+            moves = numpy.concatenate(runs)
+        else:
+            moves = numpy.zeros(0, move_dtype)
+        return moves, others
+
+    def _start_buffering(self):
+        """Gets ready to decode through the read buffer, from the file's
+        current position
+
+        @return float: The size of the file, or 1 if it is not known
+        """
+        try:
+            self._buffer_offset = self.file.tell()
+        except (AttributeError, IOError):
+            self._buffer_offset = 0
+        try:
+            totalsize = float(os.stat(self.file.name).st_size) or 1
+        except (AttributeError, OSError):
+            # In memory files have no name, but can be measured
+            try:
+                self.file.seek(0, os.SEEK_END)
+                totalsize = float(self.file.tell()) or 1
+                self.file.seek(self._buffer_offset)
+            except (AttributeError, IOError):
+                totalsize = 1
+        self.bytesread = self._buffer_offset
+        self._buffer = ''
+        self._log.debug('{"event":"reading_bytes_from_file", "file":%s}',
+                        str(self.file))
+        return totalsize
+
+    def _decode_raw_payload(self, cmd, raw):
+        """Decodes a payload split off by _split_payload, which has already
+        checked its commands are valid
+
+        @param int cmd: The payload's command
+        @param str raw: The whole payload
+        @return list: The payload, as returned by ParseNextPayload
+        """
+        payload = [cmd]
+        pos = self._decode_segments(_host_segments[cmd], raw, 1, payload)
+        if cmd == _tool_action_command:
+            self._decode_segments(_slave_segments[payload[2]], raw, pos, payload)
+        return payload
+
+    def seek_command(self, index, number):
+        """Positions the file in front of a command
+
+        @param S3gIndex index: The file's index
+        @param int number: The command number, counting from 0
+        @return IndexEntry: The state in front of the command
+        """
+        return self._seek(index.find_command(number),
+                          lambda n, offset, state: n >= number)
+
+    def seek_z(self, index, z):
+        """Positions the file in front of the first command that moves
+        Z to z or above, which is usually the start of a layer
+
+        @param S3gIndex index: The file's index
+        @param int z: The Z position, in steps
+        @return IndexEntry: The state in front of the command
+        """
+        return self._seek(index.find_z(z),
+                          lambda n, offset, state: state[0] >= z)
+
+    def seek_percent(self, index, percent):
+        """Positions the file in front of the first command at or past a
+        percentage of its size
+
+        @param S3gIndex index: The file's index
+        @param float percent: How far into the file, from 0 to 100
+        @return IndexEntry: The state in front of the command
+        """
+        target = int(index.source_size * percent / 100.0)
+        return self._seek(index.find_offset(target),
+                          lambda n, offset, state: offset >= target)
+
+    def _seek(self, entry, stop):
+        """Decodes forward from an index entry, and stops in front of the
+        first command for which stop is true
+
+        @param IndexEntry entry: Where to start decoding
+        @param stop: Called with the number and offset of each command and
+          the state after it
+        @return IndexEntry: The state in front of the command stopped at
+        """
+        if entry is None:
+            raise makerbot_driver.FileReader.EndOfFileError
+        self.file.seek(entry.offset)
+        number = entry.number
+        state = tuple(entry[3:])
+        while True:
+            offset = self.file.tell()
+            payload = self.ParseNextPayload()
+            next_state = makerbot_driver.FileReader.advance_state(payload, state)
+            if stop(number, offset, next_state):
+                self.file.seek(offset)
+                return makerbot_driver.FileReader.IndexEntry(
+                    offset, number, payload[0], *state)
+            number += 1
+            state = next_state
+
+    def _fill_buffer(self, pos, count):
+        """Drops the consumed part of the buffer and reads from the file
+        until at least count unconsumed bytes are buffered, or the file ends
+
+        @param int pos: Position of the first unconsumed byte
+        @param int count: Number of unconsumed bytes wanted
+        @return int: The new position of the first unconsumed byte, always 0
+        """
+        data = self._buffer[pos:]
+        self._buffer_offset += pos
+        while len(data) < count:
+            block = self.file.read(max(self.read_buffer_size, count - len(data)))
+            if not block:
+                break
+            data += block
+        self._buffer = data
+        return 0
+
+    def _split_payload(self, start):
+        """Finds the end of the payload at a buffer position, reading more
+        of the file as needed
+
+        @param int start: Buffer position of the command
+        @return tuple: The raw payload, and the buffer position after it
+        """
+        cmd = ord(self._buffer[start])
+        segments = _host_segments[cmd]
+        if segments is None:
+            if _command_decoders[cmd] is not None:
+                self._log.debug(
+                    '{"event":"bad_host_command", "bad_command":%s}', cmd)
+                raise makerbot_driver.FileReader.BadHostCommandError(cmd)
+            self._log.debug('{"event":"bad_read_command", "command":%s}', cmd)
+            raise makerbot_driver.FileReader.BadCommandError(cmd)
+        start, length = self._measure_segments(segments, start, 1)
+        if cmd == _tool_action_command:
+            # TOOL_ACTION_COMMAND is followed by the tool index and the
+            # slave command
+            slave_cmd = ord(self._buffer[start + 2])
+            segments = _slave_segments[slave_cmd]
+            if segments is None:
+                self._log.debug(
+                    '{"event":"bad_slave_cmd", "bad_cmd":%s}', slave_cmd)
+                raise makerbot_driver.FileReader.BadSlaveCommandError(slave_cmd)
+            start, length = self._measure_segments(segments, start, length)
+        end = start + length
+        return self._buffer[start:end], end
+
+    def _measure_segments(self, segments, start, length):
+        """Measures precompiled parameters in the buffer.  Unlike
+        _decode_segments, the whole payload is kept in the buffer.
+
+        @param tuple segments: Made by compile_format
+        @param int start: Buffer position of the payload
+        @param int length: Length of the payload up to the parameters
+        @return tuple: The payload's buffer position, which moves if more of
+          the file is read, and its length after the parameters
+        """
+        for segment in segments:
+            if segment is None:
+                limit = makerbot_driver.maximum_payload_length
+                end = self._buffer.find('\x00', start + length, start + length + limit)
+                while end == -1 and len(self._buffer) - start - length < limit:
+                    available = len(self._buffer) - start
+                    start = self._fill_buffer(start, length + limit)
+                    if len(self._buffer) == available:
+                        self._log.debug('{"event":"insufficient_data"}')
+                        raise makerbot_driver.FileReader.InsufficientDataError
+                    end = self._buffer.find('\x00', start + length, start + length + limit)
+                if end == -1:
+                    self._log.debug('{"event":"string_too_long"}')
+                    raise makerbot_driver.FileReader.StringTooLongError
+                length = end + 1 - start
+            else:
+                length += segment.size
+                if len(self._buffer) - start < length:
+                    start = self._fill_buffer(start, length)
+                    if len(self._buffer) < length:
+                        self._log.debug('{"event":"insufficient_data"}')
+                        raise makerbot_driver.FileReader.InsufficientDataError
+        return start, length
+
+    def _decode_segments(self, segments, raw, pos, payload):
+        """Decodes precompiled parameters from a whole payload
+
+        @param tuple segments: Made by compile_format
+        @param str raw: The whole payload
+        @param int pos: Position of the first parameter in raw
+        @param list payload: Decoded parameters are appended to this
+        @return int: Position after the last parameter
+        """
+        for segment in segments:
+            if segment is None:
+                end = raw.index('\x00', pos)
+                payload.append(raw[pos:end])
+                pos = end + 1
+            else:
+                payload.extend(segment.unpack_from(raw, pos))
+                pos += segment.size
+        return pos
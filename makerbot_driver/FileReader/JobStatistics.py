@@ -0,0 +1,138 @@
+"""
+Job statistics for s3g/x3g files, gathered in a single streaming pass so
+that memory use does not depend on the size of the file.
+"""
+
+from __future__ import absolute_import
+
+import makerbot_driver
+
+_axes = ['X', 'Y', 'Z', 'A', 'B']
+
+
+def analyze_s3g_file(s3g_file, profile=None, callback=None):
+    """
+    Streams an s3g/x3g file through a FileReader and gathers statistics
+    about the job.  Positions are tracked from the start of the file, which
+    is assumed to be at 0 on every axis.
+
+    @param file s3g_file: The s3g file, opened in binary mode
+    @param Profile profile: If given, used to convert steps into mm
+    @param callback: Called with the percent read whenever it changes
+    @return dict: With the keys
+        command_counts: number of times each command code is used
+        command_count: number of commands in the file
+        bounding_box_steps: (min, max) of the X, Y and Z axes' move targets,
+          or None if there are no moves
+        extrusion_steps: net steps moved on the A and B axes, which drive
+          tool 0 and tool 1
+        tool_changes: number of CHANGE_TOOL commands that change the tool
+        estimated_time: seconds, from the moves' DDA rates and durations
+          and any delays.  Acceleration and waits for heating are not
+          accounted for.
+      and with a profile, also bounding_box_mm and extrusion_mm
+    """
+    reader = makerbot_driver.FileReader.FileReader()
+    reader.file = s3g_file
+    counts = [0] * 256
+    position = [0, 0, 0, 0, 0]
+    minimums = None
+    maximums = None
+    extrusion = [0, 0]
+    tool = None
+    tool_changes = 0
+    microseconds = 0.0
+    seconds = 0.0
+    change_tool = makerbot_driver.host_action_command_dict['CHANGE_TOOL']
+    delay = makerbot_driver.host_action_command_dict['DELAY']
+    set_position = makerbot_driver.host_action_command_dict['SET_EXTENDED_POSITION']
+    for payload in reader.iter_payloads(callback):
+        cmd = payload[0]
+        counts[cmd] += 1
+        if cmd in makerbot_driver.FileReader.move_commands:
+            target = payload[1:6]
+            # QUEUE_EXTENDED_POINT is always absolute, the others carry a
+            # relative axes bitfield after the duration or dda rate
+            if cmd != 139 and payload[7]:
+                for i in range(5):
+                    if payload[7] & (1 << i):
+                        target[i] += position[i]
+            x, y, z, a, b = target
+            steps = max(abs(x - position[0]), abs(y - position[1]), abs(z - position[2]),
+                        abs(a - position[3]), abs(b - position[4]))
+            extrusion[0] += a - position[3]
+            extrusion[1] += b - position[4]
+            position = target
+            if minimums is None:
+                minimums = [x, y, z]
+                maximums = [x, y, z]
+            else:
+                if x < minimums[0]:
+                    minimums[0] = x
+                elif x > maximums[0]:
+                    maximums[0] = x
+                if y < minimums[1]:
+                    minimums[1] = y
+                elif y > maximums[1]:
+                    maximums[1] = y
+                if z < minimums[2]:
+                    minimums[2] = z
+                elif z > maximums[2]:
+                    maximums[2] = z
+            if cmd == 139:
+                # microseconds per step of the axis moving furthest
+                microseconds += payload[6] * steps
+            elif cmd == 142:
+                microseconds += payload[6]
+            elif payload[9] > 0:
+                # distance in mm, feedrate in 64ths of a mm/s
+                seconds += payload[8] * 64.0 / payload[9]
+            elif payload[6] > 0:
+                # steps per second of the axis moving furthest
+                seconds += float(steps) / payload[6]
+        elif cmd == set_position:
+            position = payload[1:6]
+        elif cmd == delay:
+            microseconds += payload[1]
+        elif cmd == change_tool:
+            if tool is not None and payload[1] != tool:
+                tool_changes += 1
+            tool = payload[1]
+    stats = {
+        'command_counts': dict((cmd, count) for cmd, count in enumerate(counts) if count),
+        'command_count': sum(counts),
+        'bounding_box_steps': None,
+        'extrusion_steps': dict(zip(_axes[3:], extrusion)),
+        'tool_changes': tool_changes,
+        'estimated_time': seconds + microseconds / 1000000.0,
+    }
+    if minimums is not None:
+        stats['bounding_box_steps'] = dict(
+            (axis, (low, high)) for axis, low, high in zip(_axes, minimums, maximums))
+    if profile is not None:
+        stats.update(convert_statistics_to_mm(stats, profile))
+    return stats
+
+
+def convert_statistics_to_mm(stats, profile):
+    """
+    @param dict stats: Made by analyze_s3g_file
+    @param Profile profile: The machine profile the job was made for
+    @return dict: bounding_box_mm and extrusion_mm
+    """
+    # Single extruder machines have no B axis, which is left out
+    steps_per_mm = dict(
+        (axis, float(values['steps_per_mm']))
+        for axis, values in profile.values['axes'].items())
+    mm_stats = {'bounding_box_mm': None}
+    if stats['bounding_box_steps'] is not None:
+        bounding_box = {}
+        for axis, (low, high) in stats['bounding_box_steps'].items():
+            low, high = low / steps_per_mm[axis], high / steps_per_mm[axis]
+            bounding_box[axis] = (min(low, high), max(low, high))
+        mm_stats['bounding_box_mm'] = bounding_box
+    mm_stats['extrusion_mm'] = dict(
+        (axis, steps / steps_per_mm[axis])
+        for axis, steps in stats['extrusion_steps'].items()
+        if axis in steps_per_mm)
+    return mm_stats
@@ -0,0 +1,221 @@
+"""
+A random access index for s3g files, kept in a sidecar file next to them.
+
+The index records, for every interval'th command, its offset in the file
+and the machine's Z, A and B positions and cumulative extrusion just before
+it runs.  FileReader.seek_command, seek_z and seek_percent jump to the
+nearest indexed command and decode forward from there, so they never
+decode more than interval commands.
+"""
+
+from __future__ import absolute_import
+
+import os
+import struct
+import bisect
+import logging
+import collections
+
+import makerbot_driver
+
+IndexEntry = collections.namedtuple(
+    'IndexEntry', ['offset', 'number', 'command', 'z', 'a', 'b', 'extrusion'])
+# ^ The state in front of a command: its offset and number in the file, its
+#   command code, the Z, A and B positions in steps and the net A plus B
+#   extrusion in steps so far
+
+move_commands = (139, 142, 155)
+# ^ QUEUE_EXTENDED_POINT, QUEUE_EXTENDED_POINT_NEW and QUEUE_EXTENDED_POINT_ACCELERATED
+_set_position_command = 140
+
+
+def advance_state(payload, state):
+    """
+    Works out the effect of a payload on a (z, a, b, extrusion) state
+
+    @param list payload: A payload, as returned by FileReader.ParseNextPayload
+    @param tuple state: The state before the payload
+    @return tuple: The state after the payload
+    """
+    cmd = payload[0]
+    if cmd in move_commands:
+        z, a, b, extrusion = state
+        # QUEUE_EXTENDED_POINT is always absolute, the others carry a
+        # relative axes bitfield after the duration or dda rate
+        relative = payload[7] if cmd != 139 else 0
+        z = z + payload[3] if relative & 0x04 else payload[3]
+        new_a = a + payload[4] if relative & 0x08 else payload[4]
+        new_b = b + payload[5] if relative & 0x10 else payload[5]
+        return (z, new_a, new_b, extrusion + (new_a - a) + (new_b - b))
+    elif cmd == _set_position_command:
+        return (payload[3], payload[4], payload[5], state[3])
+    return state
+
+
+def get_index_path(s3g_path):
+    """
+    @param str s3g_path: Path to an s3g file
+    @return str: Path to that file's sidecar index
+    """
+    return s3g_path + '.idx'
+
+
+class S3gIndex(object):
+
+    magic = 'S3GIDX'
+    version = 1
+    header_struct = struct.Struct('<6sBIIQd')
+    # ^ magic, version, interval, command count, source size, source mtime
+    entry_struct = struct.Struct('<QIBiiiq')
+    # ^ The fields of an IndexEntry
+
+    def __init__(self, interval=64, command_count=0, source_size=0, source_mtime=0):
+        """
+        @param int interval: Every interval'th command is indexed
+        @param int command_count: Number of commands in the s3g file
+        @param int source_size: Size of the s3g file, to spot stale indexes
+        @param float source_mtime: Modification time of the s3g file
+        """
+        self._log = logging.getLogger(self.__class__.__name__)
+        self.interval = interval
+        self.command_count = command_count
+        self.source_size = source_size
+        self.source_mtime = source_mtime
+        self.set_entries([])
+
+    def set_entries(self, entries):
+        """
+        @param list entries: IndexEntries, in file order
+        """
+        self.entries = entries
+        self._offsets = [entry.offset for entry in entries]
+        self._numbers = [entry.number for entry in entries]
+        # Z is not monotonic (z hops, or several objects printed one after
+        # the other), so Z searches go by the highest Z reached so far
+        self._max_zs = []
+        max_z = None
+        for entry in entries:
+            max_z = entry.z if max_z is None else max(max_z, entry.z)
+            self._max_zs.append(max_z)
+
+    @classmethod
+    def build(cls, s3g_path, interval=64, callback=None):
+        """
+        Decodes an s3g file to build its index
+
+        @param str s3g_path: The s3g file to index
+        @param int interval: Every interval'th command is indexed
+        @param callback: Called with the percent read whenever it changes
+        @return S3gIndex: The new index
+        """
+        stat = os.stat(s3g_path)
+        entries = []
+        state = (0, 0, 0, 0)
+        offset = 0
+        number = 0
+        reader = makerbot_driver.FileReader.FileReader()
+        with open(s3g_path, 'rb') as reader.file:
+            for payload in reader.iter_payloads(callback):
+                if number % interval == 0:
+                    entries.append(IndexEntry(offset, number, payload[0], *state))
+                state = advance_state(payload, state)
+                offset = reader.bytesread
+                number += 1
+        index = cls(interval, number, stat.st_size, stat.st_mtime)
+        index.set_entries(entries)
+        return index
+
+    @classmethod
+    def load(cls, index_path, s3g_path=None):
+        """
+        Reads an index file
+
+        @param str index_path: The index file to read
+        @param str s3g_path: If given, the s3g file the index has to match
+        @return S3gIndex: The index
+        """
+        with open(index_path, 'rb') as f:
+            data = f.read()
+        header_size = cls.header_struct.size
+        if len(data) < header_size:
+            raise makerbot_driver.FileReader.BadIndexError(index_path)
+        magic, version, interval, command_count, source_size, source_mtime = \
+            cls.header_struct.unpack_from(data)
+        entry_size = cls.entry_struct.size
+        if magic != cls.magic or version != cls.version or \
+                (len(data) - header_size) % entry_size:
+            raise makerbot_driver.FileReader.BadIndexError(index_path)
+        if s3g_path is not None:
+            stat = os.stat(s3g_path)
+            if stat.st_size != source_size or stat.st_mtime != source_mtime:
+                raise makerbot_driver.FileReader.StaleIndexError(index_path)
+        index = cls(interval, command_count, source_size, source_mtime)
+        index.set_entries([IndexEntry(*cls.entry_struct.unpack_from(data, pos))
+                           for pos in range(header_size, len(data), entry_size)])
+        return index
+
+    def save(self, index_path):
+        """
+        @param str index_path: Where to write the index
+        """
+        with open(index_path, 'wb') as f:
+            f.write(self.header_struct.pack(
+                self.magic, self.version, self.interval, self.command_count,
+                self.source_size, self.source_mtime))
+            for entry in self.entries:
+                f.write(self.entry_struct.pack(*entry))
+
+    @classmethod
+    def for_file(cls, s3g_path, interval=64, callback=None):
+        """
+        Loads the sidecar index of an s3g file, building (and saving) a
+        new one if it is missing or stale
+
+        @param str s3g_path: The s3g file
+        @param int interval: Every interval'th command is indexed, if the
+          index has to be built
+        @param callback: Called with the percent read while building
+        @return S3gIndex: The index
+        """
+        index_path = get_index_path(s3g_path)
+        try:
+            return cls.load(index_path, s3g_path)
+        except (IOError, makerbot_driver.FileReader.BadIndexError):
+            pass
+        index = cls.build(s3g_path, interval, callback)
+        try:
+            index.save(index_path)
+        except IOError as e:
+            # The index still works, it just has to be built again next time
+            index._log.info('{"event":"index_not_saved", "path":%s, "error":%s}',
+                            index_path, str(e))
+        return index
+
+    def find_command(self, number):
+        """
+        @param int number: A command number, counting from 0
+        @return IndexEntry: The last entry at or before that command, or
+          None if the index is empty
+        """
+        i = bisect.bisect_right(self._numbers, number)
+        return self.entries[i - 1] if i else None
+
+    def find_offset(self, offset):
+        """
+        @param int offset: An offset in the s3g file
+        @return IndexEntry: The last entry at or before that offset, or
+          None if the index is empty
+        """
+        i = bisect.bisect_right(self._offsets, offset)
+        return self.entries[i - 1] if i else None
+
+    def find_z(self, z):
+        """
+        @param int z: A Z position in steps
+        @return IndexEntry: The last entry before Z first reaches z, or
+          None if the index is empty
+        """
+        i = bisect.bisect_left(self._max_zs, z)
+        if not self.entries:
+            return None
+        return self.entries[max(i - 1, 0)]
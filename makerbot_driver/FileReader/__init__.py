@@ -1,5 +1,7 @@
-__all__ = ['FileReader', 'constants', 'errors']
+__all__ = ['FileReader', 'S3gIndex', 'JobStatistics', 'constants', 'errors']
 
 from FileReader import *
+from S3gIndex import *
+from JobStatistics import *
 from constants import *
 from errors import *
@@ -54,3 +54,16 @@ class BadHostCommandError(BadCommandError):
     A BadHostCommandError is thrown when a host command is encountered that we
     do not know about
     """
+
+
+class BadIndexError(Exception):
+    """
+    A BadIndexError is raised when an s3g index file can not be read.
+    """
+
+
+class StaleIndexError(BadIndexError):
+    """
+    A StaleIndexError is raised when an s3g index file was built from a
+    different version of the s3g file it is being used with.
+    """
@@ -0,0 +1,156 @@
+"""
+A content addressed, size bounded cache of firmware hex files, shared by
+every Uploader.
+
+Hex files are stored under the sha256 of their contents, and verified
+against it whenever they are handed out.  A small ref file per source url
+records which contents the url was last found to have, and for local
+sources the size and mtime they had, so a hex file is only downloaded or
+copied once however many machines it is flashed onto.  Storage and
+eviction of the hex files are left to DiskCache; refs to evicted hex files
+are left behind, and miss.
+"""
+
+from __future__ import absolute_import
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import makerbot_driver
+
+
+class HexCache(makerbot_driver.DiskCache):
+
+    cache_name = 'firmware_hex'
+    hash_name = 'sha256'
+    hex_extension = '.hex'
+    ref_extension = '.ref'
+
+    def __init__(self, cache_dir=None, max_size=64 * 1024 * 1024):
+        """
+        @param str cache_dir: Directory to keep hex files in
+        @param int max_size: Size in bytes the cache is trimmed down to
+        """
+        super(HexCache, self).__init__(cache_dir, max_size)
+
+    def get_path(self, digest):
+        return os.path.join(self.cache_dir, digest + self.hex_extension)
+
+    def is_entry(self, name):
+        return name.endswith(self.hex_extension) and super(HexCache, self).is_entry(name)
+
+    def get_ref_path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha1(url).hexdigest() + self.ref_extension)
+
+    def _get_source_stat(self, url):
+        """ @return list: size and mtime of a local source, or None for a
+        remote one """
+        if os.path.isfile(url):
+            stat = os.stat(url)
+            return [stat.st_size, stat.st_mtime]
+        return None
+
+    def get(self, url):
+        """
+        Looks up the hex file last stored for a url, making sure it is
+        intact and marking it as recently used
+
+        @param str url: Where the hex file comes from
+        @return str: Path of the cached hex file, or None on a miss
+        """
+        try:
+            with open(self.get_ref_path(url)) as f:
+                ref = json.load(f)
+        except (IOError, ValueError):
+            self._log.debug('{"event":"cache_miss", "url":%s}', url)
+            return None
+        if ref.get('url') != url or ref.get('source') != self._get_source_stat(url):
+            self._log.debug('{"event":"cache_stale", "url":%s}', url)
+            return None
+        path = self.get_path(ref['digest'])
+        if not self.verify(path, ref['digest']):
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        self._log.debug('{"event":"cache_hit", "url":%s}', url)
+        return path
+
+    def verify(self, path, digest):
+        """
+        Checks a cached hex file against its digest, removing it if it has
+        been damaged
+
+        @return bool: True if the file is there and intact
+        """
+        try:
+            actual = self.hash_file(path)
+        except IOError:
+            return False
+        if actual != digest:
+            self._log.warning('{"event":"cache_corrupt", "path":%s}', path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return False
+        return True
+
+    def put(self, url, source_path):
+        """
+        Copies a fetched hex file into the cache
+
+        @param str url: Where the hex file came from
+        @param str source_path: The fetched file
+        @return str: Path of the cached hex file
+        """
+        path, digest = self.write_entry(source_path)
+        ref = {'url': url, 'digest': digest, 'source': self._get_source_stat(url)}
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=self.temp_prefix)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(ref, f)
+        makerbot_driver.replace_file(temp_path, self.get_ref_path(url))
+        self.evict(path)
+        return path
+
+    def hold(self, path):
+        """
+        Makes a private link to a cached hex file, which evictions leave
+        alone, for as long as it is being uploaded.  The caller removes it
+        when done.
+
+        @param str path: A path returned by get or put
+        @return str: Path of the private link
+        """
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=self.temp_prefix, suffix=self.hex_extension)
+        os.close(fd)
+        os.remove(temp_path)
+        try:
+            os.link(path, temp_path)
+        except (AttributeError, OSError):
+            # No hard links on Windows under Python 2, or on some file systems
+            shutil.copyfile(path, temp_path)
+        return temp_path
+
+    def clear(self):
+        """ Removes refs along with the hex files """
+        for name in os.listdir(self.cache_dir):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+
+_hex_cache = None
+
+
+def get_hex_cache():
+    """ use a global singleton HexCache """
+    global _hex_cache
+    if _hex_cache is None:
+        _hex_cache = HexCache()
+    return _hex_cache
@@ -2,46 +2,110 @@ from __future__ import absolute_import
 
 import json
 import os
+import time
+import Queue
+import shutil
+import hashlib
 import subprocess
 import platform
 import urllib2
 import logging
 import urlparse
 import tempfile
+import threading
+import collections
 import serial
+from multiprocessing.pool import ThreadPool
 
 import makerbot_driver
+from makerbot_driver.DiskCache import replace_file
+
+
+UploadResult = collections.namedtuple('UploadResult', ['port', 'machine', 'pid', 'version', 'returncode', 'output', 'error', 'elapsed'])
+# ^ The outcome of uploading firmware to one port: avrdude's exit status and
+#   output, or the exception that stopped it running, and the seconds it took
 
 
 def _check_output(*popenargs, **kwargs):
     if 'stdout' in kwargs:
         raise ValueError('stdout argument not allowed, it will be overridden.')
+    timeout = kwargs.pop('timeout', None)
     process = subprocess.Popen(stdout=subprocess.PIPE, *popenargs, **kwargs)
-    output, unused_err = process.communicate()
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        try:
+            process.kill()
+        except OSError:
+            # It finished just in time
+            pass
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, kill)
+        timer.daemon = True
+        timer.start()
+    try:
+        output, unused_err = process.communicate()
+    finally:
+        if timer is not None:
+            timer.cancel()
     retcode = process.poll()
+    cmd = kwargs.get("args")
+    if cmd is None:
+        cmd = popenargs[0]
+    if timed_out.is_set():
+        raise makerbot_driver.Firmware.SubprocessTimeoutError(cmd, timeout, output)
     if retcode:
-        cmd = kwargs.get("args")
-        if cmd is None:
-            cmd = popenargs[0]
         e = subprocess.CalledProcessError(retcode, cmd)
         setattr(e, 'output', output)
         raise e
     return output
 
 
+def _getcachedir(source_url):
+    """ A directory of its own for each source, so that files with the
+    same name from different sources do not collide """
+    return os.path.join(
+        os.path.expanduser('~'), '.makerbot_driver', 'firmware',
+        hashlib.sha1(source_url).hexdigest()[:16])
+
+
 class Uploader(object):
     """ Firmware Uploader is used to send firmware to a 3D printer."""
 
-    def __init__(self, source_url=None, dest_path=None, autoUpdate=True, path_to_eeprom=None, avrdude_exe=None, avrdude_conf_file=None):
+    validators_extension = '.validators'
+    # ^ Sidecar file keeping a download's ETag and Last-Modified headers
+    flash_sizes = {
+        'm168': 16 * 1024,
+        'm328p': 32 * 1024,
+        'm644p': 64 * 1024,
+        'm1280': 128 * 1024,
+        'm2560': 256 * 1024,
+    }
+    # ^ Bytes of flash on the parts avrdude is told to program
+
+    def __init__(self, source_url=None, dest_path=None, autoUpdate=True, path_to_eeprom=None, avrdude_exe=None, avrdude_conf_file=None, fetch_workers=4, hex_cache=None):
         """Build an uploader.
         @param source_url: specify a url to fetch firmware metadata from. Can be a directory
-        @param dest_path: path to use as the local file store location
+        @param dest_path: path to use as the local file store location.  Files
+          kept there are only fetched again if the source has changed.
         @param autoUpdate: automatically and immedately fetch machine data
+        @param fetch_workers: number of files get_machine_json_files fetches at once
+        @param hex_cache: HexCache keeping downloaded hex files, the one
+          shared by every uploader if None
         """
         self._logger = logging.getLogger(self.__class__.__name__)
         self.product_filename = 'products.json'
         self.source_url = source_url if source_url else 'http://firmware.makerbot.com'
-        self.dest_path = dest_path if dest_path else tempfile.mkdtemp()
+        self.dest_path = dest_path if dest_path else _getcachedir(self.source_url)
+        self.fetch_workers = fetch_workers
+        self.hex_cache = hex_cache
+        self._lock = threading.Lock()
+        self._machine_json_paths = {}
+        # ^ machine name: local path of its json, once fetched
+        self._firmware_values = {}
+        # ^ machine name: values parsed out of its json
 
         self.run_subprocess = _check_output
         self.urlopen = urllib2.urlopen
@@ -82,58 +146,156 @@ class Uploader(object):
     def _pull_products(self):
         """
         Pulls the most recent products.json file and, using that
-        to update internal manchine lists and metadata
+        to update internal manchine lists and metadata.  Machine json
+        files are only fetched when a machine is asked about.
         """
         product_filename = self.pathjoin(
             self.source_url, self.product_filename)
         filename = self.wget(product_filename)
         #Assuming wget works, this shouldnt be a problem
         self.products = self.load_json_values(filename)
-        self.get_machine_json_files()
+        with self._lock:
+            self._machine_json_paths.clear()
+            self._firmware_values.clear()
 
     def get_machine_json_files(self):
         """
         Assuming a product.json file has been pulled and loaded,
-        explores that products.json file and wgets all machine json files.
+        explores that products.json file and fetches all machine json
+        files, a few at a time.
+        """
+        machines = list(self.products['ExtrusionPrintersV2'])
+        if not machines:
+            return
+        pool = ThreadPool(max(1, min(self.fetch_workers, len(machines))))
+        try:
+            pool.map(self.get_machine_json_file, machines)
+        finally:
+            pool.close()
+            pool.join()
+
+    def get_machine_json_file(self, machine):
         """
-        machines = self.products['ExtrusionPrintersV2']
-        for machine in machines:
-            f = self.products['ExtrusionPrintersV2'][machine]
+        Fetches a machine's json file, the first time it is asked for
+
+        @param str machine: The machine we want information about
+        @return str: local filename of the machine's json file
+        """
+        with self._lock:
+            path = self._machine_json_paths.get(machine)
+        if path is None:
             url = self.pathjoin(
                 self.source_url, self.products['ExtrusionPrintersV2'][machine])
-            self.wget(url)
+            path = self._fetch(url)
+            with self._lock:
+                self._machine_json_paths[machine] = path
+        return path
 
     def wget(self, url):
         """
         Gets a certain file from a url and copies it into
         the current working directory.  If the url is stored
         locally, we copy that file.  Otherwise we pull it from
-        the internets.
+        the internets.  Either way, a copy already in dest_path is
+        used as long as the source has not changed.
 
         @param str url: The url we want to wget
         @return file: local filename of the resource
         """
+        return self._fetch(url)
+
+    def _fetch(self, url):
         local_path = os.path.basename(url)
         local_path = os.path.join(self.dest_path, local_path)
+        if not os.path.isdir(self.dest_path):
+            try:
+                os.makedirs(self.dest_path)
+            except OSError:
+                # Another uploader may have just made it
+                if not os.path.isdir(self.dest_path):
+                    raise
         if os.path.isfile(url):
             if not url == local_path:
-                self._logger.info(
-                    '{"event":"copying_local_file", "file":%s}' % url)
-                import shutil
-                shutil.copy(url, local_path)
+                if self.is_fresh_copy(url, local_path):
+                    self._logger.debug(
+                        '{"event":"using_cached_file", "file":%s}' % url)
+                else:
+                    self._logger.info(
+                        '{"event":"copying_local_file", "file":%s}' % url)
+                    def copy(f):
+                        with open(url, 'rb') as source:
+                            shutil.copyfileobj(source, f)
+                    self._replace(local_path, copy)
+                    # The copy takes the source's mtime, freshness is judged by it
+                    shutil.copystat(url, local_path)
         else:
-            self._logger.info('{"event":"downloading_url", "url":%s}' % url)
-            try:
-                #Download the file
-                dl_file = self.urlopen(url)
-            except urllib2.URLError as e:
-                # Means we have no internet connection
-                raise e
-            #Write out the file
-            with open(local_path, 'w') as f:
-                f.write(dl_file.read())
+            self._download(url, local_path)
         return local_path
 
+    def is_fresh_copy(self, source_path, local_path):
+        """
+        @param str source_path: A local source file
+        @param str local_path: A copy of it
+        @return bool: True if the copy has the source's size and mtime
+        """
+        try:
+            source = os.stat(source_path)
+            local = os.stat(local_path)
+        except OSError:
+            return False
+        return source.st_size == local.st_size and source.st_mtime == local.st_mtime
+
+    def _download(self, url, local_path):
+        """
+        Downloads a url, asking the server to skip the body if the copy
+        already downloaded is still current
+        """
+        validators_path = local_path + self.validators_extension
+        validators = {}
+        if os.path.isfile(local_path) and os.path.isfile(validators_path):
+            try:
+                validators = self.load_json_values(validators_path)
+            except ValueError:
+                validators = {}
+        request = urllib2.Request(url)
+        if validators.get('ETag'):
+            request.add_header('If-None-Match', validators['ETag'])
+        if validators.get('Last-Modified'):
+            request.add_header('If-Modified-Since', validators['Last-Modified'])
+        self._logger.info('{"event":"downloading_url", "url":%s}' % url)
+        try:
+            #Download the file
+            dl_file = self.urlopen(request)
+        except urllib2.HTTPError as e:
+            if e.code == 304 and validators:
+                self._logger.debug('{"event":"using_cached_url", "url":%s}' % url)
+                return
+            raise e
+        except urllib2.URLError as e:
+            # Means we have no internet connection
+            raise e
+        #Write out the file
+        self._replace(local_path, lambda f: f.write(dl_file.read()))
+        headers = dl_file.info() if hasattr(dl_file, 'info') else {}
+        validators = dict((name, headers.get(name)) for name in ['ETag', 'Last-Modified'] if headers.get(name))
+        if validators:
+            self._replace(validators_path, lambda f: json.dump(validators, f))
+        elif os.path.isfile(validators_path):
+            os.remove(validators_path)
+
+    def _replace(self, path, write):
+        """ Writes a file next to path and renames it into place, so that
+        uploaders sharing dest_path never see half a file """
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+            temp_path = f.name
+            try:
+                write(f)
+            except Exception:
+                f.close()
+                os.remove(temp_path)
+                raise
+        replace_file(temp_path, path)
+
     def load_json_values(self, path):
         with open(path) as f:
             return json.load(f)
@@ -146,12 +308,13 @@ class Uploader(object):
         @param str machine: The machine we want information about
         @return dict values: The values parsed out of the machine board profile
         """
-        path = os.path.join(
-            self.dest_path,
-            self.products['ExtrusionPrintersV2'][machine],
-        )
-        path = os.path.normpath(path)
-        return self.load_json_values(path)
+        with self._lock:
+            values = self._firmware_values.get(machine)
+        if values is None:
+            values = self.load_json_values(self.get_machine_json_file(machine))
+            with self._lock:
+                self._firmware_values[machine] = values
+        return values
 
     def list_firmware_versions(self, machine, pid):
         """
@@ -186,9 +349,75 @@ class Uploader(object):
         except KeyError:
             raise makerbot_driver.Firmware.UnknownVersionError
         hex_file_url = self.pathjoin(self.source_url, hex_file)
-        hex_file_path = self.wget(hex_file_url)
+        return self.get_hex_file(hex_file_url, machine, pid)
+
+    def get_hex_file(self, url, machine=None, pid=None):
+        """
+        Fetches a hex file through the hex cache, so it is only downloaded
+        once however many machines it is uploaded to.  Fetched files are
+        checked with preflight_hex before they are cached.
+
+        @param str url: Where the hex file comes from
+        @param str machine: The machine it is for, if known
+        @param str pid: The pid it is for, if known
+        @return str: Path of the verified, cached copy
+        """
+        hex_cache = self.get_hex_cache()
+        hex_file_path = hex_cache.get(url)
+        if hex_file_path is None:
+            # Hex files are kept in the hex cache only, not in dest_path
+            local = os.path.isfile(url)
+            fetched = url if local else self._download_to_temp(url)
+            try:
+                self.preflight_hex(fetched, machine, pid)
+                hex_file_path = hex_cache.put(url, fetched)
+            finally:
+                if not local:
+                    os.remove(fetched)
         return hex_file_path
 
+    def get_hex_cache(self):
+        if self.hex_cache is None:
+            return makerbot_driver.Firmware.get_hex_cache()
+        return self.hex_cache
+
+    def _download_to_temp(self, url):
+        """
+        @return str: Path of a temporary file holding what url points to,
+          which the caller removes
+        """
+        self._logger.info('{"event":"downloading_url", "url":%s}' % url)
+        fd, temp_path = tempfile.mkstemp(suffix='.hex')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(self.urlopen(url).read())
+        except Exception:
+            os.remove(temp_path)
+            raise
+        return temp_path
+
+    def preflight_hex(self, filename, machine=None, pid=None):
+        """
+        Checks that a hex file is well formed, holds some firmware and fits
+        in the flash of the part it is for, before avrdude spends a minute
+        on it
+
+        @param str filename: The firmware we want to upload
+        @param str machine: The machine we are uploading to, if known
+        @param str pid: The pid of that machine, if known
+        @return HexImage: Contents of the hex file
+        """
+        image = makerbot_driver.IntelHex.parse_hex_file(filename)
+        if 0 == image.get_covered_count():
+            raise makerbot_driver.HexFileError(None, '%s holds no data' % (filename))
+        if None is not machine and None is not pid:
+            part = str(self.get_firmware_values(machine)['PID'][pid]['part'])
+            size = self.flash_sizes.get(part)
+            if None is not size and image.end > size:
+                raise makerbot_driver.HexFileError(
+                    None, '%s ends at 0x%X, past the end of the %s flash' % (filename, image.end, part))
+        return image
+
     def parse_avrdude_command(self, port, machine, pid, filename, local_avr=True):
         """
         Given a port, machine name, and firmware filename, parses out a command
@@ -254,20 +483,151 @@ class Uploader(object):
         @param str machine: The machine we are uploading to
         @param str filename: The firmware we want to upload
         """
+        try:
+            self._run_avrdude(port, machine, pid, filename)
+        except subprocess.CalledProcessError as e:
+            self._logger.error('avrdude failed: %s', e.output)
+            raise
+
+    def upload_firmware_all(self, jobs, worker_count=4, timeout=600.0):
+        """
+        Uploads firmware to many machines at once, running up to
+        worker_count avrdudes side by side.  Each hex file is fetched and
+        checked once, before any uploads start, however many machines it
+        goes to.  Only the first job for a port is run, later ones fail
+        with a DuplicatePortError.
+        Results come back as each upload finishes.
+
+        @param list jobs: (port, machine, pid, version) for each upload
+        @param int worker_count: Most uploads run at the same time
+        @param float timeout: Seconds an avrdude may run before it is
+          killed, or None to wait for as long as it takes
+        @return generator: An UploadResult for each job, in the order they finish
+        """
+        hex_cache = self.get_hex_cache()
+        hex_files = {}
+        # ^ (machine, pid, version): private link to the hex file, or the
+        #   error fetching it
+        pending = Queue.Queue()
+        failed = []
+        ports = set()
+        for port, machine, pid, version in jobs:
+            if port in ports:
+                # Two avrdudes can not flash one port at once
+                failed.append(UploadResult(port, machine, pid, version, None, None, makerbot_driver.Firmware.DuplicatePortError(port), 0.0))
+                continue
+            ports.add(port)
+            key = (machine, pid, version)
+            if key not in hex_files:
+                try:
+                    try:
+                        hex_files[key] = hex_cache.hold(self.download_firmware(machine, pid, version))
+                    except (IOError, OSError):
+                        # Evicted by another uploader before it could be held
+                        hex_files[key] = hex_cache.hold(self.download_firmware(machine, pid, version))
+                except Exception as e:
+                    hex_files[key] = e
+            if isinstance(hex_files[key], Exception):
+                failed.append(UploadResult(port, machine, pid, version, None, None, hex_files[key], 0.0))
+            else:
+                pending.put((port, machine, pid, version, hex_files[key]))
+        remaining = pending.qsize()
+        results = Queue.Queue()
+        stop = threading.Event()
+        lock = threading.Lock()
+        running = [min(worker_count, remaining)]
+        # ^ Workers that have not exited yet.  The last one out removes the
+        #   held hex files.
+
+        def release_hex_files():
+            for held in hex_files.values():
+                if not isinstance(held, Exception):
+                    try:
+                        os.remove(held)
+                    except OSError:
+                        pass
+
+        def upload():
+            try:
+                while not stop.is_set():
+                    try:
+                        port, machine, pid, version, filename = pending.get_nowait()
+                    except Queue.Empty:
+                        return
+                    start = time.time()
+                    returncode, output, error = None, None, None
+                    try:
+                        returncode, output = self.run_avrdude(port, machine, pid, filename, timeout, preflight=False)
+                    except Exception as e:
+                        error = e
+                    results.put(UploadResult(port, machine, pid, version, returncode, output, error, time.time() - start))
+            finally:
+                with lock:
+                    running[0] -= 1
+                    last = 0 == running[0]
+                if last:
+                    release_hex_files()
+
+        if 0 == remaining:
+            release_hex_files()
+        for i in range(min(worker_count, remaining)):
+            worker = threading.Thread(target=upload)
+            worker.daemon = True
+            worker.start()
+        try:
+            for result in failed:
+                yield result
+            while remaining:
+                result = results.get()
+                remaining -= 1
+                yield result
+        finally:
+            # Ports not started yet are dropped if the caller stops early,
+            # uploads already running are left to finish
+            stop.set()
+
+    def run_avrdude(self, port, machine, pid, filename, timeout=None, preflight=True):
+        """
+        Uploads a hex file to one machine, like upload_firmware, but hands
+        back avrdude's exit status and output rather than raising on a
+        failed upload.
+
+        @param float timeout: Seconds avrdude may run before it is killed
+        @param bool preflight: If True, the hex file is checked with
+          preflight_hex first.  Hex files from get_hex_file already have been.
+        @return tuple: avrdude's exit status and output
+        """
+        try:
+            return 0, self._run_avrdude(port, machine, pid, filename, timeout, preflight)
+        except subprocess.CalledProcessError as e:
+            self._logger.error('{"event":"avrdude_failed", "port":%s, "returncode":%i}', port, e.returncode)
+            return e.returncode, e.output
+
+    def _run_avrdude(self, port, machine, pid, filename, timeout=None, preflight=True):
+        """
+        Runs avrdude through run_subprocess, falling back on the external
+        avrdude if the local one can not be started
+
+        @return str: avrdude's output
+        """
         self._logger.info('{"event":"uploading_firmware", "port":%s, "machine":%s, "pid":%s, "filename":%s}', port, machine, pid, filename)
+        if preflight:
+            self.preflight_hex(filename, machine, pid)
         call = self.parse_avrdude_command(port, machine, pid, filename)
+        kwargs = {'stderr': subprocess.STDOUT}
+        if timeout is not None:
+            kwargs['timeout'] = timeout
         self.toggle_machine(port)
         try:
             try:
-                self._logger.info('{"event":"trying local avrdude"}')
-                output = self.run_subprocess(call, stderr=subprocess.STDOUT)
-                self._logger.debug('output=%r', output)
+                self._logger.info('{"event":"trying local avrdude", "port":%s}', port)
+                output = self.run_subprocess(call, **kwargs)
             except OSError:
-                self._logger.info('{"event":"trying external avrdude"}')
+                self._logger.info('{"event":"trying external avrdude", "port":%s}', port)
                 call = self.parse_avrdude_command(
                     port, machine, pid, filename, local_avr=False)
-                output = self.run_subprocess(call, stderr=subprocess.STDOUT)
-                self._logger.debug('output=%r', output)
-        except subprocess.CalledProcessError as e:
-            self._logger.error('avrdude failed: %s', e.output)
-            raise
+                output = self.run_subprocess(call, **kwargs)
+        except makerbot_driver.Firmware.SubprocessTimeoutError:
+            raise makerbot_driver.Firmware.UploadTimeoutError(port, timeout)
+        self._logger.debug('output=%r', output)
+        return output
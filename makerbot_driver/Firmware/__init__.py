@@ -1,4 +1,5 @@
-all = ['Uploader']
+all = ['Uploader', 'HexCache']
 
 from Uploader import *
+from HexCache import *
 from errors import *
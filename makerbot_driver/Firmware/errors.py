@@ -1,5 +1,47 @@
+import makerbot_driver
+
+
 class UnknownVersionError(KeyError):
     """
     An UnkonwnVersionError is thrown when a version is passed
     into Uploader.py that is not found in a specific machine profile
     """
+
+
+class UploadTimeoutError(Exception):
+    """
+    An UploadTimeoutError is thrown when avrdude takes too long to
+    upload firmware to a port, and is killed
+    """
+    def __init__(self, port, timeout):
+        self.port = port
+        self.timeout = timeout
+        self.value = {
+            'PORT': self.port,
+            'TIMEOUT': self.timeout
+        }
+
+
+class SubprocessTimeoutError(Exception):
+    """
+    A SubprocessTimeoutError is thrown when a subprocess run with a
+    timeout takes too long, and is killed
+    """
+    def __init__(self, cmd, timeout, output=None):
+        self.cmd = cmd
+        self.timeout = timeout
+        self.output = output
+        self.value = {
+            'CMD': self.cmd,
+            'TIMEOUT': self.timeout
+        }
+
+
+class DuplicatePortError(makerbot_driver.DuplicatePortError):
+    """
+    A DuplicatePortError is thrown when more than one upload is asked
+    of the same port at once
+    """
+
+    def __str__(self):
+        return 'more than one upload to %s' % (self.port)
@@ -4,26 +4,32 @@ import logging
 import time
 import struct
 
+import makerbot_driver
+
 
 class FileComplete(object):
     """
     Perform end of file tasks after gcode parsing is complete.
     """
 
+    chunk_size = 1024 * 1024
+
     def finish(self, s3g_file):
         """@param, name of an s3g file to checksum"""
-        s_file = open(s3g_file, 'r+b')
-        self.finish_fh(s_file)
+        with open(s3g_file, 'r+b') as s_file:
+            self.finish_fh(s_file)
 
     def finish_fh(self, s_file):
         """ @param s_file file handle to an s3g file to checksum"""
-        checksum = 0
-
-        byte = s_file.read(1)
-        while byte:
-            data = struct.unpack('>B', byte)
-            byte = s_file.read(1)
-            # we are using a 2byte checksum
-            checksum = (data[0] + checksum) % 65536
+        checksum = self.get_checksum(s_file)
         #add checksum to end of file
-        s_file.write(bytes(checksum))
+        s_file.write(makerbot_driver.Encoder.encode_file_checksum(checksum))
+
+    def get_checksum(self, s_file):
+        """ Sums the rest of a file, chunk_size bytes at a time
+        @param s_file file handle to an s3g file to checksum
+        @return int the 2 byte checksum """
+        checksum = 0
+        for chunk in iter(lambda: s_file.read(self.chunk_size), ''):
+            checksum = makerbot_driver.Encoder.add_to_file_checksum(checksum, chunk)
+        return checksum
@@ -11,6 +11,8 @@ class AbpProcessor(LineTransformProcessor):
     def __init__(self):
         super(AbpProcessor, self).__init__()
         self.is_bundleable = True
+        self.is_stateless = True
+        self.is_rebuildable = True
         self.code_map = {
             re.compile("[^;(]*[mM]106"): self._transform_m106,
             re.compile("[^;(]*[mM]107"): self._transform_m107,
@@ -13,6 +13,8 @@ class BundleProcessor(LineTransformProcessor):
         self.code_map = {}
         self.progress_processor = ProgressProcessor()
         self.do_progress = True
+        # Progress is computed over the whole output
+        self.is_streamable = False
         # Held here for testing purposes
         self._super_process_gcode = super(BundleProcessor, self).process_gcode
 
@@ -1,13 +1,23 @@
+"""
+Turns the fan on a couple of layers into the print (after the raft, if
+there is one), and off at the end, unless the gcode already has fan codes.
+
+The gcode is streamed through in a single pass.  Lines before the fan on
+location pass straight through; lines after it are held back until a fan
+code turns up (and the gcode is left as is) or the file ends.
+"""
 from __future__ import absolute_import
 import re
 
-from . import Processor
+from .LineTransformProcessor import LineTransformProcessor
 import makerbot_driver
 
 
-class FanProcessor(Processor):
+class FanProcessor(LineTransformProcessor):
 
     def __init__(self):
+        super(FanProcessor, self).__init__()
+        self.is_bundleable = True
         self.expected_raft_tag = "(<raftLayerEnd> </raftLayerEnd>)"
         self.raft_on = re.compile("\(\<setting\> raft Add_Raft,_Elevate_Nozzle,_Orbit: True \</setting\>\)")
         self.raft_end = re.compile("\(\<raftLayerEnd\> \<\/raftLayerEnd\>\)")
@@ -17,62 +27,74 @@ class FanProcessor(Processor):
         self.layer_count = 2 # Turn on fan at this layer AFTER The raft
         self.fan_on = "M126 T0 (Fan On)\n"
         self.fan_off = "M127 T0 (Fan Off)\n"
+        self.reset()
+
+    def reset(self):
+        """ Forget everything seen, ready for a new file """
+        self.held_codes = []
+        self.fan_codes_exist = False
+        self.fan_on_reached = False
+        self.raft = False
+        self.raft_ended = False
+        self.layers_seen = 0
+
+    def is_fan_code(self, code):
+        # The substring tests are much cheaper than the regex, and weed
+        # out nearly every line
+        return ('126' in code or '127' in code) and \
+            self.fan_codes.match(code) is not None
+
+    def is_raft_on(self, code):
+        return 'raft' in code and self.raft_on.match(code) is not None
 
-    def gather_stats(self, gcodes):
-        """
-        Iterate over all 
-        
-        @param list gcodes: List of gcodes to check
-        @return bool: True if codes exist, false otherwise
-        """
-        vals = {
-            'fan_codes_exist': False,
-            'raft': False
-        }
-        for code in gcodes:
-            if re.match(self.fan_codes, code):
-                vals['fan_codes_exist']= True
-            if re.match(self.raft_on, code):
-                vals['raft'] = True
-            if all(vals.values()):
-                break
-        return vals
+    def is_raft_end(self, code):
+        return code.startswith('(<raft') and self.raft_end.match(code) is not None
 
-    def get_raft_end_location(self, gcodes):
-        """
-        Separates the raft code from the rest of the GCodes. 
+    def is_layer_end(self, code):
+        return code.startswith('(</') and self.layer_end.match(code) is not None
 
-        @param list gcodes: List of gcodes to iterate over
-        @return dict: Hash table containing "raft" gcodes and "print" gcodes
-        """
-        location = len(gcodes)
-        for i in range(len(gcodes)):
-            if re.match(self.raft_end, gcodes[i]):
-                location = i+1 # +1 since this is the last code for the raft
-                break
-        return location 
+    def _transform_code(self, code):
+        """ Passes codes straight through up to the layer to turn the fan
+        on at, then holds them back until either a fan code is found or
+        the file ends
+        @param code: a single gcode line
+        @return a list of output codes, possibly empty """
+        if self.fan_codes_exist:
+            return [code]
+        counting_layers = not self.raft or self.raft_ended
+        if counting_layers and self.layers_seen >= self.layer_count:
+            self.fan_on_reached = True
+        if self.fan_on_reached:
+            self.held_codes.append(code)
+            if self.is_fan_code(code):
+                self.fan_codes_exist = True
+                return self._release_held_codes([])
+            return []
+        if self.is_fan_code(code):
+            self.fan_codes_exist = True
+        elif self.is_raft_on(code):
+            # Only layers after the raft count
+            self.raft = True
+            self.layers_seen = 0
+        elif counting_layers:
+            if self.is_layer_end(code):
+                self.layers_seen += 1
+        elif self.is_raft_end(code):
+            self.raft_ended = True
+        return [code]
 
-    def get_layer_location(self, start, num_layers, codes):
-        layer_loc = len(codes)
-        layers_seen = 0
-        if num_layers == 0:
-            layer_loc = min(start, len(codes))
-        else:
-            for i in range(start, len(codes)):
-                if re.match(self.layer_end, codes[i]):
-                    layers_seen += 1 
-                if layers_seen >= num_layers:
-                    layer_loc = i + 1
-                    break
-        return layer_loc
+    def _release_held_codes(self, codes):
+        held_codes = self.held_codes
+        self.held_codes = []
+        held_codes.extend(codes)
+        return held_codes
 
-    def process_gcode(self, gcodes, callback=None):
-        stats = self.gather_stats(gcodes)
-        if not stats['fan_codes_exist']:
-            start_loc = 0
-            if stats['raft']:
-                start_loc = self.get_raft_end_location(gcodes)
-            layer_loc = self.get_layer_location(start_loc, self.layer_count, gcodes)
-            gcodes.insert(layer_loc, self.fan_on)
-            gcodes.append(self.fan_off)
-        return gcodes 
+    def flush_gcode(self):
+        """ No fan codes were found anywhere in the file, so the fan is
+        turned on ahead of the held back codes and off at the end """
+        codes = []
+        if not self.fan_codes_exist:
+            codes = [self.fan_on]
+            codes.extend(self._release_held_codes([self.fan_off]))
+        self.reset()
+        return codes
@@ -0,0 +1,53 @@
+"""
+Runs several line transform processors in a single pass over the gcode.
+"""
+from __future__ import absolute_import
+
+from .LineTransformProcessor import LineTransformProcessor
+
+
+class FusedProcessor(LineTransformProcessor):
+    """
+    Fuses consecutive bundleable processors into one pass.  Unlike a
+    BundleProcessor, which merges code_maps and so applies at most one
+    transform per line, every line is handed through each processor in
+    turn, so the output is identical to running them one after another.
+    """
+
+    def __init__(self, processors=None):
+        super(FusedProcessor, self).__init__()
+        self.is_bundleable = True
+        self.processors = list(processors) if processors else []
+        # A fused group keeps no state of its own
+        self.is_stateless = bool(self.processors) and all(p.is_stateless for p in self.processors)
+        self.is_rebuildable = bool(self.processors) and all(p.is_rebuildable for p in self.processors)
+
+    def _transform_code(self, code):
+        """ Runs a single gcode through the _transform_code of every
+        fused processor, in order
+        @param code: a single gcode line
+        @return a list of output tcodes. """
+        tcodes = [code]
+        for processor in self.processors:
+            next_tcodes = []
+            for tcode in tcodes:
+                next_tcodes.extend(processor._transform_code(tcode))
+            tcodes = next_tcodes
+        return tcodes
+
+    def flush_gcode(self):
+        """ Flushes every fused processor in order, handing what one
+        processor held back through the processors after it """
+        tcodes = []
+        for processor in self.processors:
+            next_tcodes = []
+            for tcode in tcodes:
+                next_tcodes.extend(processor._transform_code(tcode))
+            next_tcodes.extend(processor.flush_gcode())
+            tcodes = next_tcodes
+        return tcodes
+
+    def set_external_stop(self, value=True):
+        super(FusedProcessor, self).set_external_stop(value)
+        for processor in self.processors:
+            processor.set_external_stop(value)
@@ -20,6 +20,7 @@ class LineTransformProcessor(Processor):
     def __init__(self):
         super(LineTransformProcessor, self).__init__()
         self.code_map = {}  # map {compiled_regex:replace-funcion, }
+        self.is_streamable = True
 
     def process_gcode(self, gcodes, callback=None):
         """ main line by line processing, inherited from Processor
@@ -29,19 +30,40 @@ class LineTransformProcessor(Processor):
         @param callback for progress, expects 0-100 as percent 'done'
         @return A new gcode list post application of code_map transforms
         """
+        output = self.process_gcode_chunk(gcodes, callback)
+        output.extend(self.flush_gcode())
+        return output
+
+    def process_gcode_chunk(self, gcodes, callback=None):
+        """ Processes the next chunk of a longer stream of gcodes.
+        Callers must call flush_gcode once the stream has ended.
+        @param gcodes A list of gcodes
+        @param callback for progress, expects 0-100 as percent 'done'
+        @return A new gcode list post application of code_map transforms
+        """
         output = []
         expected_len = len(gcodes)
         output_len = len(output)
+        reporter = self.create_progress_reporter(callback)
+        interval = self.stop_check_interval
+        countdown = 0
+        self.test_for_external_stop()
         for code in gcodes:
             tcode = self._transform_code(code)
             expected_len += len(tcode) - 1
-            with self._condition:
-                self.test_for_external_stop(prelocked=True)
-                output.extend(tcode)
-                output_len += len(tcode)
-            if callback is not None:
-                percent = int(100.0 * output_len / expected_len)
-                callback(percent)
+            output.extend(tcode)
+            output_len += len(tcode)
+            countdown -= 1
+            if countdown <= 0:
+                countdown = interval
+                self.test_for_external_stop()
+                if callback is not None and expected_len > 0:
+                    reporter.update(100.0 * output_len / expected_len)
+            elif callback is not None and expected_len > 0:
+                reporter.update_if_changed(100.0 * output_len / expected_len)
+        self.test_for_external_stop()
+        if callback is not None and expected_len > 0:
+            reporter.update(100.0 * output_len / expected_len)
         return output
 
     def _transform_code(self, code):
@@ -3,19 +3,70 @@ An interface that all future preprocessors should inherit from
 """
 import os
 import re
+import time
 import threading
 
 import makerbot_driver
 
 
+class ProgressReporter(object):
+    """ Wraps a percent callback so it is only called when the integer
+    percent changes, or when interval seconds have passed since it was
+    last called.  A None callback is never called."""
+
+    def __init__(self, callback, interval=1.0):
+        self.callback = callback
+        self.interval = interval
+        self.last_percent = None
+        self.last_time = 0
+
+    def update(self, percent):
+        if self.callback is None:
+            return
+        percent = int(percent)
+        now = None
+        if percent == self.last_percent:
+            if self.interval is None:
+                return
+            now = time.time()
+            if now - self.last_time < self.interval:
+                return
+        self.last_percent = percent
+        self.last_time = now if now is not None else time.time()
+        self.callback(percent)
+
+    def update_if_changed(self, percent):
+        """ Like update, but only reports a new integer percent and never
+        reads the clock, so it is cheap enough to call for every line """
+        if self.callback is not None and int(percent) != self.last_percent:
+            self.update(percent)
+
+
 class Processor(object):
     """ Base class for all Gcode Processors."""
     def __init__(self):
         self._external_stop = False
         # ^ set this to true from another thread to stop a processor
+        self._external_stop_event = threading.Event()
+        # ^ mirrors _external_stop, so it can be checked without locking
         self._condition = threading.Condition()
         # ^ used for all of Processor internal locking
+        self.stop_check_interval = 256
+        # ^ processing loops check for an external stop once every this
+        # many lines.  Progress is still reported whenever the integer
+        # percent changes.
+        self.progress_interval = 1.0
+        # ^ seconds after which an unchanged percent is reported again
         self.is_bundleable = False
+        self.is_streamable = False
+        # ^ True if processing the gcodes in consecutive chunks gives the
+        # same output as processing them all at once
+        self.is_stateless = False
+        # ^ True if each line is processed independently of all others
+        self.is_rebuildable = False
+        # ^ True if an instance made by the class's constructor, with no
+        # arguments, behaves the same as this one.  Only these can be
+        # handed to worker processes, which rebuild them by class name.
 
     def process_gcode(self, gcodes, percentCallback=None):
         """ Abstract method to call gcode processing. Child functions
@@ -27,6 +78,14 @@ class Processor(object):
         self.test_for_external_stop()
         raise NotImplementedError("Unmplemented abstract method")
 
+    def flush_gcode(self):
+        """ Called once the input of a streamable processor has ended.
+        Processors that hold gcodes back while deciding what to do with
+        them return those here, and reset themselves for the next input.
+        @return list of gcodes still held back
+        """
+        return []
+
     @classmethod
     def remove_variables(cls, gcode, newvalue='0'):
         """
@@ -51,19 +110,23 @@ class Processor(object):
         """
         with self._condition:
             self._external_stop = value
+            if value:
+                self._external_stop_event.set()
+            else:
+                self._external_stop_event.clear()
 
     def test_for_external_stop(self, prelocked=False):
         """ If an external stop is set, this function will throw an
         ExternalStopError. This is used so a processing thread can be
         interrupted from another context if needed. Inherited implementions
-        of process_gcode MUST call this function.
-        @param prelocked set to True will skip locking self._condition
+        of process_gcode MUST call this function.  The check reads an Event,
+        so it never takes self._condition.
+        @param prelocked kept for compatibility, no longer needed
         """
-        if not prelocked:
-            with self._condition:
-                if self._external_stop:
-                    raise makerbot_driver.ExternalStopError
-        else:  # self._condition is already locked
-            if self._external_stop:
-                raise makerbot_driver.ExternalStopError
-        pass
+        if self._external_stop_event.is_set():
+            raise makerbot_driver.ExternalStopError
+
+    def create_progress_reporter(self, callback):
+        """ @return a ProgressReporter for callback, using this
+        processor's progress_interval """
+        return ProgressReporter(callback, self.progress_interval)
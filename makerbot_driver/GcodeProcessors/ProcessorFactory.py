@@ -30,8 +30,104 @@ class ProcessorFactory(object):
                 strings.remove(s)
         return strings
 
-    def get_processors(self, processors, profile = None):
+    def get_processors(self, processors, profile=None, fuse=True, split_stateless=False):
+        """
+        Builds processors by name, in order.
+
+        @param processors: A list of processor names, or a comma separated string
+        @param profile: Profile to hand to each processor
+        @param bool fuse: If True, consecutive bundleable processors are
+          fused into a single FusedProcessor pass
+        @param bool split_stateless: If True, stateless processors are never
+          fused with stateful ones, see fuse_processors
+        """
         if isinstance(processors, str):
             processors = self.process_list_with_commas(processors)
+        processors = (self.create_processor_from_name(processor, profile) for processor in processors)
+        if fuse:
+            processors = self.fuse_processors(processors, split_stateless)
+        for processor in processors:
+            yield processor
+
+    def is_fusable(self, processor):
+        """ Only bundleable line transforms can share a pass, the rest
+        need to see the whole file and are barriers """
+        return processor.is_bundleable and processor.is_streamable
+
+    def is_poolable(self, processor):
+        """ Stateless, rebuildable processors can be run batch by batch in
+        a ProcessorPipeline's worker processes """
+        return processor.is_stateless and processor.is_rebuildable
+
+    def fuse_processors(self, processors, split_stateless=False):
+        """
+        Groups runs of consecutive fusable processors into FusedProcessors,
+        keeping their order.  Groups of one are left alone.
+
+        @param processors: An iterable of processors
+        @param bool split_stateless: If True, a run is split wherever
+          is_poolable changes, so that fusing a stateless processor with a
+          stateful one never keeps it out of a pipeline's worker pool
+        @return generator: The processors, with runs fused
+        """
+        group = []
         for processor in processors:
-            yield self.create_processor_from_name(processor, profile)
+            if self.is_fusable(processor):
+                if (split_stateless and group and
+                        self.is_poolable(processor) != self.is_poolable(group[0])):
+                    yield self._fuse_group(group)
+                    group = []
+                group.append(processor)
+                continue
+            if group:
+                yield self._fuse_group(group)
+                group = []
+            yield processor
+        if group:
+            yield self._fuse_group(group)
+
+    def _fuse_group(self, group):
+        # Imported here, since this module is loaded before the processors
+        from .FusedProcessor import FusedProcessor
+        if len(group) == 1:
+            return group[0]
+        fused = FusedProcessor(group)
+        fused.profile = group[0].profile
+        return fused
+
+    def process_file(self, input_path, output_path, processors, profile=None, cache=None):
+        """
+        Runs the named processors over a gcode file.
+
+        @param str input_path: The gcode file to process
+        @param str output_path: Where to write the processed gcode
+        @param processors: A list of processor names, or a comma separated string
+        @param profile: Profile to hand to each processor
+        @param ConversionCache cache: If given, a cached result is reused,
+          and a new result is stored
+        @return str: output_path, which a cache hit is copied to
+        """
+        if cache is not None:
+            key = cache.make_key(input_path, processors, profile)
+            if cache.get_copy(key, output_path):
+                return output_path
+        with open(input_path) as f:
+            gcodes = list(f)
+        for processor in self.get_processors(processors, profile):
+            gcodes = processor.process_gcode(gcodes)
+        with open(output_path, 'w') as f:
+            for code in gcodes:
+                f.write(code)
+        if cache is not None:
+            cache.put(key, output_path)
+        return output_path
+
+    def get_pipeline(self, processors, profile=None, fuse=True, **kwargs):
+        """
+        Builds the processors named in processors and connects them into a
+        ProcessorPipeline.  Stateless processors are kept apart from
+        stateful ones when fusing, so they still run in the worker pool.
+        Extra keyword arguments are passed to the pipeline.
+        """
+        return makerbot_driver.GcodeProcessors.ProcessorPipeline(
+            self.get_processors(processors, profile, fuse, split_stateless=True), **kwargs)
@@ -0,0 +1,298 @@
+"""
+Runs a chain of processors as a pipeline instead of one full pass after
+another.  Stages are connected by bounded queues of line batches:
+
+    * stateless processors (is_stateless) that can be rebuilt from their
+      class name (is_rebuildable) are fanned out to a pool of worker
+      processes, batch by batch, with results kept in order
+    * streamable processors (is_streamable) that keep state between lines
+      run in their own thread, seeing every batch in order, and are
+      flushed once the input ends
+    * everything else is a barrier: it collects all of its input, runs
+      process_gcode once, then streams the result on
+
+so a chain of N processors costs about as much as its slowest stage.
+Each batch carries the number of input lines it stands for, so progress
+follows the lines that have made it through every stage.
+The worker pool is started on the first run and kept for later ones,
+until close is called.
+"""
+from __future__ import absolute_import
+
+import sys
+import Queue
+import collections
+import multiprocessing
+import threading
+
+import makerbot_driver
+from .Processor import Processor
+from .FusedProcessor import FusedProcessor
+
+_end_of_stream = object()
+
+# Per worker-process processor instances, keyed by their class names
+_worker_processors = {}
+
+
+def _get_processor_names(processor):
+    """
+    @param processor: A stateless, rebuildable processor
+    @return tuple: Its class name, or the class names of the processors
+      fused into it
+    """
+    if isinstance(processor, FusedProcessor):
+        return tuple(p.__class__.__name__ for p in processor.processors)
+    return (processor.__class__.__name__,)
+
+
+def _process_batch(processor_names, batch):
+    """
+    Worker process entry point.  Processors hold locks and bound methods,
+    which do not pickle, so workers build their own instance by name.
+    Only processors that are is_rebuildable are handed over this way.
+
+    @param tuple processor_names: Names of stateless processor classes,
+      fused together if there are several
+    @param list batch: Gcodes to process
+    @return list: The processed gcodes
+    """
+    processor = _worker_processors.get(processor_names)
+    if processor is None:
+        processors = [getattr(makerbot_driver.GcodeProcessors, name)() for name in processor_names]
+        if len(processors) == 1:
+            processor = processors[0]
+        else:
+            processor = FusedProcessor(processors)
+        _worker_processors[processor_names] = processor
+    return processor.process_gcode(batch)
+
+
+class _BatchQueue(object):
+    """ A bounded queue of gcode batches with an explicit end of stream.
+    Batches are (count, gcodes) pairs, count being the number of input
+    lines the gcodes were made from. """
+
+    def __init__(self, maxsize):
+        self._queue = Queue.Queue(maxsize)
+        self.exhausted = False
+
+    def put(self, batch):
+        self._queue.put(batch)
+
+    def close(self):
+        self._queue.put(_end_of_stream)
+
+    def __iter__(self):
+        while not self.exhausted:
+            batch = self._queue.get()
+            if batch is _end_of_stream:
+                self.exhausted = True
+            else:
+                yield batch
+
+    def drain(self):
+        """ Throw away batches until the end of stream, so that
+        upstream stages never block on a full queue """
+        for batch in self:
+            pass
+
+
+class ProcessorPipeline(Processor):
+
+    def __init__(self, processors, batch_size=4096, queue_size=8, worker_count=None):
+        """
+        @param list processors: Processors to run, in order
+        @param int batch_size: Number of lines handed between stages at once
+        @param int queue_size: Number of batches buffered between two stages
+        @param int worker_count: Size of the worker process pool. None uses
+          one worker per cpu, 0 runs stateless stages in threads instead
+        """
+        super(ProcessorPipeline, self).__init__()
+        self.processors = list(processors)
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.worker_count = worker_count
+        self._pool = None
+        # ^ Worker processes, started by the first run that needs them
+
+    def get_pool(self):
+        """
+        Starts the worker pool the first time a run needs it.  Must be
+        called before any pipeline thread exists, since it forks.
+
+        @return: The pool, or None if no stage runs in worker processes
+        """
+        if self._pool is None and self.worker_count != 0 and any(
+                p.is_stateless and p.is_rebuildable for p in self.processors):
+            self._pool = multiprocessing.Pool(self.worker_count)
+        return self._pool
+
+    def close(self):
+        """ Shuts down the worker pool.  A later run starts a new one. """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def get_stage_kind(self, processor, pool=None):
+        """
+        Decides how a processor is run inside the pipeline
+
+        @param processor: The processor to classify
+        @param pool: Worker pool, if one is available
+        @return str: One of 'process', 'stream' or 'barrier'
+        """
+        if processor.is_stateless and processor.is_rebuildable and pool is not None:
+            return 'process'
+        elif processor.is_streamable:
+            return 'stream'
+        return 'barrier'
+
+    def split_batches(self, gcodes):
+        """
+        Splits an iterable of gcodes into lists of at most batch_size lines
+
+        @param gcodes: Any iterable of gcodes
+        @return generator: Lists of gcodes
+        """
+        batch = []
+        for code in gcodes:
+            batch.append(code)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def set_external_stop(self, value=True):
+        super(ProcessorPipeline, self).set_external_stop(value)
+        for processor in self.processors:
+            processor.set_external_stop(value)
+
+    def process_gcode(self, gcodes, callback=None):
+        try:
+            total = len(gcodes)
+        except TypeError:
+            total = None
+        pool = self.get_pool()
+        queues = [_BatchQueue(self.queue_size) for i in range(len(self.processors) + 1)]
+        errors = []
+        stop = threading.Event()
+        # ^ Set when a stage fails, to wind down this run only
+        threads = [threading.Thread(
+            target=self._run_stage,
+            args=(self._feed_stage, (gcodes,), None, queues[0], errors, stop))]
+        for processor, inqueue, outqueue in zip(self.processors, queues, queues[1:]):
+            kind = self.get_stage_kind(processor, pool)
+            if kind == 'process':
+                target, args = self._process_stage, (processor, pool)
+            elif kind == 'stream':
+                target, args = self._stream_stage, (processor,)
+            else:
+                target, args = self._barrier_stage, (processor,)
+            threads.append(threading.Thread(
+                target=self._run_stage,
+                args=(target, args, inqueue, outqueue, errors, stop)))
+        output = []
+        done = 0
+        # ^ Input lines that have made it out of the last stage
+        current_percent = -1
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        try:
+            for count, batch in queues[-1]:
+                output.extend(batch)
+                done += count
+                if callback is not None and total:
+                    percent = int(100.0 * done / total)
+                    if percent > current_percent:
+                        current_percent = percent
+                        callback(percent)
+        except Exception:
+            # Wind the stages down, so none is left blocked on a full queue
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            stop.set()
+            queues[-1].drain()
+            for thread in threads:
+                thread.join()
+            raise exc_type, exc_value, exc_traceback
+        for thread in threads:
+            thread.join()
+        if errors:
+            real_errors = [e for e in errors if not issubclass(e[0], makerbot_driver.ExternalStopError)]
+            exc_type, exc_value, exc_traceback = (real_errors or errors)[0]
+            raise exc_type, exc_value, exc_traceback
+        self.test_for_external_stop()
+        if callback is not None and current_percent < 100:
+            callback(100)
+        return output
+
+    def _test_for_stop(self, stop):
+        """ Raises an ExternalStopError if another stage of this run has
+        failed, or if the pipeline has been stopped from outside """
+        if stop.is_set():
+            raise makerbot_driver.ExternalStopError
+        self.test_for_external_stop()
+
+    def _run_stage(self, target, args, inqueue, outqueue, errors, stop):
+        """
+        Runs a single stage.  On failure the rest of this run is stopped,
+        and the stage keeps draining its input so nothing upstream blocks.
+        The pipeline and its processors can be used again afterwards.
+        """
+        try:
+            target(*(args + (stop, inqueue, outqueue)))
+        except Exception:
+            errors.append(sys.exc_info())
+            stop.set()
+            if inqueue is not None:
+                inqueue.drain()
+        finally:
+            outqueue.close()
+
+    def _feed_stage(self, gcodes, stop, inqueue, outqueue):
+        for batch in self.split_batches(gcodes):
+            self._test_for_stop(stop)
+            outqueue.put((len(batch), batch))
+
+    def _stream_stage(self, processor, stop, inqueue, outqueue):
+        for count, batch in inqueue:
+            self._test_for_stop(stop)
+            outqueue.put((count, processor.process_gcode_chunk(batch)))
+        tail = processor.flush_gcode()
+        if tail:
+            outqueue.put((0, tail))
+
+    def _process_stage(self, processor, pool, stop, inqueue, outqueue):
+        names = _get_processor_names(processor)
+        pending = collections.deque()
+        for count, batch in inqueue:
+            self._test_for_stop(stop)
+            pending.append((count, pool.apply_async(_process_batch, (names, batch))))
+            if len(pending) >= self.queue_size:
+                count, result = pending.popleft()
+                outqueue.put((count, result.get()))
+        while pending:
+            count, result = pending.popleft()
+            outqueue.put((count, result.get()))
+
+    def _barrier_stage(self, processor, stop, inqueue, outqueue):
+        gcodes = []
+        consumed = 0
+        for count, batch in inqueue:
+            gcodes.extend(batch)
+            consumed += count
+        # Upstream may have ended early because a stage failed
+        self._test_for_stop(stop)
+        output = processor.process_gcode(gcodes)
+        # The input lines are shared out over the output batches, so
+        # progress keeps moving as they pass through later stages
+        start = 0
+        for batch in self.split_batches(output):
+            self._test_for_stop(stop)
+            end = start + len(batch)
+            count = consumed * end // len(output) - consumed * start // len(output)
+            outqueue.put((count, batch))
+            start = end
@@ -22,18 +22,24 @@ class ProgressProcessor(Processor):
         count_total = len(gcodes)
         count_current = 0
         current_percent = 0
+        # The percent only has to be worked out again once count_current
+        # could have reached the next whole percent
+        next_check = 1
         for code in gcodes:
             count_current += 1
             output.append(code)
+            if count_current < next_check:
+                continue
             new_percent = int(100.0 * count_current / count_total)
             if new_percent > current_percent:
-                progressmsg = self.create_progress_msg(new_percent)
-                with self._condition:
-                    self.test_for_external_stop(prelocked=True)
-                    output.append(progressmsg)
+                self.test_for_external_stop()
+                output.append(self.create_progress_msg(new_percent))
                 current_percent = new_percent
                 if callback is not None:
                     callback(current_percent)
+            next_check = max(count_current + 1,
+                             int((current_percent + 1) * count_total / 100.0))
+        self.test_for_external_stop()
         return output
 
 
@@ -11,6 +11,8 @@ class RemoveProgressProcessor(LineTransformProcessor):
     def __init__(self):
         super(RemoveProgressProcessor, self).__init__()
         self.is_bundleable = True
+        self.is_stateless = True
+        self.is_rebuildable = True
         self.code_map = {
             re.compile("[^;(]*[mM]73"): self._transform_m73,
             re.compile("[^;(]*[mM]136"): self._transform_m136,
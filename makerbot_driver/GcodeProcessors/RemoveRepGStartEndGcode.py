@@ -12,6 +12,9 @@ class RemoveRepGStartEndGcode(Processor):
         count_total = len(gcodes)
         count_current = 0
         output = []
+        reporter = self.create_progress_reporter(callback)
+        interval = self.stop_check_interval
+        countdown = 0
 
         for code in gcodes:
             if startgcode:
@@ -26,14 +29,19 @@ class RemoveRepGStartEndGcode(Processor):
                 elif (self.get_comment_match(code, '**** End.gcode')):
                     endgcode = True
                 else:
-                    with self._condition:
-                            if self._external_stop:
-                                    raise makerbot_driver.ExternalStopError
-                            output.append(code)
+                    output.append(code)
                 count_current += 1
-                if callback is not None:
-                    percent = int(100.0 * count_current / count_total)
-                    callback(percent)
+                countdown -= 1
+                if countdown <= 0:
+                    countdown = interval
+                    self.test_for_external_stop()
+                    if callback is not None:
+                        reporter.update(100.0 * count_current / count_total)
+                elif callback is not None:
+                    reporter.update_if_changed(100.0 * count_current / count_total)
+        self.test_for_external_stop()
+        if callback is not None and count_total > 0:
+            reporter.update(100.0 * count_current / count_total)
         return output
 
     def get_comment_match(self, gcode, match):
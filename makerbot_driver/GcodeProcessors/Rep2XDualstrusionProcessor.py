@@ -22,10 +22,9 @@ class Rep2XDualstrusionProcessor(Processor):
         self.return_distance_mm = None
 
     def process_gcode(self, gcode_in, outfile = None, profile = None):
-        self.retract_distance_mm = makerbot_driver.profile.Profile(profile).values[
-            "dualstrusion_retract_distance_mm"]
-        self.squirt_redux = makerbot_driver.profile.Profile(profile).values[
-            "dualstrusion_squirt_reduce_mm"]
+        values = makerbot_driver.profile.get_shared_profile(profile).values
+        self.retract_distance_mm = values["dualstrusion_retract_distance_mm"]
+        self.squirt_redux = values["dualstrusion_squirt_reduce_mm"]
 
         if(self.retract_distance_mm == 'NULL'):
         #if this value is null this process in not relevant
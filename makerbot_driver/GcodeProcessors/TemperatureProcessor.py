@@ -10,6 +10,8 @@ class SetTemperatureProcessor(LineTransformProcessor):
     def __init__(self):
         super(SetTemperatureProcessor, self).__init__()
         self.is_bundleable = True
+        self.is_stateless = True
+        self.is_rebuildable = True
         self.code_map = {
             re.compile("[^(;]*[mM]104"): self._transform_m104,
         }
@@ -23,6 +25,8 @@ class GetTemperatureProcessor(LineTransformProcessor):
     def __init__(self):
         super(GetTemperatureProcessor, self).__init__()
         self.is_bundleable = True
+        self.is_stateless = True
+        self.is_rebuildable = True
         self.code_map = {
             re.compile("[^(;]*[mM]105"): self._transform_m105,
         }
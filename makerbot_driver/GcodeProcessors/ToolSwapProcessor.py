@@ -15,6 +15,8 @@ class ToolSwapProcessor(LineTransformProcessor):
     def __init__(self):
         super(ToolSwapProcessor, self).__init__()
         self.is_bundleable = True
+        self.is_stateless = True
+        self.is_rebuildable = True
         self.code_map = {
             re.compile("[^(;]*([aAbB])|[^(;]*[tT]([0-9])"): self._transform_tool_swap,
         }
@@ -14,6 +14,7 @@ from LineTransformProcessor import *
 from TemperatureProcessor import *
 from AbpProcessor import *
 from BundleProcessor import *
+from FusedProcessor import *
 from RemoveProgressProcessor import *
 from AnchorProcessor import *
 from ToolSwapProcessor import *
@@ -22,3 +23,4 @@ from FanProcessor import *
 from errors import *
 from EmptyLayerProcessor import *
 from Rep2XDualstrusionProcessor import *
+from ProcessorPipeline import *
@@ -0,0 +1,139 @@
+"""
+A parser for Intel HEX files, the format avrdude reads firmware from and
+dumps EEPROMs to.
+
+Each record is decoded and checksummed whole, and its data copied into a
+single bytearray image of the file, so the cost of parsing a hex file does
+not grow with a per byte step in Python.  A coverage bytearray the same
+size as the image marks which bytes the file actually gave values for.
+"""
+
+from __future__ import absolute_import
+
+import struct
+import binascii
+
+import makerbot_driver
+
+unprogrammed_value = 0xFF
+# ^ What flash and EEPROM read as where nothing has been written
+
+
+class HexImage(object):
+
+    def __init__(self, start, data, coverage):
+        """
+        @param int start: Address of the first byte of data
+        @param bytearray data: Contents of the file, with unprogrammed_value
+          in any gaps between records
+        @param bytearray coverage: 1 for each byte of data a record gave
+          a value for, 0 for gaps
+        """
+        self.start = start
+        self.data = data
+        self.coverage = coverage
+
+    @property
+    def end(self):
+        """ Address just past the last byte of data """
+        return self.start + len(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def get_covered_count(self):
+        return len(self.coverage) - self.coverage.count('\x00')
+
+    def is_covered(self, address):
+        index = address - self.start
+        return 0 <= index < len(self.coverage) and self.coverage[index] == 1
+
+    def get_segments(self):
+        """
+        @return list: (address, str) for each run of covered bytes
+        """
+        segments = []
+        coverage = str(self.coverage)
+        index = coverage.find('\x01')
+        while index != -1:
+            end = coverage.find('\x00', index)
+            if end == -1:
+                end = len(coverage)
+            segments.append((self.start + index, str(self.data[index:end])))
+            index = coverage.find('\x01', end)
+        return segments
+
+    def get_hex_map(self):
+        """
+        @return dict: Upper case two digit hex string of each covered
+          byte, by address
+        """
+        hex_map = {}
+        for address, data in self.get_segments():
+            text = binascii.hexlify(data).upper()
+            for i in range(len(data)):
+                hex_map[address + i] = text[2 * i:2 * i + 2]
+        return hex_map
+
+
+def parse_hex(lines):
+    """
+    Decodes the records of an Intel HEX file, stopping at its end of file
+    record
+
+    @param iterable lines: Lines of the file
+    @return HexImage: Contents of the file
+    """
+    records = []
+    # ^ (address, data) of each data record
+    base = 0
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith(':'):
+            raise makerbot_driver.HexFileError(number, 'missing start code')
+        try:
+            record = binascii.unhexlify(line[1:])
+        except (TypeError, binascii.Error):
+            raise makerbot_driver.HexFileError(number, 'not hexadecimal')
+        if len(record) < 5 or len(record) != ord(record[0]) + 5:
+            raise makerbot_driver.HexFileError(number, 'wrong length')
+        # Every byte of a record, checksum included, sums to 0
+        if sum(bytearray(record)) & 0xFF:
+            raise makerbot_driver.HexChecksumError(number)
+        address, record_type = struct.unpack('>HB', record[1:4])
+        data = record[4:-1]
+        if 0x00 == record_type:
+            records.append((base + address, data))
+        elif 0x01 == record_type:
+            break
+        elif record_type in (0x02, 0x04):
+            if len(data) != 2:
+                raise makerbot_driver.HexFileError(number, 'wrong length')
+            # Extended segment and extended linear addresses
+            shift = 4 if 0x02 == record_type else 16
+            base = struct.unpack('>H', data)[0] << shift
+        elif record_type not in (0x03, 0x05):
+            # Start addresses mean nothing to an AVR, and are skipped
+            raise makerbot_driver.HexFileError(number, 'unknown record type %i' % (record_type))
+    if not records:
+        return HexImage(0, bytearray(), bytearray())
+    start = min(address for address, data in records)
+    end = max(address + len(data) for address, data in records)
+    image = bytearray(chr(unprogrammed_value)) * (end - start)
+    coverage = bytearray(end - start)
+    for address, data in records:
+        index = address - start
+        image[index:index + len(data)] = data
+        coverage[index:index + len(data)] = '\x01' * len(data)
+    return HexImage(start, image, coverage)
+
+
+def parse_hex_file(path):
+    """
+    @param str path: Intel HEX file to read
+    @return HexImage: Contents of the file
+    """
+    with open(path) as f:
+        return parse_hex(f)
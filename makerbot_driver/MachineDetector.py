@@ -11,19 +11,33 @@ serial device to it's USB VID/PID pair.  All ports are kept track of in a
 python dict named "ports".
 """
 
+import os
 import logging
+import warnings
+import threading
 
-try:
-    import serial.tools.list_ports as lp
-    list_ports_generator = lp.list_ports_by_vid_pid
-except ImportError:
-    import warnings
-    warnings.warn("No VID/PID detection in this version of PySerial; Automatic machine detection disabled.")
-    # We're using legacy pyserial. list_port_generator is an empty iterator.
+_list_ports_by_vid_pid = None
+# ^ pyserial's port lister, imported the first time ports are listed
 
-    def list_ports_generator():
-        return
-        yield
+
+def _no_ports(*args, **kwargs):
+    return
+    yield
+
+
+def list_ports_generator(*args, **kwargs):
+    """ Lists ports by VID/PID with MakerBot's pyserial, which is only
+    imported the first time this is called """
+    global _list_ports_by_vid_pid
+    if _list_ports_by_vid_pid is None:
+        try:
+            import serial.tools.list_ports as lp
+            _list_ports_by_vid_pid = lp.list_ports_by_vid_pid
+        except ImportError:
+            warnings.warn("No VID/PID detection in this version of PySerial; Automatic machine detection disabled.")
+            # We're using legacy pyserial. list_port_generator is an empty iterator.
+            _list_ports_by_vid_pid = _no_ports
+    return _list_ports_by_vid_pid(*args, **kwargs)
 
 ## Tools for using the global singleton MachineDetector
 gMachineDetector = None
@@ -70,14 +84,23 @@ class MachineDetector(object):
     """ Class used to detect machines, and query basic information from
     them. This is used to use MakerBot's pyserial to detect machines. """
 
+    tty_class_dir = '/sys/class/tty'
+    # ^ Lists every tty device on linux, and changes whenever one comes or goes
+
     def __init__(self):
         self._log = logging.getLogger(self.__class__.__name__)
         self.machines_recently_seen = {}
         # ^ Bots seen since the inception of this object
         self.machines_just_seen = {}
         # ^ Bots seen in the last scan,
+        self.machines_by_vid_pid = {}
+        # ^ Bots seen in the last scan, by (VID, PID) and then by port
         self.list_ports_by_vid_pid = list_ports_generator
         # ^ Save func as a variable for testing purposes. hacky
+        self._last_update = None
+        # ^ The tty signature and machine types of the last update
+        self._watch_thread = None
+        self._watch_stop = None
 
     def get_machine_name_from_vid_pid(self, vid, pid):
         machine_name = None
@@ -101,40 +124,127 @@ class MachineDetector(object):
             scanNameList.append(machineTypes)
         else:
             scanNameList.extend(machineTypes)
-        # Empty the machines just seen list. We are rescanning
-        # all machines connected to the system.
-        self.machines_just_seen = {}
+        vid_pids = set()
         for machineClass in scanNameList:
             self._log.debug("scanning for MachineClass %s", str(machineClass))
             #Not all machine classes have a defined VID/PID
             try:
                 vid = gMachineClasses[machineClass]['vid']
                 pid_list = gMachineClasses[machineClass]['pid']
-               
-                new_machines = []
-                for pid in pid_list:
-                  new_machines.extend(self.list_ports_by_vid_pid(vid, pid))
-
-                for machine in list(new_machines):
-                    self.machines_just_seen[machine['port']] = machine
-                self.machines_recently_seen.update(self.machines_just_seen)
             except KeyError:
                 continue  # The machine doesnt have a VID/PID, so we cant scan for it
+            vid_pids.update((vid, pid) for pid in pid_list)
+        # Enumerate the ports once and sort them by VID/PID, rather than
+        # enumerating once per VID/PID pair.  The new dicts replace the
+        # old ones whole, so a watching thread never exposes half a scan
+        machines_just_seen = {}
+        machines_by_vid_pid = {}
+        for machine in self.list_ports_by_vid_pid():
+            vid_pid = (machine.get('VID'), machine.get('PID'))
+            if vid_pid in vid_pids:
+                machines_just_seen[machine['port']] = machine
+                machines_by_vid_pid.setdefault(vid_pid, {})[machine['port']] = machine
+        self.machines_just_seen = machines_just_seen
+        self.machines_by_vid_pid = machines_by_vid_pid
+        self.machines_recently_seen.update(machines_just_seen)
+
+    def get_tty_signature(self):
+        """
+        @return frozenset: Names of the tty devices, or None if the system
+          does not list them in tty_class_dir
+        """
+        try:
+            return frozenset(os.listdir(self.tty_class_dir))
+        except OSError:
+            return None
+
+    def update(self, machineTypes=None):
+        """ Rescans for machines, unless the tty devices are known to be
+        unchanged since the last update, and works out which machines
+        came and went.
+        @param machineTypes. An individual MachineClass name, or a list
+        of machine class names
+        @return tuple of (added, removed) dicts of {'portname',port_data_dict}
+        """
+        signature = self.get_tty_signature()
+        if signature is not None and (signature, machineTypes) == self._last_update:
+            return {}, {}
+        previous = self.machines_just_seen
+        self.scan(machineTypes)
+        self._last_update = (signature, machineTypes)
+        added = dict((port, machine) for port, machine in self.machines_just_seen.items()
+                     if previous.get(port) != machine)
+        removed = dict((port, machine) for port, machine in previous.items()
+                       if port not in self.machines_just_seen)
+        return added, removed
+
+    def start_watching(self, on_added=None, on_removed=None, interval=1.0, machineTypes=None):
+        """ Keeps the machines seen up to date from a background thread,
+        calling on_added(port, port_data_dict) and
+        on_removed(port, port_data_dict) as machines come and go.
+        Machines connected when watching starts count as added.
+        @param float interval: Seconds between updates
+        @param machineTypes. An individual MachineClass name, or a list
+        of machine class names
+        """
+        self.stop_watching()
+        self._watch_stop = threading.Event()
+        self._watch_thread = threading.Thread(
+            target=self._watch,
+            args=(self._watch_stop, on_added, on_removed, interval, machineTypes))
+        self._watch_thread.daemon = True
+        self._watch_thread.start()
+
+    def stop_watching(self):
+        if self._watch_thread is not None:
+            self._watch_stop.set()
+            if self._watch_thread is not threading.current_thread():
+                self._watch_thread.join()
+            self._watch_thread = None
+            self._watch_stop = None
+
+    def is_watching(self):
+        return self._watch_thread is not None
+
+    def _watch(self, stop, on_added, on_removed, interval, machineTypes):
+        while not stop.is_set():
+            try:
+                added, removed = self.update(machineTypes)
+                for port, machine in removed.items():
+                    if on_removed is not None:
+                        on_removed(port, machine)
+                for port, machine in added.items():
+                    if on_added is not None:
+                        on_added(port, machine)
+            except Exception as e:
+                self._log.warning('{"event":"machine_watch_failed", "error":%s}', str(e))
+            stop.wait(interval)
 
     def vid_pid_from_portname(self, portname):
-        """ return pid/vid based on a passed portname."""
+        """ return pid/vid based on a passed portname.  Ports are looked up
+        in the last scan, only rescanning if the port is not there and no
+        watching thread is keeping the scan up to date."""
         vid = None
         pid = None
-        ports_to_check = self.get_tty_and_cu(portname)
-        available_machines = self.get_available_machines()
-        set_available = set(available_machines)
-        intersection = ports_to_check.intersection(set_available)
-        if len(intersection) > 0:
-            usable_port = list(intersection)[0]
-            vid = available_machines[usable_port]['VID']
-            pid = available_machines[usable_port]['PID']
+        machine = self.get_machine_by_port(portname)
+        if machine is None and not self.is_watching():
+            machine = self._find_port(self.get_tty_and_cu(portname), self.get_available_machines())
+        if machine is not None:
+            vid = machine['VID']
+            pid = machine['PID']
         return vid, pid
 
+    def get_machine_by_port(self, portname):
+        """ @return port_data_dict of the machine at portname in the last
+        scan, or None.  Never rescans."""
+        return self._find_port(self.get_tty_and_cu(portname), self.machines_just_seen)
+
+    def _find_port(self, ports_to_check, machines):
+        for port in ports_to_check:
+            if port in machines:
+                return machines[port]
+        return None
+
     def get_tty_and_cu(self, portname):
         ports_to_check = set([portname])
         if '/dev/tty.' in portname:
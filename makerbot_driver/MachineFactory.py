@@ -1,7 +1,10 @@
 from __future__ import absolute_import, print_function
 
 import os
+import time
+import Queue
 import threading
+import collections
 
 import makerbot_driver
 
@@ -11,18 +14,25 @@ class ReturnObject(object):
         pass
 
 
+ProbeResult = collections.namedtuple('ProbeResult', ['port', 'machine', 'error', 'elapsed'])
+# ^ The outcome of probing one port: the ReturnObject built for it, or the
+#   exception that stopped it, and the seconds the probe took
+
+
 class MachineFactory(object):
     """This class is a factory for building machine drivers from
     a port connection. This class will take a connection, query it
     to verify it is a geunine 3d printer (or other device we can control)
     and build the appropritae machine type/version/etc from that.
     """
-    def __init__(self, profile_dir=None):
+    def __init__(self, profile_dir=None, identity_cache=None):
         if profile_dir:
             self.profile_dir = profile_dir
         else:
             self.profile_dir = os.path.join(
                 os.path.abspath(os.path.dirname(__file__)), 'profiles',)
+        self.identity_cache = identity_cache if identity_cache is not None else MachineIdentityCache()
+        # ^ Settings of the machines built so far, to speed up reconnects
 
     def create_inquisitor(self, portname):
         """
@@ -30,7 +40,7 @@ class MachineFactory(object):
         assign internal objects with <obj>.<internal_obj> = <obj> is a
         pain.
         """
-        return MachineInquisitor(portname)
+        return MachineInquisitor(portname, self.identity_cache)
 
     def build_from_port(self, portname, leaveOpen=True, condition=None):
         """
@@ -62,8 +72,130 @@ class MachineFactory(object):
             parser.s3g = s3gBot
             parser.state.profile = getattr(return_object, 'profile')
             setattr(return_object, 'gcodeparser', parser)
+        elif leaveOpen:
+            # Nobody gets a reference to the connection, so it is closed
+            # here rather than left holding the port
+            s3gBot.close()
         return return_object
 
+    def build_all(self, portnames, leaveOpen=True, worker_count=8, timeout=30.0):
+        """
+        Builds machines for many ports at once, probing them from a bounded
+        pool of threads.  Results come back as each probe finishes, so a
+        slow machine only holds up its own port.
+
+        A serial read can not be interrupted, so a probe that takes longer
+        than timeout is reported as failed with a ProbeTimeoutError and its
+        thread is left to finish in the background, with a new thread
+        taking its place.  If it ever does finish, its connection is closed.
+        So are the connections of probes still running, or not yet read,
+        when the caller stops iterating early.  Only the first of several
+        entries for a port is probed, later ones fail with a
+        DuplicatePortError.
+
+        @param list portnames: Ports to probe
+        @param bool leaveOpen: If true, connections to machines are left open
+        @param int worker_count: Most ports probed at the same time
+        @param float timeout: Seconds a single probe may take, or None to
+          wait for as long as it takes
+        @return generator: A ProbeResult for each port, in the order they finish
+        """
+        pending = Queue.Queue()
+        ports = set()
+        duplicates = []
+        for portname in portnames:
+            if portname in ports:
+                # Two probes can not share one serial port
+                duplicates.append(ProbeResult(portname, None, makerbot_driver.DuplicatePortError(portname), 0.0))
+                continue
+            ports.add(portname)
+            pending.put(portname)
+        remaining = pending.qsize()
+        results = Queue.Queue()
+        lock = threading.Lock()
+        running = {}
+        # ^ port: start time, for probes that have not finished or timed out
+        abandoned = set()
+        closed = [False]
+        # ^ Set once the caller stops reading results
+        stop = threading.Event()
+
+        def probe():
+            while not stop.is_set():
+                try:
+                    portname = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                start = time.time()
+                with lock:
+                    running[portname] = start
+                try:
+                    machine, error = self.build_from_port(portname, leaveOpen), None
+                except Exception as e:
+                    machine, error = None, e
+                with lock:
+                    running.pop(portname, None)
+                    late = portname in abandoned or closed[0]
+                    if not late:
+                        results.put(ProbeResult(portname, machine, error, time.time() - start))
+                if late:
+                    # Already reported as timed out, and replaced by another
+                    # thread, or nobody is reading the results any more
+                    if machine is not None and machine.s3g is not None:
+                        machine.s3g.close()
+                    return
+
+        def start_worker():
+            worker = threading.Thread(target=probe)
+            worker.daemon = True
+            worker.start()
+
+        for i in range(min(worker_count, remaining)):
+            start_worker()
+        try:
+            for result in duplicates:
+                yield result
+            while remaining:
+                wait = 1.0
+                if timeout is not None:
+                    wait = min(wait, timeout)
+                    with lock:
+                        starts = running.values()
+                    if starts:
+                        wait = min(wait, max(min(starts) + timeout - time.time(), 0))
+                try:
+                    result = results.get(True, wait)
+                except Queue.Empty:
+                    now = time.time()
+                    timed_out = []
+                    if timeout is not None:
+                        with lock:
+                            for portname, start in running.items():
+                                if now - start >= timeout:
+                                    del running[portname]
+                                    abandoned.add(portname)
+                                    timed_out.append((portname, start))
+                    for portname, start in timed_out:
+                        remaining -= 1
+                        start_worker()
+                        yield ProbeResult(portname, None, makerbot_driver.ProbeTimeoutError(portname, timeout), now - start)
+                    continue
+                remaining -= 1
+                yield result
+        finally:
+            # Ports not probed yet are dropped if the caller stops early,
+            # and connections nobody will read are closed
+            stop.set()
+            with lock:
+                closed[0] = True
+            while True:
+                try:
+                    result = results.get_nowait()
+                except Queue.Empty:
+                    break
+                if result.machine is not None and result.machine.s3g is not None:
+                    result.machine.s3g.close()
+
     def create_s3g(self, portname):
         """
         This is made to ameliorate testing.  Otherwise we would
@@ -110,10 +242,50 @@ class MachineFactory(object):
         return None
 
 
+class MachineIdentityCache(object):
+    """
+    Remembers the settings MachineInquisitor.query found for each machine,
+    keyed by port, USB serial number, VID and PID, along with the machine's
+    firmware version.  A reconnecting machine then only has to confirm its
+    firmware version, instead of being queried all over again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._identities = {}
+        # ^ identity key: (firmware version, settings dict)
+
+    def get(self, key):
+        """
+        @param tuple key: Made by MachineInquisitor.get_identity_key
+        @return tuple: The firmware version and a copy of the settings, or
+          None if the machine has not been seen
+        """
+        with self._lock:
+            identity = self._identities.get(key)
+        if identity is None:
+            return None
+        return identity[0], dict(identity[1])
+
+    def put(self, key, firmware_version, settings):
+        with self._lock:
+            self._identities[key] = (firmware_version, dict(settings))
+
+    def invalidate(self, key):
+        with self._lock:
+            self._identities.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._identities.clear()
+
+
 class MachineInquisitor(object):
-    def __init__(self, portname):
+    def __init__(self, portname, identity_cache=None):
         """ build a machine Inqusitor for an exact port"""
         self._portname = portname
+        self._identity_cache = identity_cache
+        # ^ If given, machines seen before are only asked for their version
 
     def create_s3g(self, condition):
         """
@@ -123,6 +295,21 @@ class MachineInquisitor(object):
         """
         return makerbot_driver.s3g.from_filename(self._portname, condition)
 
+    def get_identity_key(self):
+        """
+        @return tuple: The port, and the USB serial number, VID and PID of
+          the machine on it in the machine detector's last scan, or None if
+          any of those are not known.  A port alone does not tell one
+          machine from another plugged in after it.
+        """
+        detector = makerbot_driver.get_gMachineDetector()
+        machine = detector.get_machine_by_port(self._portname) or {}
+        key = (self._portname, machine.get('iSerial'), machine.get('VID'), machine.get('PID'))
+        if not all(key):
+            # Devices without a USB serial number report an empty one
+            return None
+        return key
+
     def query(self, condition, leaveOpen=True):
         """
         open a connection to a machine and  query a machine for
@@ -131,17 +318,61 @@ class MachineInquisitor(object):
         @param leaveOpen IF true, serial connection to the machine is left open.
         @return a tuple of an (s3gObj, dictOfSettings
         """
-        import makerbot_driver.s3g as s3g
-        settings = {}
         s3gDriver = self.create_s3g(condition)
-        settings['vid'], settings['pid'] = s3gDriver.get_vid_pid()
-        firmware_version = s3gDriver.get_version()
-        
-        try:   
-            s3gDriver.init_eeprom_reader(firmware_version) 
-        except  makerbot_driver.EEPROM.MissingEepromMapError:
+        settings = None
+        firmware_version = None
+        key = None
+        if self._identity_cache is not None:
+            key = self.get_identity_key()
+        if key is not None:
+            identity = self._identity_cache.get(key)
+            if identity is not None:
+                firmware_version = s3gDriver.get_version()
+                if firmware_version == identity[0]:
+                    settings = self.restore_settings(s3gDriver, firmware_version, identity[1])
+                else:
+                    self._identity_cache.invalidate(key)
+        if settings is None:
+            settings, firmware_version = self.query_settings(s3gDriver, firmware_version)
+            if key is None and self._identity_cache is not None:
+                # get_vid_pid scans for machines if the detector has not yet
+                key = self.get_identity_key()
+            if key is not None:
+                self._identity_cache.put(key, firmware_version, settings)
+        if not leaveOpen:
+            s3gDriver.close()
+        return s3gDriver, settings
+
+    def restore_settings(self, s3gDriver, firmware_version, settings):
+        """
+        Sets an s3g object up from a machine's cached settings, without
+        talking to the machine
+
+        @return dict: The settings
+        """
+        self.init_eeprom_reader(s3gDriver, firmware_version)
+        s3gDriver.set_print_to_file_type(settings['print_to_file_type'])
+        return settings
+
+    def init_eeprom_reader(self, s3gDriver, firmware_version):
+        try:
+            s3gDriver.init_eeprom_reader(firmware_version)
+        except makerbot_driver.EEPROM.MissingEepromMapError:
             pass
-  
+
+    def query_settings(self, s3gDriver, firmware_version=None):
+        """
+        Asks a machine for all of its settings
+
+        @param int firmware_version: The machine's version, if already known
+        @return tuple: The settings dict and the firmware version
+        """
+        settings = {}
+        settings['vid'], settings['pid'] = s3gDriver.get_vid_pid()
+        if firmware_version is None:
+            firmware_version = s3gDriver.get_version()
+        self.init_eeprom_reader(s3gDriver, firmware_version)
+
         settings['tool_count'] = s3gDriver.get_toolhead_count()
         if settings['tool_count'] not in makerbot_driver.constants.valid_toolhead_counts : 
             settings['tool_count'] = 1
@@ -167,6 +398,4 @@ class MachineInquisitor(object):
         if len(settings['software_variant'].split('x')[1]) == 1:
             settings['software_variant'] = settings['software_variant'].replace('x', 'x0')
             
-        if not leaveOpen:
-            s3gDriver.close()
-        return s3gDriver, settings
+        return settings, firmware_version
@@ -13,18 +13,46 @@ import makerbot_driver
 class FileWriter(AbstractWriter):
     """ A file writer can be used to export an s3g payload stream to a file
     """
-    def __init__(self, file, condition):
+    default_buffer_size = 1024 * 1024
+    # ^ A good buffer_size for buffered writers
+
+    def __init__(self, file, condition, append_checksum=False, buffer_size=0):
         """ Initialize a new file writer
 
         @param string file File object to write to.
+        @param bool append_checksum If True, the file's checksum is written
+          at the end of it on close, as Gcode.FileComplete would
+        @param int buffer_size If set, payloads are collected in memory and
+          written buffer_size bytes at a time, and on flush or close.  The
+          file is only complete once the writer is closed.
         """
         super(FileWriter, self).__init__(file, condition)
         self.check_binary_mode()
         self._log = logging.getLogger(self.__class__.__name__)
+        self.append_checksum = append_checksum
+        self.checksum = 0
+        # ^ Running checksum of every payload written, kept only if
+        #   append_checksum is set
+        self.buffer_size = buffer_size
+        self._buffer = bytearray()
+
+    def flush(self):
+        """ Writes out any buffered payloads """
+        with self._condition:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self.check_binary_mode()
+            self.file.write(bytes(self._buffer))
+            del self._buffer[:]
 
     def close(self):
         with self._condition:
             if not self.file.closed:
+                self._flush()
+                if self.append_checksum:
+                    self.file.write(makerbot_driver.Encoder.encode_file_checksum(self.checksum))
                 self.file.close()
 
     def is_open(self):
@@ -39,6 +67,19 @@ class FileWriter(AbstractWriter):
         if self.external_stop:
             self._log.error('{"event":"external_stop"}')
             raise makerbot_driver.ExternalStopError
+        if self.buffer_size:
+            # The file mode is checked, and the lock taken, once per flush
+            if self.file.closed:
+                # As file.write would, rather than buffering what is never written
+                raise ValueError('I/O operation on closed file')
+            self._buffer.extend(payload)
+            if self.append_checksum:
+                self.checksum = makerbot_driver.Encoder.add_to_file_checksum(self.checksum, payload)
+            if len(self._buffer) >= self.buffer_size:
+                self.flush()
+            return
         self.check_binary_mode()
         with self._condition:
             self.file.write(bytes(payload))
+            if self.append_checksum:
+                self.checksum = makerbot_driver.Encoder.add_to_file_checksum(self.checksum, payload)
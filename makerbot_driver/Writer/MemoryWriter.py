@@ -0,0 +1,66 @@
+"""An implementation of s3g that collects s3g payloads in memory.
+
+Like FileWriter, a MemoryWriter can not handle query commands.  It is meant
+for converting to s3g/x3g without a trip through the disk, e.g. to hand
+the result straight to a network response.
+"""
+from __future__ import absolute_import
+import logging
+import threading
+
+from . import AbstractWriter
+import makerbot_driver
+
+
+class MemoryWriter(AbstractWriter):
+    """ A memory writer collects an s3g payload stream in a bytearray
+    """
+    def __init__(self, condition=None):
+        """ Initialize a new memory writer
+
+        @param condition Condition to lock on, a new one if None
+        """
+        if condition is None:
+            condition = threading.Condition()
+        super(MemoryWriter, self).__init__(None, condition)
+        self._log = logging.getLogger(self.__class__.__name__)
+        self.buffer = bytearray()
+        # ^ Every payload written so far
+        self.checksum = 0
+        # ^ Running checksum of every payload written
+        self.closed = False
+
+    def open(self):
+        with self._condition:
+            self.closed = False
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+
+    def is_open(self):
+        return not self.closed
+
+    def send_action_payload(self, payload):
+        if self.external_stop:
+            self._log.error('{"event":"external_stop"}')
+            raise makerbot_driver.ExternalStopError
+        if self.closed:
+            raise ValueError('I/O operation on closed writer')
+        self.buffer.extend(payload)
+        self.checksum = makerbot_driver.Encoder.add_to_file_checksum(self.checksum, payload)
+
+    def getvalue(self):
+        """ @return str A copy of everything written """
+        return bytes(self.buffer)
+
+    def getbuffer(self):
+        """ Gets everything written without copying it.  Nothing more can be
+        written while the memoryview is in use.
+
+        @return memoryview A view of the written bytes """
+        return memoryview(self.buffer)
+
+    def get_checksum_trailer(self):
+        """ @return str The trailer Gcode.FileComplete would add to the s3g """
+        return makerbot_driver.Encoder.encode_file_checksum(self.checksum)
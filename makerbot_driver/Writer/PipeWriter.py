@@ -0,0 +1,94 @@
+"""An implementation of s3g that streams s3g payloads down a pipe.
+
+Like FileWriter, a PipeWriter can not handle query commands.  Payloads are
+collected in memory and written in large chunks, to a file descriptor or any
+object with a write method, so a conversion can be streamed into a pipe,
+socket or response as it runs.
+"""
+from __future__ import absolute_import
+import os
+import logging
+import threading
+
+from . import AbstractWriter
+import makerbot_driver
+
+
+class PipeWriter(AbstractWriter):
+    """ A pipe writer streams an s3g payload stream to a file descriptor
+    """
+
+    default_buffer_size = 1024 * 1024
+    # ^ Number of bytes written to the pipe at once
+
+    def __init__(self, file, condition=None, buffer_size=None, closefd=True, append_checksum=False):
+        """ Initialize a new pipe writer
+
+        @param file An int file descriptor, or an object with a write method
+        @param condition Condition to lock on, a new one if None
+        @param int buffer_size Number of bytes collected before writing
+        @param bool closefd If True, close() also closes file
+        @param bool append_checksum If True, the stream's checksum is written
+          at the end of it on close, as Gcode.FileComplete would
+        """
+        if condition is None:
+            condition = threading.Condition()
+        super(PipeWriter, self).__init__(file, condition)
+        self._log = logging.getLogger(self.__class__.__name__)
+        if buffer_size is None:
+            buffer_size = self.default_buffer_size
+        self.buffer_size = buffer_size
+        self.closefd = closefd
+        self.append_checksum = append_checksum
+        self.checksum = 0
+        # ^ Running checksum of every payload written, kept only if
+        #   append_checksum is set
+        self.closed = False
+        self._buffer = bytearray()
+
+    def close(self):
+        with self._condition:
+            if not self.closed:
+                if self.append_checksum:
+                    self._buffer.extend(makerbot_driver.Encoder.encode_file_checksum(self.checksum))
+                self._flush()
+                self.closed = True
+                if self.closefd:
+                    if isinstance(self.file, int):
+                        os.close(self.file)
+                    else:
+                        self.file.close()
+
+    def is_open(self):
+        return not self.closed
+
+    def flush(self):
+        """ Writes out any buffered payloads """
+        with self._condition:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        if isinstance(self.file, int):
+            view = memoryview(self._buffer)
+            written = 0
+            # Pipes and sockets accept partial writes
+            while written < len(view):
+                written += os.write(self.file, view[written:])
+            del view
+        else:
+            self.file.write(bytes(self._buffer))
+        del self._buffer[:]
+
+    def send_action_payload(self, payload):
+        if self.external_stop:
+            self._log.error('{"event":"external_stop"}')
+            raise makerbot_driver.ExternalStopError
+        if self.closed:
+            raise ValueError('I/O operation on closed writer')
+        self._buffer.extend(payload)
+        if self.append_checksum:
+            self.checksum = makerbot_driver.Encoder.add_to_file_checksum(self.checksum, payload)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
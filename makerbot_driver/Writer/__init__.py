@@ -1,6 +1,8 @@
-__all__ = ['AbstractWriter', 'FileWriter', 'StreamWriter', 'errors']
+__all__ = ['AbstractWriter', 'FileWriter', 'StreamWriter', 'MemoryWriter', 'PipeWriter', 'errors']
 
 from AbstractWriter import *
 from StreamWriter import *
 from FileWriter import *
+from MemoryWriter import *
+from PipeWriter import *
 from errors import *
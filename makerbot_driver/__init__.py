@@ -1,19 +1,43 @@
-__all__ = ['GcodeProcessors', 'Encoder', 'EEPROM', 'FileReader', 'Gcode', 'Writer', 'MachineFactory', 'MachineDetector', 's3g', 'profile', 'constants', 'errors', 'GcodeAssembler', 'Factory']
+__all__ = ['GcodeProcessors', 'Encoder', 'EEPROM', 'FileReader', 'Gcode', 'Writer', 'MachineFactory', 'MachineDetector', 's3g', 'profile', 'constants', 'errors', 'GcodeAssembler', 'Factory', 'DiskCache', 'ConversionCache', 'ConnectionPool', 'IntelHex']
 
 __version__ = '0.1.1'
 
-from constants import *
-from errors import *
-from s3g import *
-from profile import *
-from GcodeAssembler import *
-from MachineDetector import *
-from MachineFactory import *
-from Factory import *
-import GcodeProcessors
-import Encoder
-import EEPROM
-import FileReader
-import Firmware
-import Gcode
-import Writer
+import sys
+import types
+import importlib
+
+_lazy_subpackages = ['GcodeProcessors', 'Encoder', 'EEPROM', 'FileReader', 'Firmware', 'Gcode', 'Writer']
+# ^ Subpackages that are only imported the first time they are looked up on
+#   the package.  The modules below stay eager, since their classes share
+#   their module's name and have to win over it.
+
+
+class _LazyPackage(types.ModuleType):
+    """ Python 2 modules cannot hook attribute lookups, so the package is
+    swapped for one of these in sys.modules """
+
+    def __getattr__(self, name):
+        # Only called for names that are not in the package yet
+        if name not in _lazy_subpackages:
+            raise AttributeError("'module' object has no attribute '%s'" % (name))
+        # Importing binds the subpackage to the package
+        importlib.import_module('.' + name, self.__name__)
+        return self.__dict__[name]
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(_lazy_subpackages))
+
+
+_package = _LazyPackage(__name__, __doc__)
+_package.__dict__.update(globals())
+_package._original_module = sys.modules[__name__]
+# ^ Python 2 clears a module's globals once it is garbage collected
+sys.modules[__name__] = _package
+
+# Modules imported from here on see the lazy package, the names they export
+# are copied over to it as each one is imported
+for _name in ['constants', 'errors', 's3g', 'profile', 'GcodeAssembler', 'MachineDetector', 'MachineFactory', 'Factory', 'DiskCache', 'ConversionCache', 'ConnectionPool', 'IntelHex']:
+    _module = importlib.import_module('.' + _name, __name__)
+    for _export in getattr(_module, '__all__', None) or dir(_module):
+        if not _export.startswith('_'):
+            setattr(_package, _export, getattr(_module, _export))
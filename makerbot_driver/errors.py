@@ -72,6 +72,88 @@ class TimeoutError(RetryableError):
         }
 
 
+class ProbeTimeoutError(Exception):
+    """
+    Signifies that a port took too long to answer while probing it
+    for a machine
+    """
+    def __init__(self, port, timeout):
+        self.port = port
+        self.timeout = timeout
+        self.value = {
+            'PORT': self.port,
+            'TIMEOUT': self.timeout
+        }
+
+    def __str__(self):
+        return 'probing %s took longer than %ss' % (self.port, self.timeout)
+
+
+class DuplicatePortError(ValueError):
+    """
+    Signifies that the same port was given more than once, for work
+    that can only be done on a port once at a time
+    """
+    def __init__(self, port):
+        self.port = port
+        self.value = {'PORT': self.port}
+
+    def __str__(self):
+        return '%s given more than once' % (self.port)
+
+
+class PortBusyError(Exception):
+    """
+    Signifies that a pooled connection stayed in use for longer than
+    allowed
+    """
+    def __init__(self, port):
+        self.port = port
+        self.value = {'PORT': self.port}
+
+    def __str__(self):
+        return '%s is in use' % (self.port)
+
+
+class UnknownMachineError(Exception):
+    """
+    Signifies that the machine on a port could not be matched to a profile
+    """
+    def __init__(self, port):
+        self.port = port
+        self.value = {'PORT': self.port}
+
+    def __str__(self):
+        return 'no profile matches the machine on %s' % (self.port)
+
+
+class HexFileError(ValueError):
+    """
+    Signifies an Intel HEX file that can not be used, either because a
+    line of it is malformed or because its contents do not fit
+    """
+    def __init__(self, line, reason):
+        self.line = line
+        self.reason = reason
+        self.value = {
+            'LINE': self.line,
+            'REASON': self.reason,
+        }
+
+    def __str__(self):
+        if self.line is None:
+            return self.reason
+        return 'line %i: %s' % (self.line, self.reason)
+
+
+class HexChecksumError(HexFileError):
+    """
+    Signifies a line of an Intel HEX file whose checksum does not match
+    """
+    def __init__(self, line):
+        HexFileError.__init__(self, line, 'checksum mismatch')
+
+
 class BufferOverflowError(Exception):
     """
     Signifies a reported overflow of the buffer from the bot
@@ -5,7 +5,12 @@ A machine profile object that holds all values for a specific profile.
 import json
 import os
 import re
+import copy
+import stat
+import time
+import marshal
 import logging
+import threading
 
 
 def _getprofiledir(profiledir):
@@ -28,17 +33,218 @@ class Profile(object):
             name += extension
         path = os.path.join(self.path, name)
         self._log.debug('{"event":"open_profile", "path":%s}', path)
-        if  os.path.isfile(path):
+        self.values = _profile_cache.get_values(path, name)
+
+
+def _refuse_change(self, *args, **kwargs):
+    raise TypeError('shared profile values can not be changed')
+
+
+class _ReadOnlyDict(dict):
+    """ The dicts in a shared profile's values.  Copies and pickles of them
+    are plain dicts the caller can change. """
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _refuse_change
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        copied = {}
+        memo[id(self)] = copied
+        for k, v in self.iteritems():
+            dict.__setitem__(copied, copy.deepcopy(k, memo), copy.deepcopy(v, memo))
+        return copied
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class _ReadOnlyList(list):
+    """ The lists in a shared profile's values.  Copies and pickles of them
+    are plain lists the caller can change. """
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = _refuse_change
+    append = extend = insert = pop = remove = reverse = sort = _refuse_change
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        copied = []
+        memo[id(self)] = copied
+        for v in self:
+            list.append(copied, copy.deepcopy(v, memo))
+        return copied
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def _make_read_only(value):
+    """
+    @param value: Values parsed from a profile's json
+    @return: The same values, with every dict and list made read only
+    """
+    if isinstance(value, dict):
+        return _ReadOnlyDict((k, _make_read_only(v)) for k, v in value.iteritems())
+    elif isinstance(value, list):
+        return _ReadOnlyList(_make_read_only(v) for v in value)
+    return value
+
+
+class ProfileCache(object):
+    """
+    A process-wide cache of parsed profiles and of the profile names in
+    each profile directory.  Entries are keyed by path and checked against
+    the file's mtime and size, so edited profiles are read again.  The
+    built in profiles only change when the driver does, so their directory
+    is checked at most once every index_ttl seconds; other directories are
+    checked on every lookup.
+    """
+
+    profile_extension = '.json'
+
+    def __init__(self, index_ttl=1.0):
+        """
+        @param float index_ttl: Seconds the built in profiles' listing is
+          trusted before their directory's mtime is checked again
+        """
+        self._log = logging.getLogger(self.__class__.__name__)
+        self.index_ttl = index_ttl
+        self._builtin_dir = _getprofiledir(None)
+        self._lock = threading.Lock()
+        self._values = {}
+        # ^ path: (mtime, size, marshalled values)
+        self._shared = {}
+        # ^ (profiledir, name): (mtime, size, Profile)
+        self._indexes = {}
+        # ^ profiledir: (mtime, profile file names, {regex: matches})
+        self._index_checked = {}
+        # ^ profiledir: time its mtime was last checked
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._shared.clear()
+            self._indexes.clear()
+            self._index_checked.clear()
+
+    def _stat_profile(self, path, name):
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            self._log.debug("no such profile file %s for %s", path, name)
+            raise IOError("no such profile file %s for %s", path, name)
+        return st.st_mtime, st.st_size
+
+    def get_values(self, path, name=None):
+        """
+        @param str path: Path to a profile file
+        @param str name: Name the profile was asked for by, for errors
+        @return dict: The profile's values, a fresh copy the caller owns
+        """
+        mtime, size = self._stat_profile(path, name)
+        entry = self._values.get(path)
+        if entry is None or entry[:2] != (mtime, size):
             with open(path) as fh:
                 try:
-                    self.values = json.load(fh)
+                    values = json.load(fh)
                 except Exception, e:
                     self._log.debug('profile load fail for %s on err %s',
                                     os.path.abspath(path), str(e))
                     raise e
-        else:
-            self._log.debug("no such profile file %s for %s", path, name)
-            raise IOError("no such profile file %s for %s", path, name)
+            # Unmarshalling is several times faster than parsing the json
+            # again or deep copying the values
+            entry = (mtime, size, marshal.dumps(values))
+            with self._lock:
+                self._values[path] = entry
+            return values
+        return marshal.loads(entry[2])
+
+    def get_shared_profile(self, name, profiledir=None):
+        """
+        @param str name: Name of the profile, NOT the path.
+        @param str profiledir: Directory to look in, or None for the
+          built in profiles
+        @return Profile: A profile shared with every other caller.  Its
+          values are read only, and changing them raises a TypeError.
+        """
+        profiledir = _getprofiledir(profiledir)
+        filename = name if name.endswith(self.profile_extension) else name + self.profile_extension
+        mtime, size = self._stat_profile(os.path.join(profiledir, filename), name)
+        key = (profiledir, name)
+        entry = self._shared.get(key)
+        if entry is None or entry[:2] != (mtime, size):
+            profile = Profile(name, profiledir)
+            profile.values = _make_read_only(profile.values)
+            entry = (mtime, size, profile)
+            with self._lock:
+                self._shared[key] = entry
+        return entry[2]
+
+    def _get_index(self, profiledir):
+        index = self._indexes.get(profiledir)
+        now = time.time()
+        if index is not None and profiledir == self._builtin_dir and \
+                now - self._index_checked.get(profiledir, 0) < self.index_ttl:
+            return index
+        # A single stat of the directory spots added or removed profiles
+        mtime = os.stat(profiledir).st_mtime
+        if index is None or index[0] != mtime:
+            filenames = [f for f in os.listdir(profiledir)
+                         if os.path.splitext(f)[1] == self.profile_extension]
+            index = (mtime, filenames, {})
+        with self._lock:
+            self._indexes[profiledir] = index
+            self._index_checked[profiledir] = now
+        return index
+
+    def list_profiles(self, profiledir=None):
+        """
+        @param str profiledir: Directory to look in, or None for the
+          built in profiles
+        @return list: Names of the profiles, without their .json extensions
+        """
+        filenames = self._get_index(_getprofiledir(profiledir))[1]
+        return [os.path.splitext(f)[0] for f in filenames]
+
+    def search_profiles_with_regex(self, regex, profiledir=None):
+        """
+        @param str regex: Regex to search profile file names with
+        @param str profiledir: Directory to look in, or None for the
+          built in profiles
+        @return list: The matching part of each matching file name
+        """
+        if regex is None:
+            return []
+        mtime, filenames, searches = self._get_index(_getprofiledir(profiledir))
+        matches = searches.get(regex)
+        if matches is None:
+            matches = []
+            for f in filenames:
+                match = re.search(regex, f)
+                if match:
+                    matches.append(match.group())
+            searches[regex] = matches
+        return list(matches)
+
+
+_profile_cache = ProfileCache()
+
+
+def get_profile_cache():
+    """ The process-wide ProfileCache """
+    return _profile_cache
+
+
+def get_shared_profile(name, profiledir=None):
+    """
+    Looks a profile up in the process-wide cache.  The profile is shared,
+    and its values are read only.  Callers that need to change them should
+    make their own with Profile.
+    """
+    return _profile_cache.get_shared_profile(name, profiledir)
 
 
 def list_profiles(profiledir=None):
@@ -47,33 +253,12 @@ def list_profiles(profiledir=None):
     end in .json and returns that list.
     @return A generator of profiles without their .json extensions
     """
-    path = _getprofiledir(profiledir)
-    profile_extension = '.json'
-    for f in os.listdir(path):
-        root, ext = os.path.splitext(f)
-        if profile_extension == ext :
-            yield root
+    for name in _profile_cache.list_profiles(profiledir):
+        yield name
 
 
 def search_profiles_with_regex(regex, profiledir=None):
     """
     Looks in profiledir for any profiles matching the regex
     """
-    if profiledir:
-        profiledir = profiledir
-    else:
-        profiledir = os.path.join(
-            os.path.abspath(os.path.dirname(__file__)),
-            'profiles',
-        )
-    path = _getprofiledir(profiledir)
-    profile_extension = '.json'
-    possible_files = os.listdir(path)
-    matches = []
-    if regex is not None:
-        for f in possible_files:
-            match = re.search(regex, f)
-            root, ext = os.path.splitext(f)
-            if match and ext == profile_extension:
-                matches.append(match.group())
-    return matches
+    return _profile_cache.search_profiles_with_regex(regex, profiledir)
@@ -4,10 +4,8 @@ from __future__ import absolute_import
 import struct
 import array
 import time
-import serial
 
 import makerbot_driver
-import uuid
 
 
 class s3g(object):
@@ -29,6 +27,8 @@ class s3g(object):
         @param timeout, time allowance before timeout error. 0.2 assummed
         @return s3g object, equipped with a StreamWrtier directed at port.
         """
+        # pyserial is only needed to talk to real machines
+        import serial
         s = serial.Serial(port, baudrate=baudrate, timeout=timeout)
 
         # begin baud rate hack
@@ -218,6 +218,30 @@ class s3g(object):
         # TODO: check response_code
         return sdResponse
 
+    def play_s3g_file(self, s3g_file, callback=None, overflow_wait=.2):
+        """
+        Sends every command in an s3g/x3g file to the bot, as it is.  Payloads
+        are split out of the file using only their lengths and framed
+        directly, so nothing is decoded and re-encoded.
+        @param file s3g_file: The s3g file, opened in binary mode
+        @param callback: Called with the percent of the file read whenever it changes
+        @param float overflow_wait: Seconds to wait before resending a command
+          the bot's buffer had no room for
+        @return int The number of commands sent
+        """
+        reader = makerbot_driver.FileReader.FileReader()
+        reader.file = s3g_file
+        count = 0
+        for payload in reader.iter_raw_payloads(callback):
+            while True:
+                try:
+                    self.writer.send_action_payload(payload)
+                    break
+                except makerbot_driver.BufferOverflowError:
+                    time.sleep(overflow_wait)
+            count += 1
+        return count
+
     def reset(self):
         """
         reset the bot, unless the bot is waiting to tell us a build is cancelled.
@@ -185,5 +185,20 @@ class UnpackResponseTests(unittest.TestCase):
         b.extend(expected_data)
         self.assertRaises(makerbot_driver.ProtocolError, makerbot_driver.Encoder.unpack_response_with_string, '', b)
 
+class TestFileChecksum(unittest.TestCase):
+
+    def test_add_to_file_checksum(self):
+        self.assertEqual(0, makerbot_driver.Encoder.add_to_file_checksum(0, ''))
+        self.assertEqual(6, makerbot_driver.Encoder.add_to_file_checksum(0, '\x01\x02\x03'))
+        self.assertEqual(10, makerbot_driver.Encoder.add_to_file_checksum(4, bytearray([1, 2, 3])))
+
+    def test_add_to_file_checksum_wraps(self):
+        data = '\xff' * 300
+        self.assertEqual((0xff * 300 + 65535) % 65536,
+                         makerbot_driver.Encoder.add_to_file_checksum(65535, data))
+
+    def test_encode_file_checksum(self):
+        self.assertEqual('1234', makerbot_driver.Encoder.encode_file_checksum(1234))
+
 if __name__ == "__main__":
     unittest.main()
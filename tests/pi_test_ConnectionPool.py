@@ -0,0 +1,173 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import time
+import unittest
+import threading
+
+import mock
+
+import makerbot_driver
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = mock.Mock(makerbot_driver.MachineFactory)
+        self.factory.build_from_port.side_effect = self.build_from_port
+        self.built = []
+        self.pool = makerbot_driver.ConnectionPool(idle_timeout=60, factory=self.factory)
+
+    def tearDown(self):
+        self.pool.close_all()
+
+    def build_from_port(self, portname, leaveOpen=True, condition=None):
+        machine = makerbot_driver.ReturnObject()
+        machine.s3g = mock.Mock(makerbot_driver.s3g)
+        machine.s3g.is_open.return_value = True
+        machine.s3g.get_version.return_value = 700
+        machine.profile = makerbot_driver.Profile('Replicator2')
+        machine.gcodeparser = mock.Mock()
+        self.built.append(machine)
+        return machine
+
+    def test_reuses_connection(self):
+        machine = self.pool.acquire('/dev/ttyACM0')
+        self.pool.release(machine)
+        self.assertTrue(machine is self.pool.acquire('/dev/ttyACM0'))
+        self.assertEqual(1, self.factory.build_from_port.call_count)
+        machine.s3g.get_version.assert_called_once_with()
+        self.assertFalse(machine.s3g.close.called)
+
+    def test_reused_connection_gets_new_parser(self):
+        machine = self.pool.acquire('/dev/ttyACM0')
+        old_parser = machine.gcodeparser
+        self.pool.release(machine)
+        self.pool.acquire('/dev/ttyACM0')
+        self.assertFalse(old_parser is machine.gcodeparser)
+        self.assertEqual(machine.s3g, machine.gcodeparser.s3g)
+        self.assertEqual(machine.profile, machine.gcodeparser.state.profile)
+
+    def test_ports_are_separate(self):
+        first = self.pool.acquire('/dev/ttyACM0')
+        second = self.pool.acquire('/dev/ttyACM1')
+        self.assertFalse(first is second)
+        self.assertEqual(2, self.factory.build_from_port.call_count)
+
+    def test_unhealthy_connection_replaced(self):
+        machine = self.pool.acquire('/dev/ttyACM0')
+        self.pool.release(machine)
+        machine.s3g.get_version.side_effect = makerbot_driver.TransmissionError('gone')
+        replacement = self.pool.acquire('/dev/ttyACM0')
+        self.assertFalse(replacement is machine)
+        machine.s3g.close.assert_called_once_with()
+
+    def test_closed_port_replaced(self):
+        machine = self.pool.acquire('/dev/ttyACM0')
+        self.pool.release(machine)
+        machine.s3g.is_open.return_value = False
+        self.assertFalse(machine is self.pool.acquire('/dev/ttyACM0'))
+
+    def test_not_reusable(self):
+        machine = self.pool.acquire('/dev/ttyACM0')
+        self.pool.release(machine, False)
+        machine.s3g.close.assert_called_once_with()
+        self.assertFalse(machine is self.pool.acquire('/dev/ttyACM0'))
+
+    def test_release_unknown(self):
+        self.assertRaises(ValueError, self.pool.release, self.build_from_port('/dev/ttyACM0'))
+
+    def test_unknown_machine(self):
+        unknown = makerbot_driver.ReturnObject()
+        unknown.s3g = None
+        self.factory.build_from_port.side_effect = None
+        self.factory.build_from_port.return_value = unknown
+        self.assertRaises(makerbot_driver.UnknownMachineError, self.pool.acquire, '/dev/ttyACM0')
+        # The port is not left claimed
+        self.factory.build_from_port.side_effect = self.build_from_port
+        self.pool.acquire('/dev/ttyACM0', timeout=0)
+
+    def test_busy(self):
+        self.pool.acquire('/dev/ttyACM0')
+        self.assertRaises(makerbot_driver.PortBusyError, self.pool.acquire, '/dev/ttyACM0', 0.01)
+
+    def test_waits_for_release(self):
+        machine = self.pool.acquire('/dev/ttyACM0')
+        got = []
+        thread = threading.Thread(target=lambda: got.append(self.pool.acquire('/dev/ttyACM0')))
+        thread.start()
+        time.sleep(0.05)
+        self.assertEqual([], got)
+        self.pool.release(machine)
+        thread.join(5)
+        self.assertEqual([machine], got)
+
+    def test_connection_context(self):
+        with self.pool.connection('/dev/ttyACM0') as machine:
+            pass
+        self.assertTrue(machine is self.pool.acquire('/dev/ttyACM0'))
+
+    def test_connection_context_error(self):
+        try:
+            with self.pool.connection('/dev/ttyACM0') as machine:
+                raise IOError('failed')
+        except IOError:
+            pass
+        machine.s3g.close.assert_called_once_with()
+
+    def test_close_idle(self):
+        machine = self.pool.acquire('/dev/ttyACM0')
+        self.pool.release(machine)
+        now = time.time()
+        self.assertTrue(0 < self.pool.close_idle(now) <= 60)
+        self.assertFalse(machine.s3g.close.called)
+        self.assertEqual(None, self.pool.close_idle(now + 61))
+        machine.s3g.close.assert_called_once_with()
+
+    def test_reaper_closes_idle(self):
+        self.pool.idle_timeout = 0.05
+        machine = self.pool.acquire('/dev/ttyACM0')
+        self.pool.release(machine)
+        for i in range(100):
+            if machine.s3g.close.called:
+                break
+            time.sleep(0.01)
+        machine.s3g.close.assert_called_once_with()
+
+    def test_close_all(self):
+        idle = self.pool.acquire('/dev/ttyACM0')
+        busy = self.pool.acquire('/dev/ttyACM1')
+        self.pool.release(idle)
+        self.pool.close_all()
+        idle.s3g.close.assert_called_once_with()
+        self.assertFalse(busy.s3g.close.called)
+        self.pool.release(busy)
+        busy.s3g.close.assert_called_once_with()
+
+    def test_global_pool(self):
+        self.assertTrue(makerbot_driver.get_connection_pool() is makerbot_driver.get_connection_pool())
+
+    def test_global_pool_threads(self):
+        module = sys.modules['makerbot_driver.ConnectionPool']
+        module._connection_pool = None
+        pools = []
+
+        def slow_pool(*args, **kwargs):
+            # Holds the first builder up long enough for the others to race it
+            time.sleep(0.2)
+            return mock.Mock()
+        with mock.patch.object(module, 'ConnectionPool', side_effect=slow_pool):
+            threads = [threading.Thread(target=lambda: pools.append(module.get_connection_pool())) for i in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        module._connection_pool = None
+        self.assertEqual(4, len(pools))
+        self.assertEqual(1, len(set(id(pool) for pool in pools)))
+
+
+if __name__ == '__main__':
+    unittest.main()
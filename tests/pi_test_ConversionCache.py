@@ -0,0 +1,147 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import unittest
+import mock
+import shutil
+import tempfile
+
+import makerbot_driver
+
+
+class TestConversionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.work_dir = tempfile.mkdtemp()
+        self.cache = makerbot_driver.ConversionCache(self.cache_dir, max_size=130)
+        self.input_path = self.write_file('input.gcode', 'M101\nG1 X0 Y0\nG90\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        shutil.rmtree(self.work_dir)
+
+    def write_file(self, name, contents):
+        path = os.path.join(self.work_dir, name)
+        with open(path, 'wb') as f:
+            f.write(contents)
+        return path
+
+    def test_make_key_depends_on_everything(self):
+        profile = makerbot_driver.Profile('ReplicatorDual')
+        other_profile = makerbot_driver.Profile('ReplicatorSingle')
+        changed_profile = makerbot_driver.Profile('ReplicatorDual')
+        changed_profile.values['print_to_file_type'] = ['x3g']
+        other_input = self.write_file('other.gcode', 'M101\n')
+        key = self.cache.make_key(self.input_path, ['RpmProcessor'], profile, 's3g')
+        others = [
+            self.cache.make_key(other_input, ['RpmProcessor'], profile, 's3g'),
+            self.cache.make_key(self.input_path, ['AbpProcessor'], profile, 's3g'),
+            self.cache.make_key(self.input_path, ['RpmProcessor'], other_profile, 's3g'),
+            self.cache.make_key(self.input_path, ['RpmProcessor'], changed_profile, 's3g'),
+            self.cache.make_key(self.input_path, ['RpmProcessor'], profile, 'x3g'),
+            self.cache.make_key(self.input_path, None, profile, 's3g'),
+            self.cache.make_key(self.input_path, ['RpmProcessor'], profile, 's3g', True),
+        ]
+        for other in others:
+            self.assertNotEqual(key, other)
+        self.assertEqual(key, self.cache.make_key(self.input_path, 'RpmProcessor, ', profile, 's3g'))
+
+    def test_get_miss(self):
+        self.assertEqual(None, self.cache.get('not_a_key'))
+
+    def test_put_and_get(self):
+        key = self.cache.make_key(self.input_path)
+        output = self.write_file('output', 'abcde')
+        path = self.cache.put(key, output)
+        self.assertEqual(path, self.cache.get(key))
+        with open(path, 'rb') as f:
+            self.assertEqual('abcde', f.read())
+        self.assertEqual([], [n for n in os.listdir(self.cache_dir) if n.startswith('.tmp-')])
+
+    def test_evicts_least_recently_used(self):
+        output = self.write_file('output', 'a' * 40)
+        for i, key in enumerate(['first', 'second', 'third']):
+            self.cache.put(key, output)
+            os.utime(self.cache.get_path(key), (i, i))
+        # Touching 'first' makes 'second' the oldest
+        self.cache.get('first')
+        self.cache.put('fourth', output)
+        self.assertEqual(None, self.cache.get('second'))
+        self.assertNotEqual(None, self.cache.get('first'))
+        self.assertNotEqual(None, self.cache.get('fourth'))
+        self.assertTrue(self.cache.get_size() <= self.cache.max_size)
+
+    def test_make_key_depends_on_encoder_version(self):
+        key = self.cache.make_key(self.input_path)
+        self.cache.encoder_version += 1
+        self.assertNotEqual(key, self.cache.make_key(self.input_path))
+
+    def test_put_bigger_than_max_size(self):
+        output = self.write_file('output', 'a' * 200)
+        path = self.cache.put('big', output)
+        self.assertTrue(os.path.exists(path))
+        # Until something else is stored
+        self.cache.put('small', self.write_file('small', 'a'))
+        self.assertFalse(os.path.exists(path))
+
+    def test_get_copy(self):
+        self.cache.put('key', self.write_file('output', 'abcde'))
+        copy_path = os.path.join(self.work_dir, 'copy')
+        self.assertTrue(self.cache.get_copy('key', copy_path))
+        with open(copy_path, 'rb') as f:
+            self.assertEqual('abcde', f.read())
+        self.assertFalse(self.cache.get_copy('not_a_key', copy_path))
+
+    def test_clear(self):
+        self.cache.put('key', self.input_path)
+        self.cache.clear()
+        self.assertEqual(0, self.cache.get_size())
+
+    def test_process_file_uses_cache(self):
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        output_path = os.path.join(self.work_dir, 'output.gcode')
+        got_path = factory.process_file(self.input_path, output_path, 'RpmProcessor', cache=self.cache)
+        self.assertEqual(output_path, got_path)
+        with open(output_path) as f:
+            self.assertEqual('G1 X0 Y0\nG90\n', f.read())
+        factory.get_processors = mock.Mock()
+        os.remove(output_path)
+        self.assertEqual(output_path, factory.process_file(self.input_path, output_path, 'RpmProcessor', cache=self.cache))
+        self.assertEqual(0, len(factory.get_processors.mock_calls))
+        with open(output_path) as f:
+            self.assertEqual('G1 X0 Y0\nG90\n', f.read())
+
+    def test_convert_gcode_file_uses_cache(self):
+        self.cache.max_size = 1024 * 1024
+        input_path = self.write_file('convert.gcode', 'G92 X0 Y0 Z0 A0 B0\nM73 P50\n')
+        output_path = os.path.join(self.work_dir, 'output.s3g')
+        got_path = makerbot_driver.convert_gcode_file(
+            input_path, output_path, 'ReplicatorDual', cache=self.cache)
+        self.assertEqual(output_path, got_path)
+        with open(output_path, 'rb') as f:
+            expected = f.read()
+        self.assertTrue(len(expected) > 0)
+        os.remove(output_path)
+        with mock.patch('makerbot_driver.Factory.create_print_to_file_parser') as create_parser:
+            self.assertEqual(output_path, makerbot_driver.convert_gcode_file(
+                input_path, output_path, 'ReplicatorDual', cache=self.cache))
+            self.assertFalse(create_parser.called)
+        with open(output_path, 'rb') as f:
+            self.assertEqual(expected, f.read())
+
+    def test_convert_gcode_file_legacy_not_shared(self):
+        self.cache.max_size = 1024 * 1024
+        input_path = self.write_file('convert.gcode', 'G92 X0 Y0 Z0 A0 B0\nM73 P50\n')
+        output_path = os.path.join(self.work_dir, 'output.s3g')
+        makerbot_driver.convert_gcode_file(input_path, output_path, 'ReplicatorDual', cache=self.cache)
+        with mock.patch('makerbot_driver.Factory.create_print_to_file_parser',
+                        wraps=makerbot_driver.Factory.create_print_to_file_parser) as create_parser:
+            makerbot_driver.convert_gcode_file(
+                input_path, output_path, 'ReplicatorDual', cache=self.cache, legacy=True)
+            self.assertTrue(create_parser.called)
+
+if __name__ == "__main__":
+    unittest.main()
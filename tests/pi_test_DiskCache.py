@@ -0,0 +1,88 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import unittest
+import mock
+import shutil
+import hashlib
+import tempfile
+
+import makerbot_driver
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.work_dir = tempfile.mkdtemp()
+        self.cache = makerbot_driver.DiskCache(self.cache_dir, max_size=100)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        shutil.rmtree(self.work_dir)
+
+    def write_file(self, name, contents):
+        path = os.path.join(self.work_dir, name)
+        with open(path, 'wb') as f:
+            f.write(contents)
+        return path
+
+    def test_default_dir(self):
+        class NamedCache(makerbot_driver.DiskCache):
+            cache_name = 'named'
+        with mock.patch('os.path.expanduser', return_value=self.cache_dir):
+            cache = NamedCache(None, 100)
+        self.assertEqual(os.path.join(self.cache_dir, '.makerbot_driver', 'named'), cache.cache_dir)
+        self.assertTrue(os.path.isdir(cache.cache_dir))
+
+    def test_write_entry_with_key(self):
+        path, key = self.cache.write_entry(self.write_file('a', 'abc'), 'key')
+        self.assertEqual('key', key)
+        self.assertEqual(os.path.join(self.cache_dir, 'key'), path)
+        self.assertEqual('abc', open(path).read())
+
+    def test_write_entry_keyed_on_contents(self):
+        path, key = self.cache.write_entry(self.write_file('a', 'abc'))
+        self.assertEqual(hashlib.sha1('abc').hexdigest(), key)
+        self.assertEqual(key, self.cache.hash_file(path))
+
+    def test_write_entry_replaces(self):
+        self.cache.write_entry(self.write_file('a', 'old'), 'key')
+        path = self.cache.write_entry(self.write_file('b', 'new'), 'key')[0]
+        self.assertEqual('new', open(path).read())
+        self.assertEqual(['key'], os.listdir(self.cache_dir))
+
+    def test_write_entry_failure_leaves_no_temp_file(self):
+        self.assertRaises(IOError, self.cache.write_entry, os.path.join(self.work_dir, 'missing'), 'key')
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_temp_files_not_listed(self):
+        open(os.path.join(self.cache_dir, '.tmp-abc'), 'w').close()
+        self.assertEqual([], self.cache.list_entries())
+
+    def test_evict(self):
+        for name in ['a', 'b', 'c']:
+            path = self.cache.write_entry(self.write_file(name, name * 40), name)[0]
+            os.utime(path, (ord(name), ord(name)))
+        self.assertEqual(120, self.cache.get_size())
+        self.cache.evict()
+        self.assertEqual(['b', 'c'], sorted(os.listdir(self.cache_dir)))
+
+    def test_evict_keep(self):
+        path = self.cache.write_entry(self.write_file('a', 'a' * 200), 'a')[0]
+        self.cache.evict(path)
+        self.assertEqual(['a'], os.listdir(self.cache_dir))
+        self.cache.evict()
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_clear(self):
+        self.cache.write_entry(self.write_file('a', 'a'), 'a')
+        open(os.path.join(self.cache_dir, '.tmp-abc'), 'w').close()
+        self.cache.clear()
+        self.assertEqual(['.tmp-abc'], os.listdir(self.cache_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
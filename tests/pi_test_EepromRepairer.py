@@ -6,6 +6,7 @@ sys.path.insert(0, lib_path)
 import unittest
 import mock
 import struct
+import tempfile
 
 import makerbot_driver
 
@@ -142,5 +143,16 @@ class TestEepromRepairer(unittest.TestCase):
         self.assertEqual(third_params[0], expect_b_offset)
         self.assertEqual(third_params[1], b)
 
+    def test_restore_from_hex_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.hex', delete=False) as f:
+            f.write(':0200000001FFFE\n:01000400AA51\n:00000001FF\n')
+        self.er.s3g = mock.Mock()
+        try:
+            self.er.restore_from_hex_file(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertEqual([mock.call(0, '\x01\xFF'), mock.call(4, '\xAA')],
+                         self.er.s3g.write_to_EEPROM.mock_calls)
+
 if __name__ == "__main__":
     unittest.main()
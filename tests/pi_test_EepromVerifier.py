@@ -10,7 +10,7 @@ import tempfile
 class testEepromVerifier(unittest.TestCase):
 
     def setUp(self):
-        self.mock_hex = ":20000000010617FF9FFF7676287676FF1BFF97340000E91800000000000000000000000040\n:20002000FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF40\n"
+        self.mock_hex = ":20000000010617FF9FFF7676287676FF1BFF97340000E91800000000000000000000000040\n:20002000FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFE0\n"
         with tempfile.NamedTemporaryFile(suffix='.hex', delete=False) as f:
             f.write(self.mock_hex)
             self.hex_path = f.name
@@ -20,7 +20,7 @@ class testEepromVerifier(unittest.TestCase):
         self.ev = None
 
     def test_cant_find_eeprom_map(self):
-        self.mock_hex = ":20000000010617FF9FFF7676287676FF1BFF97340000E91800000000000000000000000040\n:20002000FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF40\n"
+        self.mock_hex = ":20000000010617FF9FFF7676287676FF1BFF97340000E91800000000000000000000000040\n:20002000FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFE0\n"
         with tempfile.NamedTemporaryFile(suffix='.hex', delete=False) as f:
             f.write(self.mock_hex)
             hex_path = f.name
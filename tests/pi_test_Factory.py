@@ -66,5 +66,33 @@ class TestFactory(unittest.TestCase):
         self.assertTrue(
             parser.state.profile.values['type'] == 'The Replicator Single')
 
+    def run_gcode(self, parser):
+        parser.state.values['build_name'] = 'test'
+        for line in ['G92 X0 Y0 Z0 A0 B0\n', 'M104 S220 T0\n', 'G1 X10 Y10 Z1 F3000\n', 'G1 X20 Y5 F3000\n']:
+            parser.execute_line(line)
+        parser.s3g.writer.close()
+
+    def test_create_print_to_memory(self):
+        parser = makerbot_driver.create_print_to_memory_parser('ReplicatorSingle')
+        self.assertTrue(parser.s3g.writer.__class__.__name__ == 'MemoryWriter')
+        self.run_gcode(parser)
+        with tempfile.NamedTemporaryFile(suffix='.s3g', delete=True) as f:
+            path = f.name
+        file_parser = makerbot_driver.create_print_to_file_parser(path, 'ReplicatorSingle')
+        self.run_gcode(file_parser)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), parser.s3g.writer.getvalue())
+        os.remove(path)
+
+    def test_create_print_to_pipe(self):
+        read_fd, write_fd = os.pipe()
+        parser = makerbot_driver.create_print_to_pipe_parser(write_fd, 'ReplicatorSingle')
+        self.assertTrue(parser.s3g.writer.__class__.__name__ == 'PipeWriter')
+        self.run_gcode(parser)
+        memory_parser = makerbot_driver.create_print_to_memory_parser('ReplicatorSingle')
+        self.run_gcode(memory_parser)
+        with os.fdopen(read_fd, 'rb') as f:
+            self.assertEqual(memory_parser.s3g.writer.getvalue(), f.read())
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,49 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import unittest
+import tempfile
+
+import makerbot_driver
+
+
+class TestFileComplete(unittest.TestCase):
+
+    def setUp(self):
+        self.fc = makerbot_driver.Gcode.FileComplete()
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.s3g') as f:
+            self.path = f.name
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def write(self, data):
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_finish(self):
+        data = ''.join(chr(i % 256) for i in range(1000))
+        self.write(data)
+        self.fc.finish(self.path)
+        expected = sum(i % 256 for i in range(1000)) % 65536
+        self.assertEqual(data + str(expected), self.read())
+
+    def test_finish_empty_file(self):
+        self.fc.finish(self.path)
+        self.assertEqual('0', self.read())
+
+    def test_get_checksum_in_chunks(self):
+        data = '\xff' * 1000
+        self.write(data)
+        self.fc.chunk_size = 7
+        with open(self.path, 'rb') as f:
+            self.assertEqual((0xff * 1000) % 65536, self.fc.get_checksum(f))
+
+if __name__ == "__main__":
+    unittest.main()
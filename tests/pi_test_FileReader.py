@@ -80,6 +80,283 @@ class FileReaderTestsWithS3g(unittest.TestCase):
             self.assertEqual(readCmd, cmd)
 
 
+    def write_commands(self):
+        self.r.queue_extended_point_new([1, -2, 3, -4, 5], 42, [])
+        self.r.set_extended_position([1, 2, 3, 4, 5])
+        self.r.display_message(0, 0, 'hello', 10, False, False, False)
+        self.r.build_start_notification('a build')
+        self.r.set_toolhead_temperature(0, 220)
+        self.r.toggle_fan(0, True)
+        self.r.queue_extended_point_x3g([1, 2, 3, 4, 5], 42, [], 1.5, 3)
+        self.r.set_build_percent(100)
+        self.r.writer.file.flush()
+
+    def test_iter_payloads_matches_ReadFile(self):
+        self.write_commands()
+        expected = self.d.ReadFile()
+        self.assertEqual(8, len(expected))
+        for buffer_size in [1, 7, 1024]:
+            self.d.read_buffer_size = buffer_size
+            self.d.file.seek(0)
+            self.assertEqual(expected, list(self.d.iter_payloads()))
+
+    def test_iter_payloads_callback(self):
+        self.write_commands()
+        callback = mock.Mock()
+        list(self.d.iter_payloads(callback))
+        percents = [c[0][0] for c in callback.call_args_list]
+        self.assertEqual(100, percents[-1])
+        self.assertEqual(sorted(set(percents)), percents)
+        self.assertEqual(os.path.getsize(self.path), self.d.bytesread)
+
+
+class ParallelReadTests(unittest.TestCase):
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.s3g') as f:
+            self.path = f.name
+            for i in range(300):
+                f.write(struct.pack('<BiiiiiIB', 142, i, -i, i, 0, 0, 100, 0))
+                if i % 7 == 0:
+                    f.write(struct.pack('<BI', 153, i) + 'build %i\x00' % i)
+                if i % 11 == 0:
+                    f.write(struct.pack('<BBBBh', 136, 0, 3, 2, i))
+        self.size = os.path.getsize(self.path)
+        self.d = makerbot_driver.FileReader.FileReader()
+        self.d.file = open(self.path, 'rb')
+
+    def tearDown(self):
+        self.d.file.close()
+        os.remove(self.path)
+
+    def test_scan_boundaries(self):
+        self.d.read_buffer_size = 100
+        boundaries = self.d.scan_boundaries(1000)
+        self.assertEqual(0, boundaries[0])
+        self.assertEqual(self.size, boundaries[-1])
+        self.assertTrue(len(boundaries) > 5)
+        # Every boundary is the start of a command
+        self.d.file.seek(0)
+        offsets = set([0])
+        for payload in self.d.iter_payloads():
+            offsets.add(self.d.bytesread)
+        for boundary in boundaries:
+            self.assertTrue(boundary in offsets)
+        for start, end in zip(boundaries, boundaries[1:-1]):
+            self.assertTrue(end - start >= 1000)
+
+    def test_scan_boundaries_bad_data(self):
+        self.d.file = io.BytesIO(struct.pack('<BI', 133, 0) + '\xff')
+        self.assertRaises(makerbot_driver.FileReader.BadCommandError,
+                          self.d.scan_boundaries, 1000)
+
+    def test_read_file_parallel(self):
+        expected = self.d.ReadFile()
+        self.d.file.seek(0)
+        callback = mock.Mock()
+        payloads = self.d.read_file_parallel(callback, worker_count=2, chunk_size=500)
+        self.assertEqual(expected, payloads)
+        callback.assert_called_with(100)
+        self.assertEqual(self.size, self.d.bytesread)
+
+    def test_read_file_parallel_in_memory(self):
+        expected = self.d.ReadFile()
+        self.d.file.seek(0)
+        self.d.file = io.BytesIO(self.d.file.read())
+        self.assertEqual(expected, self.d.read_file_parallel(chunk_size=500))
+
+    def test_read_file_parallel_error(self):
+        with open(self.path, 'ab') as f:
+            f.write('\xff')
+        self.assertRaises(makerbot_driver.FileReader.BadCommandError,
+                          self.d.read_file_parallel, worker_count=2, chunk_size=500)
+
+
+class IterPayloadsTests(unittest.TestCase):
+    def setUp(self):
+        self.d = makerbot_driver.FileReader.FileReader()
+
+    def tearDown(self):
+        self.d = None
+
+    def iter_data(self, data):
+        self.d.file = io.BytesIO(data)
+        return list(self.d.iter_payloads())
+
+    def test_empty_file(self):
+        self.assertEqual([], self.iter_data(''))
+
+    def test_truncated_payload(self):
+        data = struct.pack('<BI', 133, 1000)
+        self.assertEqual([[133, 1000]], self.iter_data(data))
+        self.assertRaises(makerbot_driver.FileReader.InsufficientDataError,
+                          self.iter_data, data[:-1])
+
+    def test_bad_command(self):
+        self.assertRaises(makerbot_driver.FileReader.BadCommandError,
+                          self.iter_data, '\xff')
+
+    def test_slave_command_as_host_command(self):
+        cmd = makerbot_driver.slave_action_command_dict['SET_TOOLHEAD_TARGET_TEMP']
+        self.assertRaises(makerbot_driver.FileReader.BadHostCommandError,
+                          self.iter_data, chr(cmd))
+
+    def test_bad_slave_command(self):
+        data = struct.pack('<BBBB', 136, 0, 0xff, 0)
+        self.assertRaises(makerbot_driver.FileReader.BadSlaveCommandError,
+                          self.iter_data, data)
+
+    def test_unterminated_string(self):
+        data = struct.pack('<BI', 153, 0) + 'abc'
+        self.assertRaises(makerbot_driver.FileReader.InsufficientDataError,
+                          self.iter_data, data)
+
+    def test_string_too_long(self):
+        data = struct.pack('<BI', 153, 0) + 'a' * 40 + '\x00'
+        self.assertRaises(makerbot_driver.FileReader.StringTooLongError,
+                          self.iter_data, data)
+
+    def test_longest_string(self):
+        name = 'a' * (makerbot_driver.maximum_payload_length - 1)
+        data = struct.pack('<BI', 153, 7) + name + '\x00'
+        self.d.read_buffer_size = 3
+        self.assertEqual([[153, 7, name]], self.iter_data(data))
+
+    def test_iter_raw_payloads(self):
+        payloads = [
+            struct.pack('<BI', 133, 1000),
+            struct.pack('<BBBBh', 136, 0, 3, 2, 220),
+            struct.pack('<BI', 153, 7) + 'a build\x00',
+            struct.pack('<BBBBB', 149, 0, 0, 10, 0) + 'hi\x00',
+            struct.pack('<BBBB', 136, 0, 1, 0),
+        ]
+        data = ''.join(payloads)
+        for buffer_size in [1, 5, 1024]:
+            self.d.read_buffer_size = buffer_size
+            self.d.file = io.BytesIO(data)
+            self.assertEqual(payloads, list(self.d.iter_raw_payloads()))
+            self.assertEqual(len(data), self.d.bytesread)
+
+    def test_iter_commands(self):
+        payloads = [
+            struct.pack('<BI', 133, 1000),
+            struct.pack('<BI', 153, 7) + 'a build\x00',
+            struct.pack('<BBBBh', 136, 0, 3, 2, 220),
+        ]
+        data = ''.join(payloads)
+        for buffer_size in [1, 1024]:
+            self.d.read_buffer_size = buffer_size
+            self.d.file = io.BytesIO('x' + data)
+            self.d.file.seek(1)
+            expected = [(1, 133, payloads[0]), (6, 153, payloads[1]), (19, 136, payloads[2])]
+            self.assertEqual(expected, list(self.d._iter_commands()))
+            self.assertEqual(len(data) + 1, self.d.bytesread)
+
+    def test_iter_raw_payloads_errors(self):
+        self.d.file = io.BytesIO('\xff')
+        self.assertRaises(makerbot_driver.FileReader.BadCommandError,
+                          list, self.d.iter_raw_payloads())
+        self.d.file = io.BytesIO(struct.pack('<BBBB', 136, 0, 0xff, 0))
+        self.assertRaises(makerbot_driver.FileReader.BadSlaveCommandError,
+                          list, self.d.iter_raw_payloads())
+        self.d.file = io.BytesIO(struct.pack('<BI', 153, 0) + 'abc')
+        self.assertRaises(makerbot_driver.FileReader.InsufficientDataError,
+                          list, self.d.iter_raw_payloads())
+        self.d.file = io.BytesIO(struct.pack('<BI', 153, 0) + 'a' * 40 + '\x00')
+        self.assertRaises(makerbot_driver.FileReader.StringTooLongError,
+                          list, self.d.iter_raw_payloads())
+        self.d.file = io.BytesIO(struct.pack('<BI', 133, 0)[:-1])
+        self.assertRaises(makerbot_driver.FileReader.InsufficientDataError,
+                          list, self.d.iter_raw_payloads())
+
+    def test_build_command_decoders(self):
+        decoders = makerbot_driver.FileReader.build_command_decoders()
+        self.assertEqual(256, len(decoders))
+        self.assertEqual(None, decoders[0xff])
+        for cmd in makerbot_driver.host_action_command_dict.values():
+            self.assertNotEqual(None, decoders[cmd])
+        reader = mock.Mock()
+        reader.ParseToolAction.return_value = ['tool']
+        reader.ParseHostAction.return_value = ['host']
+        self.assertEqual(['tool'], decoders[136](reader))
+        reader.ParseToolAction.assert_called_once_with(136)
+        self.assertEqual(['host'], decoders[139](reader))
+        reader.ParseHostAction.assert_called_once_with(139)
+
+    def test_parse_next_payload_matches_iter_payloads(self):
+        data = struct.pack('<BI', 133, 1000) + struct.pack('<BBBBh', 136, 0, 3, 2, 220)
+        self.d.file = io.BytesIO(data)
+        expected = [self.d.ParseNextPayload(), self.d.ParseNextPayload()]
+        self.assertEqual(expected, self.iter_data(data))
+
+    def test_parse_next_payload_slave_command(self):
+        cmd = makerbot_driver.slave_action_command_dict['SET_TOOLHEAD_TARGET_TEMP']
+        self.d.file = io.BytesIO(chr(cmd))
+        self.assertRaises(makerbot_driver.FileReader.BadHostCommandError,
+                          self.d.ParseNextPayload)
+
+    def test_compile_format(self):
+        segments = makerbot_driver.FileReader.compile_format(['B', 'I', 's', 'h'])
+        self.assertEqual(3, len(segments))
+        self.assertEqual('<BI', segments[0].format)
+        self.assertEqual(None, segments[1])
+        self.assertEqual('<h', segments[2].format)
+
+
+@unittest.skipIf(makerbot_driver.FileReader.numpy is None, "numpy is not installed")
+class ReadMovesTests(unittest.TestCase):
+    def setUp(self):
+        self.d = makerbot_driver.FileReader.FileReader()
+        self.data = ''.join([
+            struct.pack('<BiiiiiI', 139, 1, 2, 3, 4, 5, 6),
+            struct.pack('<BiiiiiI', 139, -1, -2, -3, -4, -5, 7),
+            struct.pack('<BB', 150, 50) + struct.pack('<B', 0),
+            struct.pack('<BiiiiiIB', 142, 10, 20, 30, 40, 50, 60, 0x18),
+            struct.pack('<BBBBh', 136, 0, 3, 2, 220),
+            struct.pack('<BiiiiiIBfh', 155, 1, 2, 3, 4, 5, 6, 1, 2.5, 640),
+            struct.pack('<BiiiiiIBfh', 155, 7, 8, 9, 10, 11, 12, 0, 0.5, 32),
+        ])
+
+    def tearDown(self):
+        self.d = None
+
+    def read_moves(self, data):
+        self.d.file = io.BytesIO(data)
+        return self.d.read_moves()
+
+    def test_read_moves(self):
+        moves, others = self.read_moves(self.data)
+        self.assertEqual([0, 1, 3, 5, 6], list(moves['number']))
+        self.assertEqual([139, 139, 142, 155, 155], list(moves['command']))
+        self.assertEqual([1, -1, 10, 1, 7], list(moves['x']))
+        self.assertEqual([5, -5, 50, 5, 11], list(moves['b']))
+        self.assertEqual([6, 7, 60, 6, 12], list(moves['dda']))
+        self.assertEqual([0, 0, 0x18, 1, 0], list(moves['flags']))
+        self.assertEqual([0, 0, 0, 2.5, 0.5], list(moves['distance']))
+        self.assertEqual([0, 0, 0, 10, 0.5], list(moves['feedrate']))
+        self.assertEqual([(2, [150, 50, 0]), (4, [136, 0, 3, 2, 220])], others)
+        self.assertEqual(len(self.data), self.d.bytesread)
+
+    def test_read_moves_matches_iter_payloads(self):
+        self.d.file = io.BytesIO(self.data)
+        payloads = list(self.d.iter_payloads())
+        for buffer_size in [1, 30, 1024]:
+            self.d.read_buffer_size = buffer_size
+            moves, others = self.read_moves(self.data)
+            for move in moves:
+                payload = payloads[move['number']]
+                self.assertEqual(payload[:7], [move[f] for f in ['command', 'x', 'y', 'z', 'a', 'b', 'dda']])
+            self.assertEqual(len(payloads), len(moves) + len(others))
+
+    def test_read_moves_empty(self):
+        moves, others = self.read_moves('')
+        self.assertEqual(0, len(moves))
+        self.assertEqual([], others)
+
+    def test_read_moves_truncated(self):
+        self.assertRaises(makerbot_driver.FileReader.InsufficientDataError,
+                          self.read_moves, self.data[:-1])
+
+
 class MockTests(unittest.TestCase):
     def setUp(self):
         self.inputstream = io.BytesIO()
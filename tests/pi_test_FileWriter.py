@@ -32,6 +32,82 @@ class s3gFileWriterTests(unittest.TestCase):
         with open(self.the_file, 'r') as f:
             self.assertEqual(expected_payload, f.read())
 
+    def test_running_checksum(self):
+        self.w.append_checksum = True
+        self.w.send_action_payload('abc')
+        self.w.send_action_payload(bytearray([0xff] * 300))
+        checksum = (ord('a') + ord('b') + ord('c') + 0xff * 300) % 65536
+        self.assertEqual(checksum, self.w.checksum)
+        self.w.close()
+        with open(self.the_file, 'rb') as f:
+            self.assertEqual('abc' + '\xff' * 300 + str(checksum), f.read())
+
+    def test_no_checksum_unless_appended(self):
+        for buffer_size in [0, 1024]:
+            self.w.buffer_size = buffer_size
+            self.w.send_action_payload('abc')
+        self.assertEqual(0, self.w.checksum)
+        self.w.close()
+        self.assertEqual('abcabc', self.read_file())
+
+    def test_close_appends_checksum(self):
+        self.w.append_checksum = True
+        self.w.send_action_payload('abcde')
+        self.w.close()
+        # Same file as running FileComplete over it afterwards
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write('abcde')
+        makerbot_driver.Gcode.FileComplete().finish(f.name)
+        with open(self.the_file, 'rb') as f1:
+            with open(f.name, 'rb') as f2:
+                self.assertEqual(f2.read(), f1.read())
+        os.remove(f.name)
+
+    def read_file(self):
+        with open(self.the_file, 'rb') as f:
+            return f.read()
+
+    def test_buffered_writes_in_blocks(self):
+        self.w.buffer_size = 10
+        self.w.send_action_payload('abcd')
+        self.w.send_action_payload('efgh')
+        self.w.file.flush()
+        self.assertEqual('', self.read_file())
+        self.w.send_action_payload('ijkl')
+        self.w.file.flush()
+        self.assertEqual('abcdefghijkl', self.read_file())
+        self.w.send_action_payload('mn')
+        self.w.close()
+        self.assertEqual('abcdefghijklmn', self.read_file())
+
+    def test_buffered_flush(self):
+        self.w.buffer_size = 1024
+        self.w.send_action_payload(bytearray('abc'))
+        self.w.flush()
+        self.w.file.flush()
+        self.assertEqual('abc', self.read_file())
+
+    def test_buffered_close_appends_checksum(self):
+        self.w.buffer_size = 1024
+        self.w.append_checksum = True
+        self.w.send_action_payload('abc')
+        self.w.close()
+        self.assertEqual('abc' + str(ord('a') + ord('b') + ord('c')), self.read_file())
+
+    def test_write_after_close(self):
+        for buffer_size in [0, 1024]:
+            self.w.buffer_size = buffer_size
+            self.w.close()
+            self.assertRaises(ValueError, self.w.send_action_payload, 'abc')
+        self.assertEqual(0, self.w.checksum)
+
+    def test_buffered_write_non_binary_mode(self):
+        self.w.buffer_size = 1
+        self.w.close()
+        self.w.file = open(self.w.file.name, 'w')
+        with self.assertRaises(makerbot_driver.Writer.NonBinaryModeFileError):
+            self.w.send_action_payload('asdf')
+
     def test_write_external_stop(self):
         self.w.external_stop = True
         self.assertRaises(makerbot_driver.ExternalStopError,
@@ -0,0 +1,67 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import unittest
+
+import makerbot_driver
+
+
+class TestFusedProcessor(unittest.TestCase):
+
+    def setUp(self):
+        self.p = makerbot_driver.GcodeProcessors.FusedProcessor()
+
+    def tearDown(self):
+        self.p = None
+
+    def test_no_processors(self):
+        gcodes = ['G1 X0 Y0\n', 'M101\n']
+        self.assertEqual(gcodes, self.p.process_gcode(gcodes))
+
+    def test_transform_code_chains_processors(self):
+        # Toolchange must see the B that ToolSwap wrote, not the original A
+        self.p.processors = [
+            makerbot_driver.GcodeProcessors.ToolSwapProcessor(),
+            makerbot_driver.GcodeProcessors.ToolchangeProcessor(),
+        ]
+        self.assertEqual(['M135 T1\n', 'G1 X0 Y0 B1\n'], self.p._transform_code('G1 X0 Y0 A1\n'))
+
+    def test_matches_sequential_processing(self):
+        gcodes = [
+            'M101\n',
+            'G90\n',
+            'G1 X1 Y1 A1\n',
+            'M73 P1\n',
+            'G1 X2 Y2 B1\n',
+            'M108 T1\n',
+            'G1 X3 Y3 A2\n',
+        ]
+        names = ['RpmProcessor', 'CoordinateRemovalProcessor', 'AnchorProcessor', 'ToolchangeProcessor', 'RemoveProgressProcessor']
+        expected = gcodes
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        for processor in factory.get_processors(names, fuse=False):
+            expected = processor.process_gcode(expected)
+        self.p.processors = list(factory.get_processors(names, fuse=False))
+        self.assertEqual(expected, self.p.process_gcode(gcodes))
+
+    def test_stateless_if_every_processor_is(self):
+        stateless = [
+            makerbot_driver.GcodeProcessors.RpmProcessor(),
+            makerbot_driver.GcodeProcessors.RemoveProgressProcessor(),
+        ]
+        self.assertTrue(makerbot_driver.GcodeProcessors.FusedProcessor(stateless).is_stateless)
+        mixed = stateless + [makerbot_driver.GcodeProcessors.ToolchangeProcessor()]
+        self.assertFalse(makerbot_driver.GcodeProcessors.FusedProcessor(mixed).is_stateless)
+        self.assertFalse(self.p.is_stateless)
+
+    def test_set_external_stop(self):
+        self.p.processors = [makerbot_driver.GcodeProcessors.RpmProcessor()]
+        self.p.set_external_stop()
+        self.assertTrue(self.p._external_stop)
+        self.assertTrue(self.p.processors[0]._external_stop)
+        self.assertRaises(makerbot_driver.ExternalStopError, self.p.process_gcode, ['G1 X0\n'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import json
+import shutil
+import hashlib
+import tempfile
+import unittest
+
+import mock
+
+import makerbot_driver
+
+
+class TestHexCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.source_dir = tempfile.mkdtemp()
+        self.cache = makerbot_driver.Firmware.HexCache(self.cache_dir, max_size=1024)
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+        shutil.rmtree(self.source_dir)
+
+    def write_source(self, name, contents):
+        path = os.path.join(self.source_dir, name)
+        with open(path, 'wb') as f:
+            f.write(contents)
+        return path
+
+    def test_put_get(self):
+        source = self.write_source('fetched.hex', ':00000001FF\n')
+        url = 'http://firmware.makerbot.com/firmware/Example-1.0.hex'
+        path = self.cache.put(url, source)
+        self.assertEqual(hashlib.sha256(':00000001FF\n').hexdigest() + '.hex', os.path.basename(path))
+        self.assertEqual(':00000001FF\n', open(path).read())
+        self.assertEqual(path, self.cache.get(url))
+
+    def test_miss(self):
+        self.assertEqual(None, self.cache.get('http://firmware.makerbot.com/firmware/Example-1.0.hex'))
+
+    def test_same_contents_stored_once(self):
+        source = self.write_source('fetched.hex', ':00000001FF\n')
+        first = self.cache.put('http://a/Example-1.0.hex', source)
+        second = self.cache.put('http://b/Example-1.0.hex', source)
+        self.assertEqual(first, second)
+        self.assertEqual(1, len(self.cache.list_entries()))
+
+    def test_corrupt_entry_removed(self):
+        url = 'http://firmware.makerbot.com/firmware/Example-1.0.hex'
+        path = self.cache.put(url, self.write_source('fetched.hex', ':00000001FF\n'))
+        with open(path, 'wb') as f:
+            f.write(':00000001FE\n')
+        self.assertEqual(None, self.cache.get(url))
+        self.assertFalse(os.path.exists(path))
+
+    def test_changed_local_source_misses(self):
+        source = self.write_source('Example-1.0.hex', ':00000001FF\n')
+        self.cache.put(source, source)
+        self.assertNotEqual(None, self.cache.get(source))
+        self.write_source('Example-1.0.hex', ':0000000000\n:00000001FF\n')
+        self.assertEqual(None, self.cache.get(source))
+
+    def test_evict_least_recently_used(self):
+        old = self.cache.put('http://a/old.hex', self.write_source('old.hex', 'a' * 400))
+        new = self.cache.put('http://a/new.hex', self.write_source('new.hex', 'b' * 400))
+        os.utime(old, (1, 1))
+        os.utime(new, (2, 2))
+        # Using old makes new the least recently used
+        self.cache.get('http://a/old.hex')
+        self.cache.put('http://a/newest.hex', self.write_source('newest.hex', 'c' * 400))
+        self.assertTrue(os.path.exists(old))
+        self.assertFalse(os.path.exists(new))
+        self.assertEqual(None, self.cache.get('http://a/new.hex'))
+        self.assertEqual(800, self.cache.get_size())
+
+    def test_put_bigger_than_max_size(self):
+        path = self.cache.put('http://a/big.hex', self.write_source('big.hex', 'a' * 2000))
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(path, self.cache.get('http://a/big.hex'))
+
+    def test_held_file_survives_eviction(self):
+        path = self.cache.put('http://a/old.hex', self.write_source('old.hex', 'a' * 400))
+        held = self.cache.hold(path)
+        os.utime(path, (1, 1))
+        self.cache.put('http://a/new.hex', self.write_source('new.hex', 'b' * 1000))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual('a' * 400, open(held).read())
+        self.assertEqual(1, len(self.cache.list_entries()))
+
+    def test_temp_files_not_listed(self):
+        open(os.path.join(self.cache_dir, '.tmp-abc.hex'), 'w').close()
+        self.assertEqual([], self.cache.list_entries())
+
+    def test_clear(self):
+        self.cache.put('http://a/old.hex', self.write_source('old.hex', 'a'))
+        self.cache.clear()
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_global_cache(self):
+        module = sys.modules['makerbot_driver.Firmware.HexCache']
+        with mock.patch.object(module, '_hex_cache', None):
+            with mock.patch('os.path.expanduser', return_value=self.cache_dir):
+                cache = makerbot_driver.Firmware.get_hex_cache()
+                self.assertTrue(cache is makerbot_driver.Firmware.get_hex_cache())
+        self.assertEqual(os.path.join(self.cache_dir, '.makerbot_driver', 'firmware_hex'), cache.cache_dir)
+
+
+class TestUploaderHexCache(unittest.TestCase):
+
+    def setUp(self):
+        test_files = os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            'test_files',
+        )
+        self.source_url = tempfile.mkdtemp()
+        for filename in ['products.json', 'Example.json']:
+            shutil.copy2(os.path.join(test_files, filename), self.source_url)
+        os.mkdir(os.path.join(self.source_url, 'firmware'))
+        with open(os.path.join(self.source_url, 'firmware', 'Example-1.0.hex'), 'w') as f:
+            f.write(':0100000001FE\n:00000001FF\n')
+        self.dest = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.hex_cache = makerbot_driver.Firmware.HexCache(self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.source_url)
+        shutil.rmtree(self.dest)
+        shutil.rmtree(self.cache_dir)
+
+    def make_uploader(self):
+        return makerbot_driver.Firmware.Uploader(
+            source_url=self.source_url, dest_path=tempfile.mkdtemp(dir=self.dest),
+            hex_cache=self.hex_cache)
+
+    def test_download_firmware_cached(self):
+        path = self.make_uploader().download_firmware('Example', 'pid_example', '1.0')
+        self.assertEqual(self.cache_dir, os.path.dirname(path))
+        self.assertEqual(':0100000001FE\n:00000001FF\n', open(path).read())
+        # Another uploader finds it in the cache without fetching
+        uploader = self.make_uploader()
+        with mock.patch.object(self.hex_cache, 'put') as put:
+            self.assertEqual(path, uploader.download_firmware('Example', 'pid_example', '1.0'))
+            self.assertFalse(put.called)
+
+    def test_hex_not_kept_in_dest_path(self):
+        uploader = self.make_uploader()
+        uploader.download_firmware('Example', 'pid_example', '1.0')
+        self.assertEqual(['Example.json', 'products.json'], sorted(os.listdir(uploader.dest_path)))
+
+    def test_remote_hex_downloaded_to_temp(self):
+        uploader = self.make_uploader()
+        uploader.source_url = 'http://firmware.makerbot.com'
+        response = mock.Mock()
+        response.read.return_value = ':0100000001FE\n:00000001FF\n'
+        uploader.urlopen = mock.Mock(return_value=response)
+        downloads = []
+        download_to_temp = uploader._download_to_temp
+        uploader._download_to_temp = lambda url: downloads.append(download_to_temp(url)) or downloads[-1]
+        path = uploader.get_hex_file('http://firmware.makerbot.com/firmware/Example-1.0.hex')
+        self.assertEqual(':0100000001FE\n:00000001FF\n', open(path).read())
+        uploader.urlopen.assert_called_once_with('http://firmware.makerbot.com/firmware/Example-1.0.hex')
+        # The download is removed once it is in the cache
+        self.assertEqual(1, len(downloads))
+        self.assertFalse(os.path.exists(downloads[0]))
+        self.assertEqual(['products.json'], os.listdir(uploader.dest_path))
+
+    def test_corrupt_hex_fetched_again(self):
+        path = self.make_uploader().download_firmware('Example', 'pid_example', '1.0')
+        with open(path, 'w') as f:
+            f.write('garbage')
+        path = self.make_uploader().download_firmware('Example', 'pid_example', '1.0')
+        self.assertEqual(':0100000001FE\n:00000001FF\n', open(path).read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import tempfile
+import unittest
+
+import makerbot_driver
+
+
+def make_record(address, record_type, data):
+    record = bytearray([len(data), address >> 8, address & 0xFF, record_type]) + bytearray(data)
+    record.append(-sum(record) & 0xFF)
+    return ':' + str(record).encode('hex').upper()
+
+
+class TestParseHex(unittest.TestCase):
+
+    def test_contiguous(self):
+        lines = [
+            make_record(0x0000, 0, '\x01\x02\x03\x04'),
+            make_record(0x0004, 0, '\x05\x06'),
+            ':00000001FF',
+        ]
+        image = makerbot_driver.IntelHex.parse_hex(lines)
+        self.assertEqual(0, image.start)
+        self.assertEqual(6, image.end)
+        self.assertEqual(bytearray('\x01\x02\x03\x04\x05\x06'), image.data)
+        self.assertEqual(6, image.get_covered_count())
+        self.assertEqual([(0, '\x01\x02\x03\x04\x05\x06')], image.get_segments())
+
+    def test_gaps(self):
+        lines = [
+            make_record(0x0010, 0, '\xAA\xBB'),
+            make_record(0x0014, 0, '\xCC'),
+            ':00000001FF',
+        ]
+        image = makerbot_driver.IntelHex.parse_hex(lines)
+        self.assertEqual(0x10, image.start)
+        self.assertEqual(bytearray('\xAA\xBB\xFF\xFF\xCC'), image.data)
+        self.assertTrue(image.is_covered(0x11))
+        self.assertFalse(image.is_covered(0x12))
+        self.assertFalse(image.is_covered(0x0F))
+        self.assertFalse(image.is_covered(0x15))
+        self.assertEqual([(0x10, '\xAA\xBB'), (0x14, '\xCC')], image.get_segments())
+        self.assertEqual({0x10: 'AA', 0x11: 'BB', 0x14: 'CC'}, image.get_hex_map())
+
+    def test_extended_addresses(self):
+        lines = [
+            make_record(0, 4, '\x00\x01'),
+            make_record(0x0002, 0, '\x11'),
+            make_record(0, 2, '\x20\x00'),
+            make_record(0x0003, 0, '\x22'),
+            ':00000001FF',
+        ]
+        image = makerbot_driver.IntelHex.parse_hex(lines)
+        self.assertEqual([(0x10002, '\x11'), (0x20003, '\x22')], image.get_segments())
+
+    def test_stops_at_end_of_file(self):
+        lines = [
+            make_record(0, 0, '\x01'),
+            ':00000001FF',
+            'not a record',
+        ]
+        self.assertEqual(1, len(makerbot_driver.IntelHex.parse_hex(lines)))
+
+    def test_start_address_skipped(self):
+        lines = [
+            make_record(0, 3, '\x00\x00\x00\x00'),
+            make_record(0, 0, '\x01'),
+        ]
+        self.assertEqual(1, len(makerbot_driver.IntelHex.parse_hex(lines)))
+
+    def test_empty(self):
+        image = makerbot_driver.IntelHex.parse_hex([':00000001FF'])
+        self.assertEqual(0, len(image))
+        self.assertEqual([], image.get_segments())
+
+    def test_bad_checksum(self):
+        lines = [make_record(0, 0, '\x01'), ':0100000001FF']
+        with self.assertRaises(makerbot_driver.HexChecksumError) as context:
+            makerbot_driver.IntelHex.parse_hex(lines)
+        self.assertEqual(2, context.exception.line)
+
+    def test_malformed(self):
+        for line in ['0100000001FE', ':01000000ZZFE', ':0200000001FD', ':0100000701F7']:
+            self.assertRaises(makerbot_driver.HexFileError, makerbot_driver.IntelHex.parse_hex, [line])
+
+    def test_parse_hex_file(self):
+        with tempfile.NamedTemporaryFile(suffix='.hex', delete=False) as f:
+            f.write(make_record(0, 0, '\x01\x02') + '\r\n:00000001FF\r\n')
+        try:
+            image = makerbot_driver.IntelHex.parse_hex_file(f.name)
+        finally:
+            os.remove(f.name)
+        self.assertEqual(bytearray('\x01\x02'), image.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
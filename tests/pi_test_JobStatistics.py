@@ -0,0 +1,83 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import unittest
+import io
+
+import makerbot_driver
+
+
+class TestAnalyzeS3gFile(unittest.TestCase):
+
+    def setUp(self):
+        self.s = makerbot_driver.s3g()
+        self.s.writer = makerbot_driver.Writer.MemoryWriter()
+
+    def tearDown(self):
+        self.s = None
+
+    def analyze(self, profile=None):
+        return makerbot_driver.FileReader.analyze_s3g_file(
+            io.BytesIO(self.s.writer.getvalue()), profile)
+
+    def test_empty_file(self):
+        stats = self.analyze()
+        self.assertEqual({}, stats['command_counts'])
+        self.assertEqual(0, stats['command_count'])
+        self.assertEqual(None, stats['bounding_box_steps'])
+        self.assertEqual({'A': 0, 'B': 0}, stats['extrusion_steps'])
+        self.assertEqual(0, stats['tool_changes'])
+        self.assertEqual(0, stats['estimated_time'])
+
+    def test_statistics(self):
+        self.s.change_tool(0)
+        self.s.queue_extended_point_new([100, 200, 0, 50, 0], 1000000, [])
+        self.s.change_tool(0)
+        self.s.change_tool(1)
+        self.s.queue_extended_point_new([-100, 300, 400, 0, 30], 500000, [])
+        self.s.queue_extended_point_new([0, 0, 0, 0, 10], 250000, ['X', 'Y', 'Z', 'A', 'B'])
+        self.s.set_extended_position([0, 0, 0, 0, 0])
+        self.s.queue_extended_point_classic([10, 0, 0, 0, 0], 100)
+        self.s.delay(250000)
+        self.s.queue_extended_point_x3g([10, 0, 0, 0, 5], 1000, [], 2.0, 4)
+        stats = self.analyze()
+        self.assertEqual({134: 3, 142: 3, 140: 1, 139: 1, 133: 1, 155: 1}, stats['command_counts'])
+        self.assertEqual(10, stats['command_count'])
+        self.assertEqual({'X': (-100, 100), 'Y': (0, 300), 'Z': (0, 400)},
+                         stats['bounding_box_steps'])
+        self.assertEqual({'A': 0, 'B': 45}, stats['extrusion_steps'])
+        self.assertEqual(1, stats['tool_changes'])
+        # 3 moves by duration, 10 steps at 100us, a delay and 2mm at 4mm/s
+        self.assertAlmostEqual(1.75 + 0.001 + 0.25 + 0.5, stats['estimated_time'])
+
+    def test_statistics_in_mm(self):
+        profile = makerbot_driver.Profile('ReplicatorDual')
+        self.s.queue_extended_point_new([0, 0, 0, 0, 0], 1000, [])
+        self.s.queue_extended_point_new([941, 0, 400, -963, 0], 1000, [])
+        stats = self.analyze(profile)
+        x_low, x_high = stats['bounding_box_mm']['X']
+        self.assertAlmostEqual(0, x_low)
+        self.assertAlmostEqual(10, x_high, 1)
+        self.assertEqual((0, 1), stats['bounding_box_mm']['Z'])
+        self.assertAlmostEqual(10, stats['extrusion_mm']['A'], 1)
+        self.assertEqual(0, stats['extrusion_mm']['B'])
+
+    def test_statistics_in_fractional_mm(self):
+        profile = makerbot_driver.Profile('ReplicatorDual')
+        self.s.queue_extended_point_new([0, 0, 0, 0, 0], 1000, [])
+        self.s.queue_extended_point_new([0, 0, 4123, 0, 0], 1000, [])
+        stats = self.analyze(profile)
+        z_low, z_high = stats['bounding_box_mm']['Z']
+        self.assertAlmostEqual(0, z_low)
+        self.assertAlmostEqual(10.3075, z_high)
+
+    def test_statistics_single_extruder(self):
+        profile = makerbot_driver.Profile('ReplicatorSingle')
+        self.s.queue_extended_point_new([0, 0, 0, -963, 0], 1000, [])
+        stats = self.analyze(profile)
+        self.assertEqual(['A'], stats['extrusion_mm'].keys())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import json
+import unittest
+import subprocess
+
+import makerbot_driver
+
+# Imports makerbot_driver in a fresh interpreter, touching the names in
+# argv, and reports how long that took and which modules it loaded
+_import_script = """
+import sys
+import json
+import time
+sys.path.insert(0, %r)
+before = set(sys.modules)
+start = time.time()
+import makerbot_driver
+for name in sys.argv[1:]:
+    getattr(makerbot_driver, name)
+elapsed = time.time() - start
+loaded = [m for m in set(sys.modules) - before if sys.modules[m] is not None]
+print(json.dumps({'elapsed': elapsed, 'loaded': loaded}))
+""" % (lib_path)
+
+
+def run_import(*names):
+    output = subprocess.check_output(
+        [sys.executable, '-c', _import_script] + list(names))
+    return json.loads(output.splitlines()[-1])
+
+
+class TestLazyImport(unittest.TestCase):
+
+    def test_subpackages_not_imported(self):
+        loaded = run_import()['loaded']
+        for name in ['GcodeProcessors', 'Encoder', 'EEPROM', 'FileReader', 'Firmware', 'Gcode', 'Writer']:
+            self.assertFalse('makerbot_driver.' + name in loaded, name)
+
+    def test_heavy_dependencies_not_imported(self):
+        loaded = run_import()['loaded']
+        for name in ['serial', 'numpy', 'urllib2', 'uuid', 'multiprocessing']:
+            self.assertFalse(name in loaded, name)
+
+    def test_subpackage_imported_on_access(self):
+        loaded = run_import('Writer')['loaded']
+        self.assertTrue('makerbot_driver.Writer' in loaded)
+        self.assertFalse('makerbot_driver.Firmware' in loaded)
+
+    def test_every_subpackage_imported_on_access(self):
+        subpackages = ['GcodeProcessors', 'Encoder', 'EEPROM', 'FileReader', 'Firmware', 'Gcode', 'Writer']
+        loaded = run_import(*subpackages)['loaded']
+        for name in subpackages:
+            self.assertTrue('makerbot_driver.' + name in loaded, name)
+
+    def test_import_time(self):
+        # Each import runs in a fresh interpreter, and the best of several
+        # runs is kept, so a busy machine mostly slows both alike.  The
+        # numbers are reported, and only a lazy import far slower than a
+        # full one fails.
+        subpackages = ['GcodeProcessors', 'Encoder', 'EEPROM', 'FileReader', 'Firmware', 'Gcode', 'Writer']
+        lazy = min(run_import()['elapsed'] for i in range(5))
+        full = min(run_import(*subpackages)['elapsed'] for i in range(5))
+        sys.stderr.write('\nimport makerbot_driver: lazy %.1fms, everything %.1fms\n' % (lazy * 1000, full * 1000))
+        self.assertTrue(lazy < full * 2, 'lazy %f, full %f' % (lazy, full))
+
+
+class TestLazyPackage(unittest.TestCase):
+
+    def test_subpackage_attribute(self):
+        gcode = makerbot_driver.Gcode
+        self.assertEqual(sys.modules['makerbot_driver.Gcode'], gcode)
+
+    def test_from_import(self):
+        from makerbot_driver import Firmware, s3g, Profile
+        self.assertEqual(sys.modules['makerbot_driver.Firmware'], Firmware)
+        self.assertEqual(makerbot_driver.s3g, s3g)
+        self.assertTrue(isinstance(s3g, type))
+        self.assertEqual(makerbot_driver.profile.Profile, Profile)
+
+    def test_class_shadows_module(self):
+        self.assertTrue(isinstance(makerbot_driver.MachineFactory, type))
+        self.assertTrue(isinstance(makerbot_driver.GcodeAssembler, type))
+
+    def test_unknown_attribute(self):
+        self.assertRaises(AttributeError, getattr, makerbot_driver, 'NotASubpackage')
+        self.assertFalse(hasattr(makerbot_driver, 'NotASubpackage'))
+
+    def test_dir(self):
+        names = dir(makerbot_driver)
+        for name in makerbot_driver.__all__:
+            self.assertTrue(name in names, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -72,5 +72,24 @@ class TestLineTransformProcessor(unittest.TestCase):
         self.assertEqual(got_output, expected_output)
 
 
+    def test_process_gcode_callback_only_on_change(self):
+        callback = mock.Mock()
+        self.p.stop_check_interval = 1
+        self.p.process_gcode(['G1 X0 Y0\n'] * 1000, callback)
+        percents = [c[0][0] for c in callback.call_args_list]
+        self.assertEqual(range(101), sorted(set(percents)))
+        self.assertEqual(len(set(percents)), len(percents))
+
+    def test_process_gcode_callback_every_percent(self):
+        # Short files report each percent, not once per stop_check_interval
+        callback = mock.Mock()
+        self.p.process_gcode(['G1 X0 Y0\n'] * 50, callback)
+        percents = [c[0][0] for c in callback.call_args_list]
+        self.assertEqual(range(2, 101, 2), percents)
+
+    def test_process_gcode_external_stop(self):
+        self.p.set_external_stop()
+        self.assertRaises(makerbot_driver.ExternalStopError, self.p.process_gcode, ['G1 X0 Y0\n'])
+
 if __name__ == "__main__":
     unittest.main()
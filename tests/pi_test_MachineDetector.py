@@ -5,6 +5,7 @@ sys.path.insert(0, lib_path)
 
 import unittest
 import mock
+import threading
 
 import makerbot_driver
 
@@ -215,8 +216,8 @@ class TestMachineDetectorScanTests(unittest.TestCase):
     def test_scan_new_bots(self):
         blob = {
             'port': '/dev/dummy',
-            'vid': 0x23C1,
-            'pid': 0xD314,
+            'VID': 0x23C1,
+            'PID': 0xD314,
             'iSerail': '1234567890',
         }
         self.list_ports_mock.return_value = [blob]
@@ -229,14 +230,14 @@ class TestMachineDetectorScanTests(unittest.TestCase):
     def test_scan_new_bots_additional_bot(self):
         blob1 = {
             'port': '/dev/dummy1',
-            'vid': 0x23C1,
-            'pid': 0xD314,
+            'VID': 0x23C1,
+            'PID': 0xD314,
             'iSerail': '1234567890',
         }
         blob2 = {
             'port': '/dev/dummy2',
-            'vid': 0x23C1,
-            'pid': 0xD314,
+            'VID': 0x23C1,
+            'PID': 0xD314,
             'iSerail': '0987654321',
         }
 
@@ -264,14 +265,14 @@ class TestMachineDetectorScanTests(unittest.TestCase):
     def test_scan_new_bots_bot_removed(self):
         blob1 = {
             'port': '/dev/dummy1',
-            'vid': 0x23C1,
-            'pid': 0xD314,
+            'VID': 0x23C1,
+            'PID': 0xD314,
             'iSerail': '1234567890',
         }
         blob2 = {
             'port': '/dev/dummy2',
-            'vid': 0x23C1,
-            'pid': 0xD314,
+            'VID': 0x23C1,
+            'PID': 0xD314,
             'iSerail': '0987654321',
         }
         #mock up finding  2 bot
@@ -295,6 +296,103 @@ class TestMachineDetectorScanTests(unittest.TestCase):
         self.assertEqual(self.md.machines_recently_seen, expected_recent)
 
 
+class TestMachineDetectorIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.md = makerbot_driver.MachineDetector()
+        self.rep2 = {'port': '/dev/ttyACM0', 'VID': 0x23C1, 'PID': 0xB015, 'iSerial': '1'}
+        self.rep = {'port': '/dev/ttyACM1', 'VID': 0x23C1, 'PID': 0xD314, 'iSerial': '2'}
+        self.other = {'port': '/dev/ttyUSB0', 'VID': 0x1234, 'PID': 0x5678, 'iSerial': '3'}
+        self.ports = [self.rep2, self.rep, self.other]
+        self.list_ports_mock = mock.Mock(side_effect=lambda: iter(self.ports))
+        self.md.list_ports_by_vid_pid = self.list_ports_mock
+        self.md.get_tty_signature = mock.Mock(return_value=None)
+
+    def test_scan_enumerates_once(self):
+        self.md.scan()
+        self.assertEqual(1, self.list_ports_mock.call_count)
+        self.assertEqual({self.rep2['port']: self.rep2, self.rep['port']: self.rep},
+                         self.md.machines_just_seen)
+
+    def test_scan_indexes_by_vid_pid(self):
+        self.md.scan()
+        self.assertEqual({self.rep2['port']: self.rep2},
+                         self.md.machines_by_vid_pid[(0x23C1, 0xB015)])
+        self.assertFalse((0x1234, 0x5678) in self.md.machines_by_vid_pid)
+
+    def test_scan_machine_type(self):
+        self.md.scan('The Replicator 2')
+        self.assertEqual({self.rep2['port']: self.rep2}, self.md.machines_just_seen)
+
+    def test_vid_pid_from_portname_uses_index(self):
+        self.md.scan()
+        self.assertEqual((0x23C1, 0xD314), self.md.vid_pid_from_portname('/dev/ttyACM1'))
+        self.assertEqual(1, self.list_ports_mock.call_count)
+
+    def test_vid_pid_from_portname_rescans_unknown_port(self):
+        self.md.scan()
+        self.ports.append({'port': '/dev/ttyACM2', 'VID': 0x23C1, 'PID': 0xB016})
+        self.assertEqual((0x23C1, 0xB016), self.md.vid_pid_from_portname('/dev/ttyACM2'))
+        self.assertEqual(2, self.list_ports_mock.call_count)
+
+    def test_update_diff(self):
+        added, removed = self.md.update()
+        self.assertEqual({self.rep2['port']: self.rep2, self.rep['port']: self.rep}, added)
+        self.assertEqual({}, removed)
+        self.ports.remove(self.rep)
+        self.ports.append({'port': '/dev/ttyACM2', 'VID': 0x23C1, 'PID': 0xB016})
+        added, removed = self.md.update()
+        self.assertEqual(['/dev/ttyACM2'], added.keys())
+        self.assertEqual({self.rep['port']: self.rep}, removed)
+        self.assertEqual((({}, {})), self.md.update())
+
+    def test_update_skips_scan_when_ttys_unchanged(self):
+        self.md.get_tty_signature.return_value = frozenset(['ttyACM0', 'ttyACM1'])
+        self.md.update()
+        self.assertEqual(({}, {}), self.md.update())
+        self.assertEqual(1, self.list_ports_mock.call_count)
+        self.md.get_tty_signature.return_value = frozenset(['ttyACM0'])
+        self.ports.remove(self.rep)
+        self.assertEqual(({}, {self.rep['port']: self.rep}), self.md.update())
+        self.assertEqual(2, self.list_ports_mock.call_count)
+
+    def test_watching(self):
+        added = []
+        removed = []
+        seen = threading.Event()
+        gone = threading.Event()
+
+        def on_added(port, machine):
+            added.append(port)
+            if len(added) == 2:
+                seen.set()
+
+        def on_removed(port, machine):
+            removed.append(port)
+            gone.set()
+
+        self.md.start_watching(on_added, on_removed, interval=0.01)
+        try:
+            self.assertTrue(self.md.is_watching())
+            seen.wait(5)
+            self.assertEqual(sorted([self.rep2['port'], self.rep['port']]), sorted(added))
+            self.ports.remove(self.rep2)
+            gone.wait(5)
+            self.assertEqual([self.rep2['port']], removed)
+            # Watching keeps the index fresh, so unknown ports are not rescanned for
+            self.md.get_available_machines = mock.Mock(return_value={})
+            self.assertEqual((None, None), self.md.vid_pid_from_portname('/dev/ttyACM9'))
+            self.assertFalse(self.md.get_available_machines.called)
+        finally:
+            self.md.stop_watching()
+        self.assertFalse(self.md.is_watching())
+
+    def test_tty_signature(self):
+        md = makerbot_driver.MachineDetector()
+        md.tty_class_dir = '/this/does/not/exist'
+        self.assertEqual(None, md.get_tty_signature())
+
+
 class TestMachineDetectorMockedPySerial(unittest.TestCase):
 
     def setUp(self):
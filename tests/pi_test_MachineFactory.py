@@ -2,6 +2,7 @@ from __future__ import (absolute_import, print_function, unicode_literals)
 
 import os
 import sys
+import time
 import threading
 import uuid
 lib_path = os.path.abspath('./')
@@ -132,6 +133,8 @@ class TestBuildFromPortMockedMachineInquisitor(unittest.TestCase):
         self.assertEqual(expected_s3g, getattr(return_obj, 's3g'))
         self.assertEqual(expected_profile, getattr(return_obj, 'profile'))
         self.assertEqual(expected_parser, getattr(return_obj, 'gcodeparser'))
+        # The unmatched connection is not left holding the port
+        self.s3g_mock.close.assert_called_once_with()
 
     def test_build_from_port_invalid_tool_count(self):
         # result here is a replicator Dual - this is the default for valid replicator vid pid
@@ -270,6 +273,263 @@ class TestBuildFromPortMockedMachineInquisitor(unittest.TestCase):
         self.assertTrue(getattr(return_obj, 'gcodeparser') is not None)
 
 
+class TestBuildAll(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = makerbot_driver.MachineFactory()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.most_active = 0
+        self.delays = {}
+        self.release = threading.Event()
+        self.machines = {}
+        self.factory.build_from_port = mock.Mock(side_effect=self.build_from_port)
+
+    def tearDown(self):
+        self.release.set()
+
+    def build_from_port(self, portname, leaveOpen=True):
+        with self.lock:
+            self.active += 1
+            self.most_active = max(self.most_active, self.active)
+        try:
+            delay = self.delays.get(portname, 0)
+            if delay is None:
+                self.release.wait()
+            elif isinstance(delay, Exception):
+                raise delay
+            else:
+                time.sleep(delay)
+        finally:
+            with self.lock:
+                self.active -= 1
+        machine = makerbot_driver.ReturnObject()
+        machine.s3g = mock.Mock()
+        self.machines[portname] = machine
+        return machine
+
+    def test_builds_every_port(self):
+        ports = ['/dev/port%i' % i for i in range(10)]
+        results = list(self.factory.build_all(ports))
+        self.assertEqual(sorted(ports), sorted(r.port for r in results))
+        for result in results:
+            self.assertEqual(self.machines[result.port], result.machine)
+            self.assertEqual(None, result.error)
+            self.assertTrue(result.elapsed >= 0)
+
+    def test_bounded(self):
+        ports = ['/dev/port%i' % i for i in range(10)]
+        for port in ports:
+            self.delays[port] = 0.01
+        list(self.factory.build_all(ports, worker_count=3))
+        self.assertTrue(1 <= self.most_active <= 3)
+
+    def test_results_as_they_finish(self):
+        self.delays['/dev/slow'] = 0.2
+        results = list(self.factory.build_all(['/dev/slow', '/dev/fast']))
+        self.assertEqual(['/dev/fast', '/dev/slow'], [r.port for r in results])
+        self.assertTrue(results[1].elapsed >= 0.2)
+
+    def test_error(self):
+        error = IOError('no such port')
+        self.delays['/dev/missing'] = error
+        results = dict((r.port, r) for r in self.factory.build_all(['/dev/missing', '/dev/port']))
+        self.assertEqual(error, results['/dev/missing'].error)
+        self.assertEqual(None, results['/dev/missing'].machine)
+        self.assertEqual(None, results['/dev/port'].error)
+
+    def test_duplicate_port(self):
+        self.delays['/dev/port0'] = 0.05
+        ports = ['/dev/port0', '/dev/port1', '/dev/port0']
+        results = list(self.factory.build_all(ports, worker_count=3))
+        self.assertEqual(3, len(results))
+        self.assertEqual(2, self.factory.build_from_port.call_count)
+        duplicates = [r for r in results if r.error is not None]
+        self.assertEqual(1, len(duplicates))
+        self.assertEqual('/dev/port0', duplicates[0].port)
+        self.assertTrue(isinstance(duplicates[0].error, makerbot_driver.DuplicatePortError))
+        self.assertEqual(None, duplicates[0].machine)
+        built = [r for r in results if r.error is None]
+        self.assertEqual(['/dev/port0', '/dev/port1'], sorted(r.port for r in built))
+        for result in built:
+            self.assertEqual(self.machines[result.port], result.machine)
+
+    def test_timeout(self):
+        self.delays['/dev/hung'] = None
+        ports = ['/dev/hung', '/dev/port0', '/dev/port1']
+        results = list(self.factory.build_all(ports, worker_count=1, timeout=0.1))
+        self.assertEqual(3, len(results))
+        hung = [r for r in results if r.port == '/dev/hung'][0]
+        self.assertTrue(isinstance(hung.error, makerbot_driver.ProbeTimeoutError))
+        self.assertEqual(None, hung.machine)
+        self.assertTrue(hung.elapsed >= 0.1)
+        self.assertEqual(None, [r for r in results if r.port == '/dev/port1'][0].error)
+        # The hung probe finishing late has its connection closed
+        self.release.set()
+        for i in range(100):
+            if '/dev/hung' in self.machines:
+                break
+            time.sleep(0.01)
+        time.sleep(0.01)
+        self.machines['/dev/hung'].s3g.close.assert_called_once_with()
+
+    def test_stop_early(self):
+        self.delays['/dev/hung'] = None
+        self.delays['/dev/slow'] = 0.05
+        ports = ['/dev/fast', '/dev/hung', '/dev/slow']
+        for result in self.factory.build_all(ports, worker_count=3):
+            break
+        self.assertEqual('/dev/fast', result.port)
+        # Probes still running when the caller stopped have their
+        # connections closed as they finish
+        self.release.set()
+        for i in range(100):
+            if len(self.machines) == 3:
+                break
+            time.sleep(0.01)
+        time.sleep(0.01)
+        self.machines['/dev/hung'].s3g.close.assert_called_once_with()
+        self.machines['/dev/slow'].s3g.close.assert_called_once_with()
+        self.assertFalse(self.machines['/dev/fast'].s3g.close.called)
+
+    def test_stop_early_closes_unread(self):
+        ports = ['/dev/port%i' % i for i in range(4)]
+        results = self.factory.build_all(ports, worker_count=4)
+        first = next(results)
+        # Let every probe finish and queue its result before giving up
+        while len(self.machines) < 4:
+            time.sleep(0.01)
+        time.sleep(0.01)
+        results.close()
+        for port, machine in self.machines.items():
+            if port == first.port:
+                self.assertFalse(machine.s3g.close.called)
+            else:
+                machine.s3g.close.assert_called_once_with()
+
+    def test_no_ports(self):
+        self.assertEqual([], list(self.factory.build_all([])))
+
+
+class TestMachineIdentityCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = makerbot_driver.MachineIdentityCache()
+        self.inquisitor = makerbot_driver.MachineInquisitor('/dev/dummy_port', self.cache)
+        self.key = ('/dev/dummy_port', '1234', 0x23C1, 0xB015)
+        self.inquisitor.get_identity_key = mock.Mock(return_value=self.key)
+        self.s3g_mock = mock.Mock(makerbot_driver.s3g)
+        self.s3g_mock.get_version.return_value = 700
+        self.s3g_mock.get_vid_pid.return_value = 0x23C1, 0xB015
+        self.s3g_mock.get_toolhead_count.return_value = 1
+        self.s3g_mock.get_advanced_version.return_value = {'SoftwareVariant': 1}
+        self.inquisitor.create_s3g = mock.Mock(return_value=self.s3g_mock)
+        self.condition = threading.Condition()
+        self.expected_settings = {
+            'vid': 0x23C1, 'pid': 0xB015, 'tool_count': 1, 'tool_count_error': False,
+            'print_to_file_type': 'x3g', 'software_variant': '0x01'}
+
+    def test_miss_queries_and_stores(self):
+        s3g, settings = self.inquisitor.query(self.condition)
+        self.assertEqual(self.expected_settings, settings)
+        self.assertEqual((700, self.expected_settings), self.cache.get(self.key))
+
+    def test_hit_only_confirms_version(self):
+        self.inquisitor.query(self.condition)
+        self.s3g_mock.reset_mock()
+        s3g, settings = self.inquisitor.query(self.condition)
+        self.assertEqual(self.expected_settings, settings)
+        self.s3g_mock.get_version.assert_called_once_with()
+        self.assertFalse(self.s3g_mock.get_vid_pid.called)
+        self.assertFalse(self.s3g_mock.get_toolhead_count.called)
+        self.assertFalse(self.s3g_mock.get_advanced_version.called)
+        self.s3g_mock.init_eeprom_reader.assert_called_once_with(700)
+        self.s3g_mock.set_print_to_file_type.assert_called_once_with('x3g')
+
+    def test_hit_settings_are_copies(self):
+        self.inquisitor.query(self.condition)
+        s3g, settings = self.inquisitor.query(self.condition)
+        settings['tool_count'] = 2
+        self.assertEqual(1, self.inquisitor.query(self.condition)[1]['tool_count'])
+
+    def test_version_changed(self):
+        self.inquisitor.query(self.condition)
+        self.s3g_mock.reset_mock()
+        self.s3g_mock.get_version.return_value = 701
+        self.s3g_mock.get_toolhead_count.return_value = 2
+        s3g, settings = self.inquisitor.query(self.condition)
+        self.assertEqual(2, settings['tool_count'])
+        self.s3g_mock.get_version.assert_called_once_with()
+        self.assertEqual(701, self.cache.get(self.key)[0])
+
+    def test_different_machine(self):
+        self.inquisitor.query(self.condition)
+        self.s3g_mock.reset_mock()
+        self.inquisitor.get_identity_key.return_value = ('/dev/dummy_port', '5678', 0x23C1, 0xB015)
+        self.inquisitor.query(self.condition)
+        self.assertTrue(self.s3g_mock.get_toolhead_count.called)
+
+    def test_leave_open(self):
+        self.inquisitor.query(self.condition)
+        self.inquisitor.query(self.condition, False)
+        self.s3g_mock.close.assert_called_once_with()
+
+    def test_identity_key(self):
+        inquisitor = makerbot_driver.MachineInquisitor('/dev/ttyACM0')
+        detector = makerbot_driver.get_gMachineDetector()
+        with mock.patch.object(detector, 'machines_just_seen', {
+                '/dev/ttyACM0': {'port': '/dev/ttyACM0', 'iSerial': '1234', 'VID': 1, 'PID': 2}}):
+            self.assertEqual(('/dev/ttyACM0', '1234', 1, 2), inquisitor.get_identity_key())
+        with mock.patch.object(detector, 'machines_just_seen', {}):
+            self.assertEqual(None, inquisitor.get_identity_key())
+        with mock.patch.object(detector, 'machines_just_seen', {
+                '/dev/ttyACM0': {'port': '/dev/ttyACM0', 'iSerial': None, 'VID': 1, 'PID': 2}}):
+            self.assertEqual(None, inquisitor.get_identity_key())
+
+    def test_cold_detector(self):
+        inquisitor = makerbot_driver.MachineInquisitor('/dev/dummy_port', self.cache)
+        inquisitor.create_s3g = mock.Mock(return_value=self.s3g_mock)
+        detector = makerbot_driver.get_gMachineDetector()
+        seen = {}
+
+        def scan():
+            # As reading the vid and pid from the port scans for machines
+            seen['/dev/dummy_port'] = {
+                'port': '/dev/dummy_port', 'iSerial': '1234', 'VID': 0x23C1, 'PID': 0xB015}
+            return 0x23C1, 0xB015
+        self.s3g_mock.get_vid_pid.side_effect = scan
+        with mock.patch.object(detector, 'machines_just_seen', seen):
+            inquisitor.query(self.condition)
+            self.assertEqual((700, self.expected_settings), self.cache.get(self.key))
+            self.s3g_mock.reset_mock()
+            s3g, settings = inquisitor.query(self.condition)
+        self.assertEqual(self.expected_settings, settings)
+        self.s3g_mock.get_version.assert_called_once_with()
+        self.assertFalse(self.s3g_mock.get_vid_pid.called)
+        self.assertFalse(self.s3g_mock.get_toolhead_count.called)
+
+    def test_port_only_not_cached(self):
+        self.inquisitor.get_identity_key.return_value = None
+        self.inquisitor.query(self.condition)
+        self.s3g_mock.reset_mock()
+        # A different machine plugged into the same port is queried in full
+        self.s3g_mock.get_toolhead_count.return_value = 2
+        s3g, settings = self.inquisitor.query(self.condition)
+        self.assertEqual(2, settings['tool_count'])
+        self.assertTrue(self.s3g_mock.get_advanced_version.called)
+
+    def test_factory_shares_cache(self):
+        factory = makerbot_driver.MachineFactory()
+        self.assertTrue(factory.create_inquisitor('/dev/a')._identity_cache is factory.identity_cache)
+        cache = makerbot_driver.MachineIdentityCache()
+        self.assertTrue(makerbot_driver.MachineFactory(identity_cache=cache).identity_cache is cache)
+
+    def test_clear(self):
+        self.cache.put(self.key, 700, {})
+        self.cache.clear()
+        self.assertEqual(None, self.cache.get(self.key))
+
+
 class TestMachineInquisitor(unittest.TestCase):
     def setUp(self):
         self.inquisitor = makerbot_driver.MachineInquisitor('/dev/dummy_port')
@@ -0,0 +1,49 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import unittest
+import threading
+
+import makerbot_driver
+
+
+class MemoryWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.w = makerbot_driver.Writer.MemoryWriter(threading.Condition())
+
+    def tearDown(self):
+        self.w = None
+
+    def test_send_query_payload_not_implemented(self):
+        self.assertRaises(NotImplementedError, self.w.send_query_payload, [42])
+
+    def test_send_action_payload(self):
+        self.w.send_action_payload('abc')
+        self.w.send_action_payload(bytearray('de'))
+        self.assertEqual('abcde', self.w.getvalue())
+        self.assertEqual('abcde', self.w.getbuffer().tobytes())
+        self.assertEqual(sum(bytearray('abcde')), self.w.checksum)
+        self.assertEqual(str(sum(bytearray('abcde'))), self.w.get_checksum_trailer())
+
+    def test_default_condition(self):
+        w = makerbot_driver.Writer.MemoryWriter()
+        w.set_external_stop()
+        self.assertTrue(w.external_stop)
+
+    def test_external_stop(self):
+        self.w.set_external_stop()
+        self.assertRaises(makerbot_driver.ExternalStopError,
+                          self.w.send_action_payload, 'abc')
+
+    def test_open_close(self):
+        self.assertTrue(self.w.is_open())
+        self.w.close()
+        self.assertFalse(self.w.is_open())
+        self.assertRaises(ValueError, self.w.send_action_payload, 'abc')
+        self.w.open()
+        self.assertTrue(self.w.is_open())
+
+if __name__ == "__main__":
+    unittest.main()
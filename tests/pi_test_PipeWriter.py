@@ -0,0 +1,82 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import unittest
+import io
+import threading
+
+import makerbot_driver
+
+
+class PipeWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.read_fd, self.write_fd = os.pipe()
+        self.w = makerbot_driver.Writer.PipeWriter(
+            self.write_fd, threading.Condition(), buffer_size=8)
+
+    def tearDown(self):
+        self.w.close()
+        os.close(self.read_fd)
+        self.w = None
+
+    def test_send_query_payload_not_implemented(self):
+        self.assertRaises(NotImplementedError, self.w.send_query_payload, [42])
+
+    def test_writes_in_chunks(self):
+        self.w.send_action_payload('abcd')
+        self.w.send_action_payload('efgh')
+        self.assertEqual('abcdefgh', os.read(self.read_fd, 100))
+        self.w.send_action_payload('ij')
+        self.w.flush()
+        self.assertEqual('ij', os.read(self.read_fd, 100))
+        self.assertEqual(0, self.w.checksum)
+
+    def test_close_appends_checksum(self):
+        f = io.BytesIO()
+        w = makerbot_driver.Writer.PipeWriter(f, closefd=False, buffer_size=4, append_checksum=True)
+        w.send_action_payload('abc')
+        w.send_action_payload('de')
+        self.assertEqual(sum(bytearray('abcde')), w.checksum)
+        w.close()
+        # The same trailer FileWriter writes
+        expected = makerbot_driver.Encoder.encode_file_checksum(sum(bytearray('abcde')))
+        self.assertEqual('abcde' + expected, f.getvalue())
+
+    def test_close_flushes_and_closes(self):
+        self.w.send_action_payload('abc')
+        self.w.close()
+        self.assertFalse(self.w.is_open())
+        self.assertEqual('abc', os.read(self.read_fd, 100))
+        # The write end is closed
+        self.assertEqual('', os.read(self.read_fd, 100))
+        self.assertRaises(ValueError, self.w.send_action_payload, 'abc')
+
+    def test_large_payload_stream(self):
+        data = ''.join(chr(i % 256) for i in range(200000))
+        received = []
+        reader = threading.Thread(target=lambda: received.append(os.fdopen(self.read_fd, 'rb').read()))
+        reader.start()
+        for i in range(0, len(data), 100):
+            self.w.send_action_payload(data[i:i + 100])
+        self.w.close()
+        reader.join()
+        self.assertEqual(data, received[0])
+        self.read_fd = os.open(os.devnull, os.O_RDONLY)
+
+    def test_file_object(self):
+        f = io.BytesIO()
+        w = makerbot_driver.Writer.PipeWriter(f, closefd=False)
+        w.send_action_payload('abc')
+        w.close()
+        self.assertEqual('abc', f.getvalue())
+        self.assertFalse(f.closed)
+
+    def test_external_stop(self):
+        self.w.set_external_stop()
+        self.assertRaises(makerbot_driver.ExternalStopError,
+                          self.w.send_action_payload, 'abc')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,6 +4,8 @@ lib_path = os.path.abspath('./')
 sys.path.insert(0, lib_path)
 
 import unittest
+import mock
+import makerbot_driver
 import makerbot_driver.GcodeProcessors.Processor as Processor
 
 
@@ -18,5 +20,51 @@ class TestProcessor(unittest.TestCase):
             result = Processor.remove_variables(case[0])
             self.assertEqual(case[1], result)
 
+    def test_external_stop(self):
+        p = Processor()
+        p.test_for_external_stop()
+        p.set_external_stop()
+        self.assertRaises(makerbot_driver.ExternalStopError, p.test_for_external_stop)
+        self.assertRaises(makerbot_driver.ExternalStopError, p.test_for_external_stop, prelocked=True)
+        p.set_external_stop(False)
+        p.test_for_external_stop()
+
+
+class TestProgressReporter(unittest.TestCase):
+
+    def setUp(self):
+        self.callback = mock.Mock()
+        self.reporter = makerbot_driver.GcodeProcessors.ProgressReporter(self.callback, None)
+
+    def tearDown(self):
+        self.reporter = None
+
+    def get_percents(self):
+        return [c[0][0] for c in self.callback.call_args_list]
+
+    def test_only_reports_changes(self):
+        for percent in [0, 0.5, 1, 1.9, 2, 2, 50.1, 50.9]:
+            self.reporter.update(percent)
+        self.assertEqual([0, 1, 2, 50], self.get_percents())
+
+    def test_reports_unchanged_after_interval(self):
+        self.reporter.interval = 10
+        with mock.patch('time.time') as fake_time:
+            for now in [100, 105, 111, 112]:
+                fake_time.return_value = now
+                self.reporter.update(3)
+        self.assertEqual([3, 3], self.get_percents())
+
+    def test_update_if_changed(self):
+        self.reporter.interval = 0
+        for percent in [0, 0.5, 1, 1.9, 2, 2]:
+            self.reporter.update_if_changed(percent)
+        self.assertEqual([0, 1, 2], self.get_percents())
+
+    def test_no_callback(self):
+        reporter = makerbot_driver.GcodeProcessors.ProgressReporter(None)
+        reporter.update(5)
+        reporter.update_if_changed(6)
+
 if __name__ == "__main__":
     unittest.main()
@@ -19,6 +19,10 @@ class TestProcessorFactory(unittest.TestCase):
         pros = makerbot_driver.GcodeProcessors.all
         self.assertEqual(pros, self.f.list_processors())
 
+    def test_fused_processor_not_listed(self):
+        # FusedProcessors are made by fuse_processors, never by name
+        self.assertFalse('FusedProcessor' in self.f.list_processors())
+
     def test_create_processor_from_name_not_a_processor(self):
         pro = 'THIS ISNT A VALID PREPROCESSOR NAME'
         self.assertRaises(makerbot_driver.GcodeProcessors.ProcessorNotFoundError, self.f.create_processor_from_name, pro)
@@ -65,5 +69,56 @@ class TestProcessorFactory(unittest.TestCase):
         for expect, got in zip(expected_pros, got_pros):
             self.assertEqual(expect.__class__, got.__class__)
 
+    def test_get_processors_fuses_bundleable(self):
+        desired_pros = 'RpmProcessor, AbpProcessor, RemoveRepGStartEndGcode, AnchorProcessor, ToolchangeProcessor, SlicerProcessor'
+        got_pros = list(self.f.get_processors(desired_pros))
+        self.assertEqual(4, len(got_pros))
+        self.assertEqual(makerbot_driver.GcodeProcessors.FusedProcessor, got_pros[0].__class__)
+        self.assertEqual(
+            [makerbot_driver.GcodeProcessors.RpmProcessor, makerbot_driver.GcodeProcessors.AbpProcessor],
+            [p.__class__ for p in got_pros[0].processors])
+        self.assertEqual(makerbot_driver.GcodeProcessors.RemoveRepGStartEndGcode, got_pros[1].__class__)
+        self.assertEqual(
+            [makerbot_driver.GcodeProcessors.AnchorProcessor, makerbot_driver.GcodeProcessors.ToolchangeProcessor],
+            [p.__class__ for p in got_pros[2].processors])
+        self.assertEqual(makerbot_driver.GcodeProcessors.SlicerProcessor, got_pros[3].__class__)
+
+    def test_get_processors_no_fuse(self):
+        desired_pros = 'RpmProcessor, AbpProcessor'
+        got_pros = list(self.f.get_processors(desired_pros, fuse=False))
+        self.assertEqual(
+            [makerbot_driver.GcodeProcessors.RpmProcessor, makerbot_driver.GcodeProcessors.AbpProcessor],
+            [p.__class__ for p in got_pros])
+
+    def test_get_processors_fused_keeps_profile(self):
+        profile = makerbot_driver.Profile('ReplicatorDual')
+        got_pros = list(self.f.get_processors('RpmProcessor, AnchorProcessor', profile))
+        self.assertEqual(1, len(got_pros))
+        self.assertEqual(profile, got_pros[0].profile)
+        for p in got_pros[0].processors:
+            self.assertEqual(profile, p.profile)
+
+    def test_get_processors_split_stateless(self):
+        desired_pros = 'AbpProcessor, RemoveProgressProcessor, RpmProcessor, AnchorProcessor, ToolchangeProcessor'
+        self.assertEqual(1, len(list(self.f.get_processors(desired_pros))))
+        got_pros = list(self.f.get_processors(desired_pros, split_stateless=True))
+        self.assertEqual(2, len(got_pros))
+        self.assertTrue(got_pros[0].is_stateless)
+        self.assertEqual(
+            [makerbot_driver.GcodeProcessors.AbpProcessor,
+             makerbot_driver.GcodeProcessors.RemoveProgressProcessor,
+             makerbot_driver.GcodeProcessors.RpmProcessor],
+            [p.__class__ for p in got_pros[0].processors])
+        self.assertFalse(got_pros[1].is_stateless)
+        self.assertEqual(
+            [makerbot_driver.GcodeProcessors.AnchorProcessor, makerbot_driver.GcodeProcessors.ToolchangeProcessor],
+            [p.__class__ for p in got_pros[1].processors])
+
+    def test_get_processors_split_stateless_single(self):
+        got_pros = list(self.f.get_processors('AnchorProcessor, RpmProcessor', split_stateless=True))
+        self.assertEqual(
+            [makerbot_driver.GcodeProcessors.AnchorProcessor, makerbot_driver.GcodeProcessors.RpmProcessor],
+            [p.__class__ for p in got_pros])
+
 if __name__ == '__main__':
     unittest.main()
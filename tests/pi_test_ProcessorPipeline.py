@@ -0,0 +1,233 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import unittest
+import threading
+import mock
+
+import makerbot_driver
+
+
+class TestProcessorPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.gcodes = []
+        for i in range(50):
+            self.gcodes.extend([
+                'M101\n',
+                'G1 X%i Y%i Z1 A1\n' % (i, i),
+                'G90\n',
+                'G1 X%i Y%i Z1 B1\n' % (i, i),
+                'M73 P%i\n' % (i),
+            ])
+
+    def tearDown(self):
+        self.gcodes = None
+
+    def get_names(self):
+        return [
+            'RpmProcessor',
+            'AnchorProcessor',
+            'CoordinateRemovalProcessor',
+            'ToolchangeProcessor',
+            'RemoveProgressProcessor',
+        ]
+
+    def get_reusable_names(self):
+        """ Processors that give the same output on every run """
+        return [
+            'RpmProcessor',
+            'CoordinateRemovalProcessor',
+            'SingletonTProcessor',
+            'RemoveProgressProcessor',
+        ]
+
+    def process_sequentially(self, names, gcodes):
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        for processor in factory.get_processors(names):
+            gcodes = processor.process_gcode(gcodes)
+        return gcodes
+
+    def test_get_stage_kind(self):
+        p = makerbot_driver.GcodeProcessors.ProcessorPipeline([])
+        pool = mock.Mock()
+        cases = [
+            [makerbot_driver.GcodeProcessors.RpmProcessor(), pool, 'process'],
+            [makerbot_driver.GcodeProcessors.RpmProcessor(), None, 'stream'],
+            [makerbot_driver.GcodeProcessors.AnchorProcessor(), pool, 'stream'],
+            [makerbot_driver.GcodeProcessors.DualstrusionProgressProcessor(), pool, 'stream'],
+            [makerbot_driver.GcodeProcessors.FanProcessor(), pool, 'stream'],
+            [makerbot_driver.GcodeProcessors.RemoveRepGStartEndGcode(), pool, 'barrier'],
+            [makerbot_driver.GcodeProcessors.SlicerProcessor(), pool, 'barrier'],
+        ]
+        for processor, the_pool, expected in cases:
+            self.assertEqual(expected, p.get_stage_kind(processor, the_pool))
+
+    def test_not_rebuildable_kept_out_of_workers(self):
+        processor = makerbot_driver.GcodeProcessors.RpmProcessor()
+        processor.is_rebuildable = False
+        p = makerbot_driver.GcodeProcessors.ProcessorPipeline([processor], worker_count=2)
+        self.assertEqual('stream', p.get_stage_kind(processor, mock.Mock()))
+        self.assertEqual(None, p.get_pool())
+
+    def test_split_batches(self):
+        p = makerbot_driver.GcodeProcessors.ProcessorPipeline([], batch_size=2)
+        self.assertEqual([['a', 'b'], ['c', 'd'], ['e']], list(p.split_batches('abcde')))
+        self.assertEqual([], list(p.split_batches([])))
+
+    def test_process_gcode_no_processors(self):
+        p = makerbot_driver.GcodeProcessors.ProcessorPipeline([], batch_size=7)
+        self.assertEqual(self.gcodes, p.process_gcode(self.gcodes))
+
+    def test_process_gcode_threads_only(self):
+        expected = self.process_sequentially(self.get_names(), self.gcodes)
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        p = factory.get_pipeline(self.get_names(), batch_size=7, queue_size=2, worker_count=0)
+        self.assertEqual(expected, p.process_gcode(self.gcodes))
+
+    def test_process_gcode_worker_processes(self):
+        expected = self.process_sequentially(self.get_names(), self.gcodes)
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        for fuse in [True, False]:
+            p = factory.get_pipeline(self.get_names(), fuse=fuse, batch_size=7, queue_size=2, worker_count=2)
+            try:
+                self.assertEqual(expected, p.process_gcode(self.gcodes))
+            finally:
+                p.close()
+
+    def test_pool_kept_between_runs(self):
+        expected = self.process_sequentially(self.get_reusable_names(), self.gcodes)
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        p = factory.get_pipeline(self.get_reusable_names(), fuse=False, batch_size=7, worker_count=2)
+        try:
+            self.assertEqual(expected, p.process_gcode(self.gcodes))
+            pool = p._pool
+            self.assertNotEqual(None, pool)
+            self.assertEqual(expected, p.process_gcode(self.gcodes))
+            self.assertTrue(pool is p._pool)
+        finally:
+            p.close()
+        self.assertEqual(None, p._pool)
+
+    def test_fused_stateless_run_uses_workers(self):
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        p = factory.get_pipeline(['RpmProcessor', 'RemoveProgressProcessor'], worker_count=2)
+        self.assertEqual(1, len(p.processors))
+        self.assertEqual('process', p.get_stage_kind(p.processors[0], mock.Mock()))
+        gcodes = ['M101\n', 'M73 P50\n', 'G1 X0 Y0\n']
+        try:
+            self.assertEqual(['G1 X0 Y0\n'], p.process_gcode(gcodes))
+        finally:
+            p.close()
+
+    def test_stateless_run_not_fused_with_stateful(self):
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        names = ['AbpProcessor', 'RemoveProgressProcessor', 'RpmProcessor', 'AnchorProcessor']
+        p = factory.get_pipeline(names, worker_count=2)
+        pool = mock.Mock()
+        self.assertEqual(
+            ['process', 'stream'],
+            [p.get_stage_kind(processor, pool) for processor in p.processors])
+        expected = self.process_sequentially(names, self.gcodes)
+        try:
+            self.assertEqual(expected, p.process_gcode(self.gcodes))
+        finally:
+            p.close()
+
+    def test_process_gcode_with_barrier(self):
+        names = ['RpmProcessor', 'RemoveRepGStartEndGcode', 'ToolchangeProcessor']
+        gcodes = ['(<layer>)\n', 'M101\n', 'G1 X0 Y0 A1\n', '(</layer>)\n'] * 5
+        expected = self.process_sequentially(names, gcodes)
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        p = factory.get_pipeline(names, batch_size=3, worker_count=0)
+        self.assertEqual(expected, p.process_gcode(gcodes))
+
+    def test_process_gcode_flushes_streams(self):
+        names = ['RpmProcessor', 'FanProcessor', 'ToolchangeProcessor']
+        gcodes = ['(<layer>)\n', 'M101\n', 'G1 X0 Y0 A1\n', '(</layer>)\n'] * 5
+        expected = self.process_sequentially(names, gcodes)
+        self.assertTrue('M127 T0 (Fan Off)\n' in expected)
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        for fuse in [True, False]:
+            p = factory.get_pipeline(names, fuse=fuse, batch_size=3, worker_count=0)
+            self.assertEqual(expected, p.process_gcode(gcodes))
+
+    def test_process_gcode_callback(self):
+        callback = mock.Mock()
+        p = makerbot_driver.GcodeProcessors.ProcessorPipeline(
+            [makerbot_driver.GcodeProcessors.RpmProcessor()], batch_size=10, worker_count=0)
+        p.process_gcode(self.gcodes, callback)
+        percents = [c[0][0] for c in callback.call_args_list]
+        self.assertEqual(sorted(percents), percents)
+        self.assertEqual(100, percents[-1])
+
+    def test_process_gcode_callback_follows_output(self):
+        callback = mock.Mock()
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        p = factory.get_pipeline(['RpmProcessor', 'AnchorProcessor'], fuse=False, batch_size=10, worker_count=0)
+        p.process_gcode(self.gcodes, callback)
+        percents = [c[0][0] for c in callback.call_args_list]
+        # Reported for the first batch out, however far ahead the input is
+        self.assertEqual(4, percents[0])
+        self.assertEqual(range(4, 101, 4), percents)
+
+    def test_process_gcode_callback_with_barrier(self):
+        callback = mock.Mock()
+        names = ['RpmProcessor', 'RemoveRepGStartEndGcode', 'AnchorProcessor']
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        p = factory.get_pipeline(names, batch_size=10, worker_count=0)
+        self.assertEqual(self.process_sequentially(names, self.gcodes), p.process_gcode(self.gcodes, callback))
+        percents = [c[0][0] for c in callback.call_args_list]
+        self.assertEqual(sorted(percents), percents)
+        self.assertTrue(len(percents) > 2, percents)
+        self.assertTrue(percents[0] < 100, percents)
+        self.assertEqual(100, percents[-1])
+
+    def test_process_gcode_callback_error(self):
+        class Failure(Exception):
+            pass
+        expected = self.process_sequentially(self.get_reusable_names(), self.gcodes)
+        factory = makerbot_driver.GcodeProcessors.ProcessorFactory()
+        p = factory.get_pipeline(self.get_reusable_names(), fuse=False, batch_size=2, queue_size=1, worker_count=2)
+        try:
+            self.assertEqual(expected, p.process_gcode(self.gcodes))
+            thread_count = threading.active_count()
+            callback = mock.Mock(side_effect=Failure)
+            self.assertRaises(Failure, p.process_gcode, self.gcodes, callback)
+            # Every stage has been wound down, and the pool still works
+            self.assertEqual(thread_count, threading.active_count())
+            self.assertEqual(expected, p.process_gcode(self.gcodes))
+        finally:
+            p.close()
+
+    def test_process_gcode_stage_error(self):
+        class Failure(Exception):
+            pass
+        broken = makerbot_driver.GcodeProcessors.RemoveRepGStartEndGcode()
+        broken.process_gcode = mock.Mock(side_effect=Failure)
+        p = makerbot_driver.GcodeProcessors.ProcessorPipeline(
+            [makerbot_driver.GcodeProcessors.RpmProcessor(), broken,
+             makerbot_driver.GcodeProcessors.AnchorProcessor()],
+            batch_size=2, queue_size=1, worker_count=0)
+        self.assertRaises(Failure, p.process_gcode, self.gcodes)
+        # One bad run does not stop the pipeline for good
+        self.assertFalse(p._external_stop)
+        for processor in p.processors:
+            self.assertFalse(processor._external_stop)
+        broken.process_gcode = mock.Mock(side_effect=lambda gcodes: gcodes)
+        self.assertEqual(
+            self.process_sequentially(['RpmProcessor', 'AnchorProcessor'], self.gcodes),
+            p.process_gcode(self.gcodes))
+
+    def test_process_gcode_external_stop(self):
+        p = makerbot_driver.GcodeProcessors.ProcessorPipeline(
+            [makerbot_driver.GcodeProcessors.AnchorProcessor()], worker_count=0)
+        p.set_external_stop()
+        self.assertTrue(p.processors[0]._external_stop)
+        self.assertRaises(makerbot_driver.ExternalStopError, p.process_gcode, self.gcodes)
+
+
+if __name__ == '__main__':
+    unittest.main()
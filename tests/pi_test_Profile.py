@@ -4,8 +4,12 @@ lib_path = os.path.abspath('./')
 sys.path.insert(0, lib_path)
 
 import unittest
+import mock
 
+import copy
 import json
+import time
+import pickle
 import shutil
 import tempfile
 
@@ -117,5 +121,131 @@ class ProfileInitTests(unittest.TestCase):
             self.assertEqual(
                 sorted(case[1]), sorted(makerbot_driver.search_profiles_with_regex(case[0])))
 
+
+class ProfileCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.profiledir = tempfile.mkdtemp()
+        self.path = os.path.join(self.profiledir, 'Test.json')
+        self.write_profile({'key': 'value', 'nested': {'list': [1, 2]}})
+        self.cache = makerbot_driver.ProfileCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.profiledir)
+
+    def write_profile(self, values):
+        with open(self.path, 'w') as fp:
+            json.dump(values, fp)
+
+    def test_values_are_private(self):
+        values = self.cache.get_values(self.path)
+        values['nested']['list'].append(3)
+        self.assertEqual([1, 2], self.cache.get_values(self.path)['nested']['list'])
+        self.assertEqual([1, 2], self.cache.get_values(self.path)['nested']['list'])
+
+    def test_values_cached(self):
+        self.cache.get_values(self.path)
+        with mock.patch('json.load') as json_load:
+            self.assertEqual('value', self.cache.get_values(self.path)['key'])
+            self.assertFalse(json_load.called)
+
+    def test_changed_file_reread(self):
+        self.cache.get_values(self.path)
+        self.write_profile({'key': 'another value'})
+        self.assertEqual('another value', self.cache.get_values(self.path)['key'])
+
+    def test_missing_file(self):
+        self.assertRaises(IOError, self.cache.get_values,
+                          os.path.join(self.profiledir, 'Missing.json'))
+        self.assertRaises(IOError, self.cache.get_values, self.profiledir)
+
+    def test_shared_profile(self):
+        profile = self.cache.get_shared_profile('Test', self.profiledir)
+        self.assertTrue(profile is self.cache.get_shared_profile('Test', self.profiledir))
+        self.write_profile({'key': 'another value'})
+        self.assertEqual('another value',
+                         self.cache.get_shared_profile('Test', self.profiledir).values['key'])
+
+    def test_shared_profile_read_only(self):
+        self.write_profile({'key': 'value', 'nested': {'list': [1, 2]}})
+        profile = self.cache.get_shared_profile('Test', self.profiledir)
+        self.assertRaises(TypeError, profile.values.__setitem__, 'key', 'changed')
+        self.assertRaises(TypeError, profile.values['nested'].update, {'list': []})
+        self.assertRaises(TypeError, profile.values['nested']['list'].append, 3)
+        self.assertRaises(TypeError, profile.values['nested']['list'].__setitem__, 0, 3)
+        values = self.cache.get_shared_profile('Test', self.profiledir).values
+        self.assertEqual({'key': 'value', 'nested': {'list': [1, 2]}}, values)
+        # A profile of its own can still be changed
+        own = makerbot_driver.Profile('Test', self.profiledir)
+        own.values['nested']['list'].append(3)
+        self.assertEqual([1, 2], values['nested']['list'])
+
+    def test_shared_profile_copies_are_mutable(self):
+        self.write_profile({'key': 'value', 'nested': {'list': [1, {'a': 2}]}})
+        values = self.cache.get_shared_profile('Test', self.profiledir).values
+        copies = [copy.deepcopy(values)]
+        copies.extend(pickle.loads(pickle.dumps(values, protocol)) for protocol in range(pickle.HIGHEST_PROTOCOL + 1))
+        for copied in copies:
+            self.assertEqual(values, copied)
+            self.assertEqual(dict, type(copied))
+            self.assertEqual(dict, type(copied['nested']))
+            self.assertEqual(list, type(copied['nested']['list']))
+            copied['key'] = 'changed'
+            copied['nested']['list'].append(3)
+            copied['nested']['list'][1]['a'] = 3
+        self.assertEqual({'key': 'value', 'nested': {'list': [1, {'a': 2}]}}, values)
+
+    def test_shared_profile_shallow_copies_are_mutable(self):
+        self.write_profile({'key': 'value', 'list': [1, 2]})
+        values = self.cache.get_shared_profile('Test', self.profiledir).values
+        copied = copy.copy(values)
+        copied['key'] = 'changed'
+        self.assertEqual(dict, type(copied))
+        copied_list = copy.copy(values['list'])
+        copied_list.append(3)
+        self.assertEqual(list, type(copied_list))
+        self.assertEqual({'key': 'value', 'list': [1, 2]}, values)
+
+    def test_search_uses_index(self):
+        self.assertEqual(['Test.json'], self.cache.search_profiles_with_regex('.*Test.*', self.profiledir))
+        with mock.patch('os.listdir') as listdir:
+            self.assertEqual(['Test.json'], self.cache.search_profiles_with_regex('.*Test.*', self.profiledir))
+            self.assertEqual(['Test'], self.cache.list_profiles(self.profiledir))
+            self.assertFalse(listdir.called)
+
+    def test_builtin_index_checked_once_per_ttl(self):
+        profiledir = makerbot_driver.profile._getprofiledir(None)
+        self.cache.search_profiles_with_regex('.*Replicator.*')
+        with mock.patch('os.stat', wraps=os.stat) as stat:
+            self.cache.list_profiles()
+            self.assertFalse(stat.called)
+            with mock.patch('time.time', return_value=time.time() + self.cache.index_ttl):
+                self.cache.list_profiles()
+            stat.assert_called_once_with(profiledir)
+
+    def test_other_index_checked_every_lookup(self):
+        self.cache.list_profiles(self.profiledir)
+        with mock.patch('os.stat', wraps=os.stat) as stat:
+            self.cache.list_profiles(self.profiledir)
+            stat.assert_called_once_with(self.profiledir)
+
+    def test_index_sees_new_profiles(self):
+        self.assertEqual([], self.cache.search_profiles_with_regex('Other', self.profiledir))
+        with open(os.path.join(self.profiledir, 'Other.json'), 'w') as fp:
+            json.dump({}, fp)
+        # Directory mtimes can be coarse
+        os.utime(self.profiledir, (0, 0))
+        self.assertEqual(['Other'], self.cache.search_profiles_with_regex('Other', self.profiledir))
+
+    def test_search_none(self):
+        self.assertEqual([], self.cache.search_profiles_with_regex(None, self.profiledir))
+
+    def test_clear(self):
+        self.cache.search_profiles_with_regex('.*', self.profiledir)
+        self.cache.clear()
+        with mock.patch('os.listdir', return_value=[]) as listdir:
+            self.assertEqual([], self.cache.list_profiles(self.profiledir))
+            self.assertTrue(listdir.called)
+
 if __name__ == '__main__':
     unittest.main()
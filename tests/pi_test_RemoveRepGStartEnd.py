@@ -5,6 +5,7 @@ sys.path.insert(0, lib_path)
 
 import unittest
 import tempfile
+import mock
 
 import makerbot_driver
 
@@ -23,6 +24,12 @@ class RemoveRepGStartEnd(unittest.TestCase):
         got_output = self.p.process_gcode(the_input)
         self.assertEqual(expected_output, got_output)
 
+    def test_process_gcode_callback_every_percent(self):
+        callback = mock.Mock()
+        self.p.process_gcode(['G1 X0 Y0\n'] * 50, callback)
+        percents = [c[0][0] for c in callback.call_args_list]
+        self.assertEqual(range(2, 101, 2), percents)
+
     def test_process_gcode_with_only_start(self):
         the_input = [
             "(**** start.gcode\n",
@@ -135,6 +135,55 @@ class S3gTestsFirmwareX3g(unittest.TestCase):
             payload[30:32], Encoder.encode_int16(int(float(feedrate * 64.0))))
 
 
+class TestPlayS3gFile(unittest.TestCase):
+    def setUp(self):
+        self.recorder = s3g()
+        self.recorder.writer = Writer.MemoryWriter()
+        self.recorder.queue_extended_point_new([1, 2, 3, 4, 5], 42, [])
+        self.recorder.display_message(0, 0, 'hello', 10, False, False, False)
+        self.recorder.set_toolhead_temperature(0, 220)
+        self.recorder.set_build_percent(50)
+        self.s3g_file = io.BytesIO(self.recorder.writer.getvalue())
+        self.r = s3g()
+
+    def tearDown(self):
+        self.r = None
+        self.recorder = None
+
+    def test_play_s3g_file_stream(self):
+        outputstream = io.BytesIO()
+        inputstream = io.BytesIO()
+        response_payload = bytearray([constants.response_code_dict['SUCCESS']])
+        for i in range(4):
+            outputstream.write(Encoder.encode_payload(response_payload))
+        outputstream.seek(0)
+        self.r.writer = Writer.StreamWriter(
+            io.BufferedRWPair(outputstream, inputstream), threading.Condition())
+        callback = mock.Mock()
+        self.assertEqual(4, self.r.play_s3g_file(self.s3g_file, callback))
+        expected = s3g()
+        expected.writer = Writer.MemoryWriter()
+        expected.writer.send_action_payload = lambda payload: expected.writer.buffer.extend(Encoder.encode_payload(payload))
+        expected.queue_extended_point_new([1, 2, 3, 4, 5], 42, [])
+        expected.display_message(0, 0, 'hello', 10, False, False, False)
+        expected.set_toolhead_temperature(0, 220)
+        expected.set_build_percent(50)
+        self.assertEqual(expected.writer.getvalue(), inputstream.getvalue())
+        callback.assert_called_with(100)
+
+    def test_play_s3g_file_buffer_overflow(self):
+        self.r.writer = mock.Mock()
+        self.r.writer.send_action_payload.side_effect = [
+            None, errors.BufferOverflowError(), errors.BufferOverflowError(), None, None, None]
+        self.assertEqual(4, self.r.play_s3g_file(self.s3g_file, overflow_wait=0))
+        payloads = [c[0][0] for c in self.r.writer.send_action_payload.call_args_list]
+        self.assertEqual(6, len(payloads))
+        self.assertEqual(payloads[1], payloads[2])
+        self.assertEqual(payloads[1], payloads[3])
+        self.assertEqual(self.recorder.writer.getvalue(),
+                         ''.join(payloads[:1] + payloads[3:]))
+
+
 class S3gTestsFirmwareClassic(unittest.TestCase):
     """
     Emulate a machine
@@ -0,0 +1,142 @@
+import os
+import sys
+lib_path = os.path.abspath('./')
+sys.path.insert(0, lib_path)
+
+import unittest
+import tempfile
+import threading
+
+import makerbot_driver
+
+
+class TestAdvanceState(unittest.TestCase):
+
+    def test_absolute_move(self):
+        payload = [139, 1, 2, 3, 40, 50, 1000]
+        self.assertEqual((3, 40, 50, 90),
+                         makerbot_driver.FileReader.advance_state(payload, (0, 0, 10, 10)))
+
+    def test_relative_move(self):
+        relative = makerbot_driver.Encoder.encode_axes(['z', 'a'])
+        payload = [142, 1, 2, 3, 40, 50, 1000, relative]
+        self.assertEqual((13, 50, 50, 40),
+                         makerbot_driver.FileReader.advance_state(payload, (10, 10, 50, 0)))
+
+    def test_set_position_keeps_extrusion(self):
+        payload = [140, 1, 2, 3, 4, 5]
+        self.assertEqual((3, 4, 5, 100),
+                         makerbot_driver.FileReader.advance_state(payload, (0, 0, 0, 100)))
+
+    def test_other_command(self):
+        self.assertEqual((1, 2, 3, 4),
+                         makerbot_driver.FileReader.advance_state([150, 0, 0], (1, 2, 3, 4)))
+
+
+class TestS3gIndex(unittest.TestCase):
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile(suffix='.s3g', delete=False) as f:
+            self.path = f.name
+        r = makerbot_driver.s3g()
+        r.writer = makerbot_driver.Writer.FileWriter(open(self.path, 'wb'), threading.Condition())
+        # 10 layers of 10 moves, each move extruding 5 steps
+        self.payload_count = 0
+        a = 0
+        for layer in range(10):
+            for move in range(10):
+                a += 5
+                r.queue_extended_point_new([move, move, layer * 100, a, 0], 10, [])
+                self.payload_count += 1
+            r.set_build_percent(layer * 10)
+            self.payload_count += 1
+        r.writer.file.close()
+        self.index_path = makerbot_driver.FileReader.get_index_path(self.path)
+        self.reader = makerbot_driver.FileReader.FileReader()
+        self.reader.file = open(self.path, 'rb')
+
+    def tearDown(self):
+        self.reader.file.close()
+        for path in [self.path, self.index_path]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_build(self):
+        index = makerbot_driver.FileReader.S3gIndex.build(self.path, 4)
+        self.assertEqual(self.payload_count, index.command_count)
+        self.assertEqual(range(0, self.payload_count, 4), [e.number for e in index.entries])
+        self.assertEqual(0, index.entries[0].offset)
+        self.assertEqual(os.path.getsize(self.path), index.source_size)
+
+    def test_save_load(self):
+        index = makerbot_driver.FileReader.S3gIndex.build(self.path, 3)
+        index.save(self.index_path)
+        loaded = makerbot_driver.FileReader.S3gIndex.load(self.index_path, self.path)
+        self.assertEqual(index.entries, loaded.entries)
+        self.assertEqual(index.command_count, loaded.command_count)
+        self.assertEqual(3, loaded.interval)
+
+    def test_load_bad_file(self):
+        with open(self.index_path, 'wb') as f:
+            f.write('not an index at all, just some junk')
+        self.assertRaises(makerbot_driver.FileReader.BadIndexError,
+                          makerbot_driver.FileReader.S3gIndex.load, self.index_path)
+
+    def test_load_stale(self):
+        index = makerbot_driver.FileReader.S3gIndex.build(self.path)
+        index.source_size += 1
+        index.save(self.index_path)
+        self.assertRaises(makerbot_driver.FileReader.StaleIndexError,
+                          makerbot_driver.FileReader.S3gIndex.load, self.index_path, self.path)
+
+    def test_for_file_builds_and_saves(self):
+        index = makerbot_driver.FileReader.S3gIndex.for_file(self.path, 5)
+        self.assertTrue(os.path.exists(self.index_path))
+        self.assertEqual(5, makerbot_driver.FileReader.S3gIndex.for_file(self.path).interval)
+
+    def test_seek_command(self):
+        index = makerbot_driver.FileReader.S3gIndex.build(self.path, 7)
+        payloads = self.reader.ReadFile()
+        for number in [0, 6, 7, 8, 54, self.payload_count - 1]:
+            entry = self.reader.seek_command(index, number)
+            self.assertEqual(number, entry.number)
+            self.assertEqual(payloads[number], self.reader.ParseNextPayload())
+            self.assertEqual(payloads[number][0], entry.command)
+
+    def test_seek_command_extrusion(self):
+        index = makerbot_driver.FileReader.S3gIndex.build(self.path, 7)
+        # Commands 0-9 are layer 0's moves, 10 its build percent
+        entry = self.reader.seek_command(index, 12)
+        self.assertEqual(55, entry.extrusion)
+        self.assertEqual(55, entry.a)
+        self.assertEqual(100, entry.z)
+
+    def test_seek_command_past_end(self):
+        index = makerbot_driver.FileReader.S3gIndex.build(self.path, 7)
+        self.assertRaises(makerbot_driver.FileReader.EndOfFileError,
+                          self.reader.seek_command, index, self.payload_count)
+
+    def test_seek_z(self):
+        index = makerbot_driver.FileReader.S3gIndex.build(self.path, 4)
+        for layer in range(1, 10):
+            entry = self.reader.seek_z(index, layer * 100)
+            self.assertEqual(layer * 11, entry.number)
+            self.assertEqual((layer - 1) * 100, entry.z)
+            payload = self.reader.ParseNextPayload()
+            self.assertEqual(layer * 100, payload[3])
+
+    def test_seek_percent(self):
+        index = makerbot_driver.FileReader.S3gIndex.build(self.path, 4)
+        entry = self.reader.seek_percent(index, 50)
+        self.assertTrue(entry.offset >= index.source_size / 2)
+        previous = self.reader.seek_command(index, entry.number - 1)
+        self.assertTrue(previous.offset < index.source_size / 2)
+
+    def test_seek_empty_index(self):
+        index = makerbot_driver.FileReader.S3gIndex()
+        self.assertRaises(makerbot_driver.FileReader.EndOfFileError,
+                          self.reader.seek_command, index, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,11 +6,28 @@ sys.path.insert(0, lib_path)
 import unittest
 import json
 import mock
+import shutil
+import urllib2
 import subprocess
 import tempfile
+import time
 import platform
 
 import makerbot_driver
+from makerbot_driver.Firmware.Uploader import _check_output
+
+hex_cache = None
+# ^ Every uploader built here uses this, so that tests leave the real
+#   ~/.makerbot_driver/firmware_hex alone
+
+
+def setUpModule():
+    global hex_cache
+    hex_cache = makerbot_driver.Firmware.HexCache(tempfile.mkdtemp())
+
+
+def tearDownModule():
+    shutil.rmtree(hex_cache.cache_dir)
 
 
 class TestGetProducts(unittest.TestCase):
@@ -21,7 +38,7 @@ class TestGetProducts(unittest.TestCase):
         )
         dest = tempfile.mkdtemp()
         self.uploader = makerbot_driver.Firmware.Uploader(
-            source_url=source_url, dest_path=dest)
+            source_url=source_url, dest_path=dest, hex_cache=hex_cache)
 
     def tearDown(self):
         self.uploader = None
@@ -43,7 +60,8 @@ class TestGetProducts(unittest.TestCase):
         self.uploader.get_machine_json_files = get_machine_json_files_mock
         self.uploader._pull_products()
         wget_mock.assert_called_once_with(expected_products_url)
-        get_machine_json_files_mock.assert_called_once_with()
+        # Machine json files are only fetched once a machine is asked about
+        self.assertFalse(get_machine_json_files_mock.called)
 
 
 class TestWget(unittest.TestCase):
@@ -56,6 +74,7 @@ class TestWget(unittest.TestCase):
         self.uploader = makerbot_driver.Firmware.Uploader(
             source_url=self.source_url,
             dest_path=dest,
+            hex_cache=hex_cache,
         )
 
     def tearDown(self):
@@ -76,6 +95,7 @@ class TestWget(unittest.TestCase):
             'test_files',
             filename,
         )
+        self.uploader.wget(url)
         self.assertTrue(os.path.isfile(os.path.join(
             self.uploader.dest_path, filename)))
 
@@ -118,13 +138,14 @@ class TestGetMachineJsonFiles(unittest.TestCase):
         self.uploader = makerbot_driver.Firmware.Uploader(
             source_url=source_url,
             dest_path=dest,
+            hex_cache=hex_cache,
         )
 
     def tearDown(self):
         self.uploader = None
 
     def test_get_machine_json_files_no_products(self):
-        uploader = makerbot_driver.Firmware.Uploader(autoUpdate=False)
+        uploader = makerbot_driver.Firmware.Uploader(autoUpdate=False, hex_cache=hex_cache)
         self.assertRaises(AttributeError, uploader.get_machine_json_files)
 
     def test_get_machine_json_files_products_pulled_and_loaded(self):
@@ -149,6 +170,7 @@ class TestGetFirmwareVersions(unittest.TestCase):
         self.uploader = makerbot_driver.Firmware.Uploader(
             source_url=source_url,
             dest_path=dest,
+            hex_cache=hex_cache,
         )
 
     def tearDown(self):
@@ -202,6 +224,7 @@ class TestGetFirmwareValues(unittest.TestCase):
         self.uploader = makerbot_driver.Firmware.Uploader(
             source_url=source_url,
             dest_path=dest,
+            hex_cache=hex_cache,
         )
 
     def tearDown(self):
@@ -234,6 +257,7 @@ class TestListVersions(unittest.TestCase):
             source_url=source_url,
             dest_path=dest,
             autoUpdate=False,
+            hex_cache=hex_cache,
         )
 
     def test_list_machines_no_products(self):
@@ -252,9 +276,124 @@ class TestListVersions(unittest.TestCase):
         self.assertEqual(expected_machines, self.uploader.list_machines())
 
 
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        test_files = os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            'test_files',
+        )
+        self.source_url = tempfile.mkdtemp()
+        for filename in ['products.json', 'Example.json', 'TheReplicator.json']:
+            shutil.copy2(os.path.join(test_files, filename), self.source_url)
+        self.dest = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.source_url)
+        shutil.rmtree(self.dest)
+
+    def make_uploader(self, **kwargs):
+        return makerbot_driver.Firmware.Uploader(
+            source_url=self.source_url, dest_path=self.dest, hex_cache=hex_cache, **kwargs)
+
+    def test_machine_json_fetched_when_asked_for(self):
+        uploader = self.make_uploader()
+        self.assertEqual(['products.json'], os.listdir(self.dest))
+        uploader.list_firmware_versions('Example', 'pid_example')
+        self.assertEqual(['Example.json', 'products.json'], sorted(os.listdir(self.dest)))
+
+    def test_firmware_values_loaded_once(self):
+        uploader = self.make_uploader()
+        uploader.get_firmware_values('Example')
+        uploader.load_json_values = mock.Mock()
+        uploader.get_firmware_values('Example')
+        self.assertFalse(uploader.load_json_values.called)
+
+    def test_get_machine_json_files(self):
+        uploader = self.make_uploader(fetch_workers=2)
+        uploader.get_machine_json_files()
+        self.assertEqual(['Example.json', 'TheReplicator.json', 'products.json'],
+                         sorted(os.listdir(self.dest)))
+
+    def test_local_copy_reused(self):
+        self.make_uploader()
+        with mock.patch('shutil.copyfileobj') as copyfileobj:
+            self.make_uploader()
+            self.assertFalse(copyfileobj.called)
+
+    def test_changed_local_source_copied(self):
+        uploader = self.make_uploader()
+        products = uploader.load_json_values(os.path.join(self.source_url, 'products.json'))
+        products['ExtrusionPrintersV2']['Another'] = './Another.json'
+        with open(os.path.join(self.source_url, 'products.json'), 'w') as f:
+            json.dump(products, f)
+        self.assertTrue('Another' in self.make_uploader().list_machines())
+
+    def test_download_keeps_validators(self):
+        uploader = self.make_uploader(autoUpdate=False)
+        response = mock.Mock()
+        response.read.return_value = '{}'
+        response.info.return_value = {'ETag': '"1234"', 'Last-Modified': 'Sat, 01 Jan 2000 00:00:00 GMT'}
+        uploader.urlopen = mock.Mock(return_value=response)
+        url = 'http://firmware.makerbot.com/foobar.json'
+        path = uploader.wget(url)
+        self.assertEqual('{}', open(path).read())
+        # Asking again sends the validators, and keeps the file if it has not changed
+        uploader.urlopen.side_effect = urllib2.HTTPError(url, 304, 'Not Modified', {}, None)
+        self.assertEqual(path, uploader.wget(url))
+        self.assertEqual('{}', open(path).read())
+        request = uploader.urlopen.call_args[0][0]
+        self.assertEqual('"1234"', request.get_header('If-none-match'))
+        self.assertEqual('Sat, 01 Jan 2000 00:00:00 GMT', request.get_header('If-modified-since'))
+
+    def test_replace_file(self):
+        source = os.path.join(self.dest, 'new')
+        dest = os.path.join(self.dest, 'old')
+        for path, contents in [(source, 'new'), (dest, 'old')]:
+            with open(path, 'w') as f:
+                f.write(contents)
+        makerbot_driver.Firmware.replace_file(source, dest)
+        self.assertEqual('new', open(dest).read())
+        self.assertFalse(os.path.exists(source))
+
+    def test_replace_file_windows(self):
+        ctypes = mock.Mock()
+        ctypes.windll.kernel32.MoveFileExW.return_value = 1
+        with mock.patch('platform.system', return_value='Windows'):
+            with mock.patch.dict(sys.modules, {'ctypes': ctypes}):
+                makerbot_driver.Firmware.replace_file('a', 'b')
+                ctypes.windll.kernel32.MoveFileExW.assert_called_once_with(u'a', u'b', 0x9)
+                ctypes.windll.kernel32.MoveFileExW.return_value = 0
+                ctypes.WinError.return_value = OSError('failed')
+                self.assertRaises(OSError, makerbot_driver.Firmware.replace_file, 'a', 'b')
+
+    def test_download_without_copy_is_unconditional(self):
+        uploader = self.make_uploader(autoUpdate=False)
+        response = mock.Mock()
+        response.read.return_value = '{}'
+        response.info.return_value = {}
+        uploader.urlopen = mock.Mock(return_value=response)
+        uploader.wget('http://firmware.makerbot.com/foobar.json')
+        request = uploader.urlopen.call_args[0][0]
+        self.assertEqual(None, request.get_header('If-none-match'))
+
+    def test_download_error(self):
+        uploader = self.make_uploader(autoUpdate=False)
+        url = 'http://firmware.makerbot.com/foobar.json'
+        uploader.urlopen = mock.Mock(side_effect=urllib2.HTTPError(url, 404, 'Not Found', {}, None))
+        self.assertRaises(urllib2.HTTPError, uploader.wget, url)
+
+    def test_default_dest_path_per_source(self):
+        first = makerbot_driver.Firmware.Uploader(source_url='http://a', autoUpdate=False, hex_cache=hex_cache)
+        second = makerbot_driver.Firmware.Uploader(source_url='http://b', autoUpdate=False, hex_cache=hex_cache)
+        self.assertNotEqual(first.dest_path, second.dest_path)
+        self.assertEqual(first.dest_path, makerbot_driver.Firmware.Uploader(
+            source_url='http://a', autoUpdate=False, hex_cache=hex_cache).dest_path)
+
+
 class TestUploader(unittest.TestCase):
     def setUp(self):
-        self.uploader = makerbot_driver.Firmware.Uploader(autoUpdate=False)
+        self.uploader = makerbot_driver.Firmware.Uploader(autoUpdate=False, hex_cache=hex_cache)
 
     def tearDown(self):
         self.uploader = None
@@ -303,6 +442,7 @@ class TestParseAvrdudeCommand(unittest.TestCase):
         self.uploader = makerbot_driver.Firmware.Uploader(
             source_url=source_url,
             dest_path=dest,
+            hex_cache=hex_cache,
         )
         toggle_machine_mock = mock.Mock()
         self.uploader.toggle_machine = toggle_machine_mock
@@ -311,7 +451,7 @@ class TestParseAvrdudeCommand(unittest.TestCase):
         self.uploader = None
 
     def test_parse_avrdude_command_no_products(self):
-        uploader = makerbot_driver.Firmware.Uploader(autoUpdate=False)
+        uploader = makerbot_driver.Firmware.Uploader(autoUpdate=False, hex_cache=hex_cache)
         port = '/dev/tty.usbmodemfa121'
         machine = "Example"
         pid = 'pid_example'
@@ -435,13 +575,52 @@ class TestParseAvrdudeCommand(unittest.TestCase):
 
         check_output_mock = mock.Mock()
         self.uploader.run_subprocess = check_output_mock
+        self.uploader.preflight_hex = mock.Mock()
         expected_call = self.uploader.parse_avrdude_command(
             port, machine, pid, version)
         self.uploader.upload_firmware(port, machine, pid, version)
+        self.uploader.preflight_hex.assert_called_once_with(version, machine, pid)
         check_output_mock.assert_called_once_with(
             expected_call, stderr=subprocess.STDOUT)
         self.uploader.toggle_machine.assert_called_once_with(port)
 
+    def test_update_firmware_fails(self):
+        self.uploader.preflight_hex = mock.Mock()
+        port = '/dev/tty.usbmodemfa121'
+        expected_call = self.uploader.parse_avrdude_command(
+            port, 'Example', 'pid_example', '0.1')
+        error = subprocess.CalledProcessError(1, expected_call)
+        error.output = 'no answer'
+        self.uploader.run_subprocess = mock.Mock(side_effect=error)
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            self.uploader.upload_firmware(port, 'Example', 'pid_example', '0.1')
+        self.assertEqual(1, context.exception.returncode)
+        self.assertEqual('no answer', context.exception.output)
+        self.assertEqual(expected_call, context.exception.cmd)
+
+    def test_run_avrdude_timeout(self):
+        self.uploader.preflight_hex = mock.Mock()
+        port = '/dev/tty.usbmodemfa121'
+        expected_call = self.uploader.parse_avrdude_command(
+            port, 'Example', 'pid_example', '0.1')
+        self.uploader.run_subprocess = mock.Mock(
+            side_effect=makerbot_driver.Firmware.SubprocessTimeoutError(expected_call, 5))
+        with self.assertRaises(makerbot_driver.Firmware.UploadTimeoutError) as context:
+            self.uploader.run_avrdude(port, 'Example', 'pid_example', '0.1', timeout=5)
+        self.assertEqual(port, context.exception.port)
+        self.assertEqual(5, context.exception.timeout)
+        self.uploader.run_subprocess.assert_called_once_with(
+            expected_call, stderr=subprocess.STDOUT, timeout=5)
+
+    def test_run_avrdude_failure(self):
+        self.uploader.preflight_hex = mock.Mock()
+        error = subprocess.CalledProcessError(1, ['avrdude'])
+        error.output = 'no answer'
+        self.uploader.run_subprocess = mock.Mock(side_effect=error)
+        self.assertEqual((1, 'no answer'), self.uploader.run_avrdude(
+            '/dev/tty.usbmodemfa121', 'Example', 'pid_example', '0.1'))
+
+
     def test_parse_avrdude_command_global(self):
         machine = 'Example'
         pid = 'pid_example'
@@ -505,5 +684,198 @@ class TestParseAvrdudeCommand(unittest.TestCase):
         for i in range(len(expected_op_parts)):
             self.assertEqual(expected_op_parts[i], got_op_parts[i])
 
+
+class TestCheckOutput(unittest.TestCase):
+
+    def test_check_output(self):
+        self.assertEqual('out\n', _check_output(
+            [sys.executable, '-c', 'print("out")']))
+
+    def test_check_output_failure(self):
+        call = [sys.executable, '-c', 'import sys; print("out"); sys.exit(3)']
+        with self.assertRaises(subprocess.CalledProcessError) as context:
+            _check_output(call)
+        self.assertEqual(3, context.exception.returncode)
+        self.assertEqual(call, context.exception.cmd)
+        self.assertEqual('out\n', context.exception.output)
+
+    def test_check_output_timeout(self):
+        call = [sys.executable, '-c', 'import time; time.sleep(30)']
+        start = time.time()
+        with self.assertRaises(makerbot_driver.Firmware.SubprocessTimeoutError) as context:
+            _check_output(call, timeout=0.5)
+        self.assertTrue(time.time() - start < 10)
+        self.assertEqual(call, context.exception.cmd)
+        self.assertEqual(0.5, context.exception.timeout)
+
+    def test_check_output_timeout_not_reached(self):
+        self.assertEqual('out\n', _check_output(
+            [sys.executable, '-c', 'print("out")'], timeout=30))
+
+
+# Stands in for avrdude: echoes the port it was given, fails for ports
+# named bad and hangs for ports named slow
+_fake_avrdude = """#!%s
+import sys
+import time
+port = [arg[2:] for arg in sys.argv if arg.startswith('-P')][0]
+print('flashing %%s' %% (port))
+if 'slow' in port:
+    time.sleep(30)
+sys.exit(1 if 'bad' in port else 0)
+""" % (sys.executable)
+
+
+class TestUploadFirmwareAll(unittest.TestCase):
+
+    def setUp(self):
+        test_files = os.path.join(
+            os.path.abspath(os.path.dirname(__file__)),
+            'test_files',
+        )
+        self.source_url = tempfile.mkdtemp()
+        for filename in ['products.json', 'Example.json']:
+            shutil.copy2(os.path.join(test_files, filename), self.source_url)
+        os.mkdir(os.path.join(self.source_url, 'firmware'))
+        for version, record in [('0.1', ':0100000001FE'), ('1.0', ':0100000010EF')]:
+            with open(os.path.join(self.source_url, 'firmware', 'Example-%s.hex' % (version)), 'w') as f:
+                f.write('%s\n:00000001FF\n' % (record))
+        self.dest = tempfile.mkdtemp()
+        self.avrdude = os.path.join(self.dest, 'avrdude')
+        with open(self.avrdude, 'w') as f:
+            f.write(_fake_avrdude)
+        os.chmod(self.avrdude, 0755)
+        self.uploader = makerbot_driver.Firmware.Uploader(
+            source_url=self.source_url,
+            dest_path=os.path.join(self.dest, 'metadata'),
+            avrdude_exe=self.avrdude,
+            hex_cache=makerbot_driver.Firmware.HexCache(os.path.join(self.dest, 'hex')),
+        )
+        self.uploader.toggle_machine = mock.Mock()
+
+    def tearDown(self):
+        shutil.rmtree(self.source_url)
+        shutil.rmtree(self.dest)
+
+    def test_upload_all(self):
+        jobs = [('port%i' % (i), 'Example', 'pid_example', '1.0') for i in range(6)]
+        results = dict((result.port, result) for result in self.uploader.upload_firmware_all(jobs, worker_count=3))
+        self.assertEqual(sorted(port for port, machine, pid, version in jobs), sorted(results))
+        for port, result in results.items():
+            self.assertEqual(0, result.returncode)
+            self.assertEqual(None, result.error)
+            self.assertTrue(('flashing %s' % (port)) in result.output)
+            self.assertTrue(result.elapsed >= 0)
+        self.assertEqual(6, self.uploader.toggle_machine.call_count)
+
+    def test_hex_resolved_once(self):
+        jobs = [('port%i' % (i), 'Example', 'pid_example', '1.0') for i in range(3)]
+        jobs.append(('port3', 'Example', 'pid_example', '0.1'))
+        self.uploader.download_firmware = mock.Mock(wraps=self.uploader.download_firmware)
+        list(self.uploader.upload_firmware_all(jobs))
+        self.assertEqual(2, self.uploader.download_firmware.call_count)
+
+    def test_hex_preflighted_once(self):
+        jobs = [('port%i' % (i), 'Example', 'pid_example', '1.0') for i in range(3)]
+        self.uploader.preflight_hex = mock.Mock(wraps=self.uploader.preflight_hex)
+        results = list(self.uploader.upload_firmware_all(jobs))
+        self.assertEqual([0, 0, 0], [result.returncode for result in results])
+        self.assertEqual(1, self.uploader.preflight_hex.call_count)
+
+    def test_failed_upload(self):
+        jobs = [('good', 'Example', 'pid_example', '1.0'), ('bad', 'Example', 'pid_example', '1.0')]
+        results = dict((result.port, result) for result in self.uploader.upload_firmware_all(jobs))
+        self.assertEqual(0, results['good'].returncode)
+        self.assertEqual(1, results['bad'].returncode)
+        self.assertTrue('flashing bad' in results['bad'].output)
+
+    def test_unknown_version(self):
+        jobs = [('port0', 'Example', 'pid_example', '2.0'), ('port1', 'Example', 'pid_example', '1.0')]
+        results = dict((result.port, result) for result in self.uploader.upload_firmware_all(jobs))
+        self.assertTrue(isinstance(results['port0'].error, makerbot_driver.Firmware.UnknownVersionError))
+        self.assertEqual(None, results['port0'].returncode)
+        self.assertEqual(0, results['port1'].returncode)
+
+    def test_duplicate_port(self):
+        jobs = [('port0', 'Example', 'pid_example', '1.0'), ('port0', 'Example', 'pid_example', '0.1')]
+        results = list(self.uploader.upload_firmware_all(jobs))
+        self.assertEqual(2, len(results))
+        self.assertEqual('0.1', results[0].version)
+        self.assertTrue(isinstance(results[0].error, makerbot_driver.Firmware.DuplicatePortError))
+        self.assertTrue(isinstance(results[0].error, makerbot_driver.DuplicatePortError))
+        self.assertEqual(0, results[1].returncode)
+        self.assertEqual(1, self.uploader.toggle_machine.call_count)
+
+    def test_toggle_failure(self):
+        self.uploader.toggle_machine.side_effect = IOError('no such port')
+        results = list(self.uploader.upload_firmware_all([('port0', 'Example', 'pid_example', '1.0')]))
+        self.assertTrue(isinstance(results[0].error, IOError))
+
+    def test_timeout(self):
+        jobs = [('slow', 'Example', 'pid_example', '1.0'), ('fast', 'Example', 'pid_example', '1.0')]
+        results = list(self.uploader.upload_firmware_all(jobs, worker_count=2, timeout=2))
+        self.assertEqual('fast', results[0].port)
+        self.assertTrue(isinstance(results[1].error, makerbot_driver.Firmware.UploadTimeoutError))
+        self.assertTrue(results[1].elapsed < 10)
+
+    def test_held_hex_files_removed(self):
+        jobs = [('port%i' % (i), 'Example', 'pid_example', '1.0') for i in range(3)]
+        list(self.uploader.upload_firmware_all(jobs, worker_count=2))
+        for i in range(100):
+            if not [n for n in os.listdir(self.uploader.hex_cache.cache_dir) if n.startswith('.tmp-')]:
+                break
+            time.sleep(0.01)
+        self.assertEqual([], [n for n in os.listdir(self.uploader.hex_cache.cache_dir) if n.startswith('.tmp-')])
+
+    def test_bad_hex_not_uploaded(self):
+        with open(os.path.join(self.source_url, 'firmware', 'Example-1.0.hex'), 'w') as f:
+            f.write(':0100000010EE\n:00000001FF\n')
+        results = list(self.uploader.upload_firmware_all([('port0', 'Example', 'pid_example', '1.0')]))
+        self.assertTrue(isinstance(results[0].error, makerbot_driver.HexChecksumError))
+        self.assertFalse(self.uploader.toggle_machine.called)
+        # Nor is it cached
+        self.assertEqual(None, self.uploader.hex_cache.get(
+            self.uploader.pathjoin(self.source_url, './firmware/Example-1.0.hex')))
+
+
+class TestPreflightHex(unittest.TestCase):
+
+    def setUp(self):
+        self.uploader = makerbot_driver.Firmware.Uploader(autoUpdate=False, hex_cache=hex_cache)
+        self.uploader.get_firmware_values = mock.Mock(
+            return_value={'PID': {'pid': {'part': 'm168'}}})
+        self.dest = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dest)
+
+    def write_hex(self, contents):
+        path = os.path.join(self.dest, 'firmware.hex')
+        with open(path, 'w') as f:
+            f.write(contents)
+        return path
+
+    def test_good(self):
+        path = self.write_hex(':0100000001FE\n:00000001FF\n')
+        image = self.uploader.preflight_hex(path, 'Example', 'pid')
+        self.assertEqual(1, len(image))
+
+    def test_empty(self):
+        path = self.write_hex(':00000001FF\n')
+        self.assertRaises(makerbot_driver.HexFileError, self.uploader.preflight_hex, path)
+
+    def test_too_big_for_part(self):
+        # One byte at 0x4000, just past the 16K of an m168
+        path = self.write_hex(':0140000001BE\n:00000001FF\n')
+        self.uploader.preflight_hex(path)
+        self.assertRaises(makerbot_driver.HexFileError, self.uploader.preflight_hex, path, 'Example', 'pid')
+
+    def test_upload_firmware_checks_first(self):
+        path = self.write_hex(':0100000001FF\n')
+        self.uploader.toggle_machine = mock.Mock()
+        self.assertRaises(makerbot_driver.HexChecksumError, self.uploader.upload_firmware,
+                          '/dev/ttyACM0', 'Example', 'pid', path)
+        self.assertFalse(self.uploader.toggle_machine.called)
+
 if __name__ == "__main__":
     unittest.main()